@@ -0,0 +1,270 @@
+"""PyroScan API — ASGI entry point.
+
+Serves the same routes as the Flask app in ``api/index.py``. The routes that
+mostly wait on upstream services (search, weather, layers, forecast, zone
+detail) are answered on the event loop with ``AsyncDataFetcher``, so a slow
+upstream holds a coroutine rather than a worker thread; their CPU-bound
+scoring runs on a thread pool. ``/api/risk/tiles?live=1`` first warms the
+shared upstream cache asynchronously for the whole grid and is then served
+by Flask. Every other route goes to the Flask app through a small WSGI
+bridge on the same thread pool (streamed responses stay streamed).
+
+    pip install httpx uvicorn
+    uvicorn api.asgi:app --port 8000
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import importlib
+import io
+import logging
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from api.index import MAX_FORECAST_DAY, _parse_days, app as flask_app
+from api.services import geocoder
+from api.services.async_fetcher import async_data_fetcher
+from api.services.async_http import async_fetch_engine
+
+logger = logging.getLogger("pyroscan.asgi")
+
+ASGI_WORKERS = int(os.getenv("PYROSCAN_ASGI_WORKERS", "16"))
+MAX_LIVE_TILES = 2048
+
+_executor = ThreadPoolExecutor(max_workers=max(1, ASGI_WORKERS), thread_name_prefix="PyroAsgi")
+
+
+async def _run(fn, *args):
+    """Run blocking ``fn(*args)`` on the worker pool."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, functools.partial(fn, *args))
+
+
+class _Request:
+    def __init__(self, scope, params=None) -> None:
+        self.path = scope["path"]
+        self.params = params or {}
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        self.args = {key: values[0] for key, values in query.items()}
+
+
+async def _send_json(send, scope, payload, status: int = 200) -> None:
+    # Built and finished by Flask itself, so its after_request hooks (CORS)
+    # give natively served routes the same headers as bridged ones.
+    with flask_app.request_context(_environ(scope, b"")):
+        response = flask_app.process_response(flask_app.json.response(payload))
+    response.status_code = status
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()],
+    })
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+def _coords(request: _Request, lat: float, lon: float) -> tuple[float, float]:
+    return float(request.args.get("lat", lat)), float(request.args.get("lon", lon))
+
+
+# ── Native routes ─────────────────────────────────────────────────────────── #
+async def search(request: _Request):
+    q = request.args.get("q", "")
+    if len(q) < 2:
+        return {"error": "Query too short"}, 422
+    try:
+        return {"query": q, "results": await geocoder.geocode(q)}, 200
+    except Exception as e:
+        return {"error": str(e), "results": []}, 503
+
+
+async def weather_current(request: _Request):
+    lat, lon = _coords(request, 37.0, -122.0)
+    data = await async_data_fetcher.fetch_weather(lat, lon)
+    return {"lat": lat, "lon": lon, **data}, 200
+
+
+async def vegetation(request: _Request):
+    lat, lon = _coords(request, 37.0, -122.0)
+    f = await async_data_fetcher.fetch_features(lat, lon)
+    return {"lat": lat, "lon": lon, "ndvi": f.ndvi, "evi": f.evi}, 200
+
+
+async def temperature(request: _Request):
+    lat, lon = _coords(request, 37.0, -122.0)
+    f = await async_data_fetcher.fetch_features(lat, lon)
+    return {"lat": lat, "lon": lon, "land_surface_temp": f.land_surface_temp}, 200
+
+
+async def zone_detail(request: _Request):
+    try:
+        lat, lon = _coords(request, 37.5, -122.0)
+        day_offset = int(request.args.get("day_offset", 0))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    from api.routers.predict import zone_payload
+    features = await async_data_fetcher.fetch_features(lat, lon, day_offset)
+    return await _run(zone_payload, request.params["zone_id"], lat, lon, features), 200
+
+
+async def forecast(request: _Request):
+    lat = float(request.params.get("lat") or request.args.get("lat", 37.5))
+    lon = float(request.params.get("lon") or request.args.get("lon", -122.0))
+    from api.routers.predict import forecast_payload
+    matrix = await async_data_fetcher.fetch_forecast_matrix(lat, lon)
+    return await _run(forecast_payload, lat, lon, matrix), 200
+
+
+ROUTES = [
+    (re.compile(r"/api/search"), search),
+    (re.compile(r"/api/weather/current"), weather_current),
+    (re.compile(r"/api/layers/vegetation"), vegetation),
+    (re.compile(r"/api/layers/temperature"), temperature),
+    (re.compile(r"/api/risk/zone/(?P<zone_id>[^/]+)"), zone_detail),
+    (re.compile(r"/api/forecast(?:/(?P<lat>[^/]+)/(?P<lon>[^/]+))?"), forecast),
+]
+
+
+async def _prefetch_live_tiles(request: _Request) -> None:
+    """Warm the upstream cache for a live tile request before Flask scores it.
+
+    Invalid or oversized requests are left alone; Flask reports them.
+    """
+    try:
+        bbox = [float(request.args.get(name, default)) for name, default in
+                (("min_lat", -90), ("min_lon", -180), ("max_lat", 90), ("max_lon", 180))]
+        days = _parse_days(request.args.get("days"))
+        day_count = max(days) + 1 if days else int(request.args.get("day_offset", 0)) + 1
+        td = request.args.get("tile_deg")
+        tile_deg = float(td) if td else None
+    except ValueError:
+        return
+    if bbox[0] >= bbox[2] or bbox[1] >= bbox[3] or not 0 < day_count <= MAX_FORECAST_DAY + 1:
+        return
+    from api.services.tile_processor import tile_processor
+    tiles = await _run(tile_processor.generate_batch, *bbox, tile_deg)
+    if 0 < len(tiles) <= MAX_LIVE_TILES:
+        await async_data_fetcher.prefetch_grid(tiles.lats.tolist(), tiles.lons.tolist(), day_count)
+
+
+# ── WSGI bridge ───────────────────────────────────────────────────────────── #
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _environ(scope, body: bytes) -> dict:
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _next_chunk(iterator):
+    return next(iterator, None)
+
+
+async def wsgi_bridge(scope, receive, send) -> None:
+    """Serve one HTTP request with the Flask app on the worker pool."""
+    environ = _environ(scope, await _read_body(receive))
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+        return lambda data: None   # the legacy write() callable is not used by Flask
+
+    body = await _run(flask_app, environ, start_response)
+    try:
+        iterator = iter(body)
+        # Chunks are produced on the pool: a streamed response may compute as it goes.
+        chunk = await _run(_next_chunk, iterator)
+        await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+        while chunk is not None:
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            chunk = await _run(_next_chunk, iterator)
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        if hasattr(body, "close"):
+            await _run(body.close)
+
+
+# ── Application ───────────────────────────────────────────────────────────── #
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                # Load the models before the first request rather than during it.
+                await _run(importlib.import_module, "api.routers.predict")
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await async_fetch_engine.aclose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        raise NotImplementedError(f"unsupported ASGI scope type {scope['type']!r}")
+
+    if scope["method"] == "GET":
+        for pattern, handler in ROUTES:
+            match = pattern.fullmatch(scope["path"])
+            if match is None:
+                continue
+            request = _Request(scope, {k: v for k, v in match.groupdict().items() if v is not None})
+            try:
+                payload, status = await handler(request)
+            except Exception:
+                logger.exception("Unhandled error on %s", scope["path"])
+                payload, status = {"error": "Internal Server Error"}, 500
+            await _send_json(send, scope, payload, status)
+            return
+        if scope["path"] == "/api/risk/tiles":
+            request = _Request(scope)
+            if request.args.get("live") == "1":
+                await _prefetch_live_tiles(request)
+
+    await wsgi_bridge(scope, receive, send)
@@ -38,7 +38,13 @@ def favicon():
 # ── Health ────────────────────────────────────────────────────────────────── #
 @app.route("/api/health")
 def health():
+    from api.routers.predict import snapshot_store, tile_score_cache
+    from api.services.data_fetcher import data_fetcher
+    from api.services.geocoder import geocoder
+    from api.services.inference_pool import inference_pool
+    from api.services.metrics import metrics
     from api.services.model_loader import model_loader
+    from api.services.static_layers import static_layers
     return jsonify({
         "status": "ok",
         "version": "1.0.0",
@@ -47,9 +53,40 @@ def health():
         "model_state": model_loader.state.value,
         "available_models": model_loader.describe(),
         "load_errors": model_loader.load_errors,
+        "model_version": model_loader.version,
+        "optimal_batch_size": model_loader.optimal_batch_size,
+        "inference_processes": inference_pool.processes,
+        "upstream_cache": data_fetcher.cache.stats(),
+        "tile_cache": tile_score_cache.stats(),
+        "geocode_cache": geocoder.cache.stats(),
+        "static_layers": static_layers.describe(),
+        "snapshots": snapshot_store.describe(),
+        "metrics": metrics.snapshot(),
     })
 
+@app.route("/api/metrics")
+def prometheus_metrics():
+    from flask import Response
+    from api.services.metrics import metrics
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
 # ── Risk tiles ─────────────────────────────────────────────────────────────── #
+MAX_FORECAST_DAY = 9
+
+
+def _parse_days(value):
+    """``days=0-9`` (inclusive range) or ``days=0,2,4`` → list of day offsets."""
+    if not value:
+        return None
+    if "-" in value:
+        start, end = (int(part) for part in value.split("-", 1))
+        offsets = list(range(start, end + 1))
+    else:
+        offsets = [int(part) for part in value.split(",")]
+    if not offsets or min(offsets) < 0 or max(offsets) > MAX_FORECAST_DAY:
+        raise ValueError(f"days must lie within 0-{MAX_FORECAST_DAY}")
+    return list(dict.fromkeys(offsets))
+
 @app.route("/api/risk/tiles")
 def risk_tiles():
     try:
@@ -58,6 +95,10 @@ def risk_tiles():
         min_lon = float(request.args.get("min_lon", -180))
         max_lon = float(request.args.get("max_lon",  180))
         day_offset = int(request.args.get("day_offset", 0))
+        live = request.args.get("live") == "1"
+        fm = request.args.get("flush_ms")
+        flush_ms = float(fm) if fm else None
+        day_offsets = _parse_days(request.args.get("days"))
         td = request.args.get("tile_deg")
         tile_deg = float(td) if td else None
     except ValueError as e:
@@ -68,43 +109,99 @@ def risk_tiles():
 
     from api.services.tile_processor import tile_processor
     from api.services.model_loader import model_loader
-    from api.routers.predict import score_tiles_stream, score_tiles_sync
+    from api.services import tile_serializer
+    from api.routers.predict import (
+        precomputed_snapshot, score_batches_stream, score_tile_batch, score_tile_cube,
+        score_tiles_stream, score_tiles_sync,
+    )
+    from datetime import datetime, timezone
     from flask import Response
     import json
 
-    tiles = tile_processor.generate_grid(min_lat, min_lon, max_lat, max_lon, tile_deg)
+    accept = request.headers.get("Accept", "")
+    try:
+        fmt = tile_serializer.negotiate_format(request.args.get("format"), accept)
+    except tile_serializer.UnsupportedFormatError as e:
+        return jsonify({"error": str(e)}), 406
+
+    tiles = tile_processor.generate_batch(min_lat, min_lon, max_lat, max_lon, tile_deg)
     if len(tiles) > 2048:
         return jsonify({"error": "Requested area too large"}), 400
 
     wants_stream = request.args.get("stream") == "1"
     if not wants_stream:
-        accept = request.headers.get("Accept", "")
         wants_stream = "application/x-ndjson" in accept
+    meta = {
+        "model_active": model_loader.is_loaded(),
+        "model_names": model_loader.model_names,
+        "model_state": model_loader.state.value,
+        "day_offset": day_offset,
+    }
+
+    # Multi-day mode: every requested day in one response, always columnar.
+    if day_offsets is not None:
+        if fmt in ("binary", "msgpack"):
+            return jsonify({"error": "days= is only available as JSON"}), 406
+        scores = score_tile_cube(tiles, day_offsets, use_live_data=live)
+        response = jsonify(tile_serializer.cube_document(tiles, scores, day_offsets, meta))
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    # The precomputed global grid is served as is when the request matches it.
+    snapshot = None if live else precomputed_snapshot(
+        min_lat, min_lon, max_lat, max_lon, tile_deg, day_offset
+    )
+    if snapshot is not None:
+        meta["precomputed_at"] = datetime.fromtimestamp(snapshot.created, timezone.utc).isoformat()
+
+    def scored_batch():
+        if snapshot is not None:
+            return snapshot.batch
+        return score_tile_batch(tiles, day_offset, use_live_data=live)
+
+    # Packed formats are a single frame, so they ignore the stream flag.
+    if fmt in ("binary", "msgpack"):
+        batch = scored_batch()
+        pack = tile_serializer.pack_binary if fmt == "binary" else tile_serializer.pack_msgpack
+        response = Response(pack(batch, meta), mimetype=tile_serializer.FORMAT_MIMETYPES[fmt])
+        response.headers["Cache-Control"] = "no-store"
+        return response
 
     if not wants_stream:
-        tiles = score_tiles_sync(tiles, day_offset)
-        response = jsonify({
-            "model_active": model_loader.is_loaded(),
-            "model_names": model_loader.model_names,
-            "model_state": model_loader.state.value,
-            "day_offset": day_offset,
-            "tile_count": len(tiles),
-            "tiles": [t.to_dict() for t in tiles],
-        })
+        if fmt == "columnar":
+            response = jsonify(tile_serializer.columnar_document(scored_batch(), meta))
+            response.mimetype = tile_serializer.FORMAT_MIMETYPES["columnar"]
+        else:
+            if snapshot is not None:
+                tile_dicts = snapshot.tiles
+            else:
+                tile_dicts = [t.to_dict() for t in score_tiles_sync(tiles, day_offset, use_live_data=live)]
+            response = jsonify({
+                **meta,
+                "tile_count": len(tile_dicts),
+                "tiles": tile_dicts,
+            })
         response.headers["Cache-Control"] = "no-store"
         return response
 
     def generate_batches():
-        yield json.dumps({
-            "model_active": model_loader.is_loaded(),
-            "model_names": model_loader.model_names,
-            "model_state": model_loader.state.value,
-            "day_offset": day_offset,
-            "tile_count": len(tiles),
-            "tiles": []
-        }) + "\n"
-
-        for batch in score_tiles_stream(tiles, day_offset):
+        if fmt == "columnar":
+            yield json.dumps({
+                **meta, **tile_serializer.columnar_meta(tiles), "tile_count": len(tiles),
+            }) + "\n"
+            if snapshot is not None:
+                batches = [snapshot.batch]
+            else:
+                batches = score_batches_stream(tiles, day_offset, use_live_data=live, flush_ms=flush_ms)
+            for batch in batches:
+                yield json.dumps({"columns": tile_serializer.columnar_columns(batch)}) + "\n"
+            return
+
+        yield json.dumps({**meta, "tile_count": len(tiles), "tiles": []}) + "\n"
+        if snapshot is not None:
+            yield json.dumps({"tiles": snapshot.tiles}) + "\n"
+            return
+        for batch in score_tiles_stream(tiles, day_offset, use_live_data=live, flush_ms=flush_ms):
             yield json.dumps({
                 "tiles": [t.to_dict() for t in batch]
             }) + "\n"
@@ -113,6 +210,57 @@ def risk_tiles():
     response.headers["Cache-Control"] = "no-store"
     return response
 
+PYRAMID_MAX_AGE = 300
+
+
+@app.route("/api/risk/tiles/<int:z>/<int:x>/<int:y>")
+def risk_pyramid_tile(z, x, y):
+    try:
+        day_offset = int(request.args.get("day_offset", 0))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not 0 <= day_offset <= MAX_FORECAST_DAY:
+        return jsonify({"error": f"day_offset must lie within 0-{MAX_FORECAST_DAY}"}), 400
+    live = request.args.get("live") == "1"
+    how = request.args.get("agg", "max")
+
+    from api.services.model_loader import model_loader
+    from api.services.risk_pyramid import AGGREGATIONS, tile_document, valid_tile
+    from api.routers.predict import offline_fingerprint, pyramid_tile
+
+    if how not in AGGREGATIONS:
+        return jsonify({"error": f"agg must be one of {list(AGGREGATIONS)}"}), 400
+    if not valid_tile(z, x, y):
+        return jsonify({"error": "Tile outside the pyramid"}), 404
+
+    meta = {
+        "model_active": model_loader.is_loaded(),
+        "model_names": model_loader.model_names,
+        "day_offset": day_offset,
+    }
+    # Live tiles follow the upstream forecast, so they are never validated or shared.
+    if live:
+        response = jsonify(tile_document(pyramid_tile(z, x, y, day_offset, use_live_data=True), how, meta))
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    # Offline scores only change with the model files and static rasters,
+    # whose content digests are the same on every instance and across restarts.
+    etag = f"{z}-{x}-{y}-{day_offset}-{how}-{offline_fingerprint()}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        tile = pyramid_tile(z, x, y, day_offset)
+        response = jsonify(tile_document(tile, how, meta))
+        if tile.sampled:
+            # A stand-in until the base level under it is filled: not validated,
+            # and revalidated on every use so the real tile replaces it.
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={PYRAMID_MAX_AGE}"
+    return response
+
 # ── Zone detail ────────────────────────────────────────────────────────────── #
 @app.route("/api/risk/zone/<zone_id>")
 def zone_detail(zone_id):
@@ -192,16 +340,9 @@ def geocode():
     q = request.args.get("q", "")
     if len(q) < 2:
         return jsonify({"error": "Query too short"}), 422
-    import requests as req
+    from api.services.geocoder import geocode_sync
     try:
-        r = req.get("https://nominatim.openstreetmap.org/search",
-            params={"q": q, "format": "json", "limit": 5},
-            headers={"User-Agent": "PyroScan/1.0"}, timeout=8)
-        results = r.json()
-        return jsonify({"query": q, "results": [
-            {"name": item.get("display_name",""), "lat": float(item["lat"]),
-             "lon": float(item["lon"]), "type": item.get("type","")}
-            for item in results]})
+        return jsonify({"query": q, "results": geocode_sync(q)})
     except Exception as e:
         return jsonify({"error": str(e), "results": []}), 503
 
@@ -211,7 +352,9 @@ def docs():
     return jsonify({"api": "PyroScan v1.0.0", "endpoints": [
         {"method": "GET",  "path": "/",                        "description": "Frontend application"},
         {"method": "GET",  "path": "/api/health",              "description": "API status and model state"},
-        {"method": "GET",  "path": "/api/risk/tiles",          "description": "Risk tiles (min_lat, max_lat, min_lon, max_lon, day_offset, tile_deg)"},
+        {"method": "GET",  "path": "/api/metrics",             "description": "Prometheus text metrics"},
+        {"method": "GET",  "path": "/api/risk/tiles",          "description": "Risk tiles (min_lat, max_lat, min_lon, max_lon, day_offset, tile_deg, live, stream, flush_ms, days=0-9, format=json|columnar|binary|msgpack)"},
+        {"method": "GET",  "path": "/api/risk/tiles/<z>/<x>/<y>", "description": "Risk pyramid tile (day_offset, agg=max|mean, live)"},
         {"method": "GET",  "path": "/api/risk/zone/<id>",      "description": "Zone detail with factor breakdown"},
         {"method": "GET",  "path": "/api/forecast",            "description": "10-day probabilistic forecast (lat, lon query params)"},
         {"method": "GET",  "path": "/api/forecast/<lat>/<lon>","description": "10-day probabilistic forecast (path params)"},
@@ -2,13 +2,45 @@
 
 from __future__ import annotations
 
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
 from datetime import date, timedelta
+from typing import Optional
 
 import numpy as np
 
-from api.services.data_fetcher import data_fetcher
+from api.services.data_fetcher import CACHE_TTLS, FEATURE_COLUMNS, ResponseCache, data_fetcher
+from api.services.inference_pool import inference_pool
+from api.services.metrics import metrics
 from api.services.model_loader import model_loader
-from api.services.tile_processor import Tile, tile_processor
+from api.services.precompute import (
+    PRECOMPUTE_ENABLED, SNAPSHOT_DIR, Precomputer, Snapshot, SnapshotStore,
+)
+from api.services.risk_pyramid import PyramidTile, RiskPyramid
+from api.services.static_layers import static_layers
+from api.services.tile_processor import Tile, TileBatch, tile_processor
+
+logger = logging.getLogger("pyroscan.predict")
+
+# Scored tiles keyed by (cell id, day offset, ensemble version, live data).
+# The ensemble version makes entries from replaced models unreachable; the
+# reload listener frees them straight away.
+TILE_CACHE_MAX_ENTRIES = int(os.getenv("PYROSCAN_TILE_CACHE_MAX_ENTRIES", "50000"))
+tile_score_cache = ResponseCache(max_entries=TILE_CACHE_MAX_ENTRIES)
+model_loader.add_reload_listener(tile_score_cache.clear)
+
+# Streamed batches start at STREAM_INITIAL_BATCH tiles so the first tiles
+# paint quickly, then grow by STREAM_GROWTH towards the ensemble's
+# calibrated optimal batch size.
+STREAM_INITIAL_BATCH = int(os.getenv("PYROSCAN_STREAM_INITIAL_BATCH", "8"))
+STREAM_GROWTH = float(os.getenv("PYROSCAN_STREAM_GROWTH", "2"))
+# Slices whose features are fetched ahead of inference while streaming
+# (0 runs fetch and inference back to back on the request thread).
+STREAM_PREFETCH = int(os.getenv("PYROSCAN_STREAM_PREFETCH", "2"))
 
 
 def _heuristic_scores(features: np.ndarray) -> np.ndarray:
@@ -37,6 +69,11 @@ def _heuristic_scores(features: np.ndarray) -> np.ndarray:
 
 def _get_score(feature_matrix: np.ndarray) -> np.ndarray:
     if model_loader.is_loaded():
+        if inference_pool.accepts(len(feature_matrix)):
+            try:
+                return inference_pool.predict(feature_matrix, model_loader.fingerprint)
+            except Exception:
+                logger.warning("Inference pool failed; scoring in-process", exc_info=True)
         try:
             return model_loader.predict(feature_matrix)
         except Exception:
@@ -44,40 +81,305 @@ def _get_score(feature_matrix: np.ndarray) -> np.ndarray:
     return _heuristic_scores(feature_matrix)
 
 
-def score_tiles_sync(tiles, day_offset: int = 0):
-    features_list = [
-        data_fetcher.fetch_features_sync(t.lat, t.lon, day_offset, use_live_data=False)
-        for t in tiles
-    ]
-    matrix = np.array([feature_row.to_numpy() for feature_row in features_list], dtype=np.float32)
-    scores = _get_score(matrix)
-    for tile, score, feature_row in zip(tiles, scores, features_list):
-        tile.classify(float(np.clip(score, 0.0, 1.0)))
+@dataclass
+class _PreparedBatch:
+    """A batch whose cache lookups and feature fetch are done, awaiting inference."""
+
+    batch: TileBatch
+    keys: list
+    scored: list
+    pending: np.ndarray
+    matrix: Optional[np.ndarray]
+    use_live_data: bool
+    fetch_ms: float = 0.0
+
+
+def _prepare_batch(batch: TileBatch, day_offset: int, use_live_data: bool) -> _PreparedBatch:
+    started = time.perf_counter()
+    version = model_loader.version
+    keys = [(tile_id, day_offset, version, use_live_data) for tile_id in batch.ids]
+    scored = [tile_score_cache.get(key) for key in keys]
+    pending = np.array([i for i, hit in enumerate(scored) if hit is None], dtype=np.intp)
+    matrix = None
+    if len(pending):
+        with metrics.timer("fetch_features", rows=len(pending)):
+            matrix = data_fetcher.fetch_feature_matrix_sync(
+                batch.lats[pending], batch.lons[pending], day_offset, use_live_data=use_live_data
+            )
+    fetch_ms = (time.perf_counter() - started) * 1000.0
+    return _PreparedBatch(batch, keys, scored, pending, matrix, use_live_data, fetch_ms)
+
+
+def _finish_batch(prepared: _PreparedBatch) -> TileBatch:
+    batch, scored = prepared.batch, prepared.scored
+    if prepared.matrix is not None:
+        with metrics.timer("ensemble_score", rows=len(prepared.pending)):
+            scores = np.clip(_get_score(prepared.matrix), 0.0, 1.0)
+        # Live scores go stale with the upstream forecast they were built from.
+        ttl = CACHE_TTLS["forecast"] if prepared.use_live_data else None
+        for i, score, feature_row in zip(prepared.pending.tolist(), scores.tolist(), prepared.matrix):
+            scored[i] = (score, feature_row)
+            tile_score_cache.put(prepared.keys[i], scored[i], ttl)
+
+    if scored:
+        batch.features = np.stack([feature_row for _, feature_row in scored])
+    batch.classify([score for score, _ in scored])
+    return batch
+
+
+def score_tile_batch(batch: TileBatch, day_offset: int = 0, use_live_data: bool = False) -> TileBatch:
+    """Score a columnar batch in place, reusing cached cells where possible."""
+    return _finish_batch(_prepare_batch(batch, day_offset, use_live_data))
+
+
+def score_tile_cube(batch: TileBatch, day_offsets, use_live_data: bool = False) -> np.ndarray:
+    """
+    Scores (0–1) for every tile and day offset, shape ``(tiles, days)``.
+
+    Tiles missing any day are fetched as one feature cube and the stacked
+    ``(days × tiles, 14)`` matrix is scored in a single ensemble call.
+    """
+    day_offsets = list(day_offsets)
+    version = model_loader.version
+    keys = [[(tile_id, day, version, use_live_data) for day in day_offsets] for tile_id in batch.ids]
+    scored = [[tile_score_cache.get(key) for key in row] for row in keys]
+    pending = np.array([i for i, row in enumerate(scored) if any(hit is None for hit in row)], dtype=np.intp)
+    if len(pending):
+        with metrics.timer("fetch_features", rows=len(pending) * len(day_offsets)):
+            cube = data_fetcher.fetch_feature_cube_sync(
+                batch.lats[pending], batch.lons[pending], day_offsets, use_live_data=use_live_data
+            )
+        with metrics.timer("ensemble_score", rows=cube.shape[0] * cube.shape[1]):
+            scores = np.clip(_get_score(cube.reshape(-1, cube.shape[-1])), 0.0, 1.0)
+        scores = scores.reshape(cube.shape[:2])
+        ttl = CACHE_TTLS["forecast"] if use_live_data else None
+        for j, i in enumerate(pending.tolist()):
+            for d in range(len(day_offsets)):
+                scored[i][d] = (float(scores[d, j]), cube[d, j])
+                tile_score_cache.put(keys[i][d], scored[i][d], ttl)
+    return np.array([[score for score, _ in row] for row in scored], dtype=np.float64).reshape(
+        len(batch), len(day_offsets)
+    )
+
+
+def _scored_tiles(batch: TileBatch, tiles=None):
+    """Materialise ``Tile`` objects (or update the given ones) with breakdowns."""
+    if tiles is None:
+        tiles = batch.to_tiles()
+    else:
+        for tile, score in zip(tiles, batch.scores.tolist()):
+            tile.classify(score)
+    for tile, feature_row in zip(tiles, batch.features.tolist() if len(batch) else []):
         tile.factor_breakdown = tile_processor.build_factor_breakdown(
-            feature_row.__dict__, tile.risk_score / 100
+            dict(zip(FEATURE_COLUMNS, feature_row)), tile.risk_score / 100
         )
     return tiles
 
 
-def score_tiles_stream(tiles, day_offset: int = 0, batch_size: int = 15):
-    for i in range(0, len(tiles), batch_size):
-        batch = tiles[i:i + batch_size]
-        features_list = [
-            data_fetcher.fetch_features_sync(t.lat, t.lon, day_offset, use_live_data=False)
-            for t in batch
-        ]
-        matrix = np.array([feature_row.to_numpy() for feature_row in features_list], dtype=np.float32)
-        scores = _get_score(matrix)
-        for tile, score, feature_row in zip(batch, scores, features_list):
-            tile.classify(float(np.clip(score, 0.0, 1.0)))
-            tile.factor_breakdown = tile_processor.build_factor_breakdown(
-                feature_row.__dict__, tile.risk_score / 100
-            )
-        yield batch
+def _score_tiles(tiles, day_offset: int, use_live_data: bool):
+    if isinstance(tiles, TileBatch):
+        return _scored_tiles(score_tile_batch(tiles, day_offset, use_live_data))
+    batch = score_tile_batch(TileBatch.from_tiles(tiles), day_offset, use_live_data)
+    return _scored_tiles(batch, tiles)
+
+
+def score_tiles_sync(tiles, day_offset: int = 0, use_live_data: bool = False):
+    with metrics.timer("score_tiles", rows=len(tiles)):
+        return _score_tiles(tiles, day_offset, use_live_data)
+
+
+class BatchSizer:
+    """
+    Picks the size of each streamed batch.
+
+    Sizes grow geometrically from ``initial`` up to ``maximum``. With a
+    ``flush_ms`` target the next size is also capped by the rows/ms observed
+    so far, so each flush lands near the requested interval.
+    """
+
+    def __init__(
+        self,
+        initial: int = STREAM_INITIAL_BATCH,
+        maximum: Optional[int] = None,
+        growth: float = STREAM_GROWTH,
+        flush_ms: Optional[float] = None,
+    ) -> None:
+        self.maximum = max(1, maximum or model_loader.optimal_batch_size)
+        self.size = max(1, min(initial, self.maximum))
+        self.growth = max(1.0, growth)
+        self.flush_ms = flush_ms if flush_ms and flush_ms > 0 else None
+
+    def record(self, rows: int, elapsed_ms: float) -> None:
+        target = self.size * self.growth
+        if self.flush_ms is not None and rows and elapsed_ms > 0:
+            target = min(target, rows * self.flush_ms / elapsed_ms)
+        self.size = int(max(1, min(self.maximum, target)))
+
+
+_STREAM_DONE = object()
+
+
+def _stream_slices(tiles, day_offset, use_live_data, batch_size, flush_ms, emit):
+    """
+    Yield ``emit(chunk, scored_batch)`` for consecutive slices of ``tiles``.
+
+    A producer thread fetches features for up to STREAM_PREFETCH upcoming
+    slices while the caller's thread runs inference on the current one, so
+    network time and model time overlap. A fixed ``batch_size`` keeps the old
+    slicing; otherwise a BatchSizer adapts it.
+    """
+    sizer = None if batch_size else BatchSizer(flush_ms=flush_ms)
+
+    def slices():
+        start = 0
+        while start < len(tiles):
+            size = batch_size or sizer.size
+            yield tiles[start:start + size]
+            start += size
+
+    def prepare(chunk):
+        batch = chunk if isinstance(chunk, TileBatch) else TileBatch.from_tiles(chunk)
+        return chunk, _prepare_batch(batch, day_offset, use_live_data)
+
+    def finish(chunk, prepared):
+        started = time.perf_counter()
+        result = emit(chunk, _finish_batch(prepared))
+        if sizer is not None:
+            # Pipelined, a slice costs roughly the slower of its two stages.
+            score_ms = (time.perf_counter() - started) * 1000.0
+            sizer.record(len(prepared.batch), max(prepared.fetch_ms, score_ms))
+        return result
+
+    if STREAM_PREFETCH <= 0:
+        for chunk in slices():
+            yield finish(*prepare(chunk))
+        return
+
+    ready: queue.Queue = queue.Queue(maxsize=STREAM_PREFETCH)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for chunk in slices():
+                item = prepare(chunk)
+                while not stop.is_set():
+                    try:
+                        ready.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as exc:  # surfaced in the consumer
+            ready.put(exc)
+        finally:
+            ready.put(_STREAM_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True, name="PyroPrefetch")
+    producer.start()
+    try:
+        while True:
+            item = ready.get()
+            if item is _STREAM_DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield finish(*item)
+    finally:
+        # The client may disconnect mid-stream; let the producer wind down.
+        stop.set()
+        while producer.is_alive():
+            try:
+                ready.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def score_tiles_stream(
+    tiles,
+    day_offset: int = 0,
+    batch_size: Optional[int] = None,
+    use_live_data: bool = False,
+    flush_ms: Optional[float] = None,
+):
+    def emit(chunk, batch):
+        return _scored_tiles(batch, None if isinstance(chunk, TileBatch) else chunk)
+
+    yield from _stream_slices(tiles, day_offset, use_live_data, batch_size, flush_ms, emit)
+
+
+def score_batches_stream(
+    batch: TileBatch,
+    day_offset: int = 0,
+    batch_size: Optional[int] = None,
+    use_live_data: bool = False,
+    flush_ms: Optional[float] = None,
+):
+    """Like ``score_tiles_stream`` but yields scored ``TileBatch`` slices (no breakdowns)."""
+    yield from _stream_slices(
+        batch, day_offset, use_live_data, batch_size, flush_ms, lambda chunk, scored: scored
+    )
+
+
+def score_cells(batch: TileBatch, day_offset: int = 0, use_live_data: bool = False) -> TileBatch:
+    """Score a columnar batch in place, bypassing ``tile_score_cache``."""
+    with metrics.timer("fetch_features", rows=len(batch)):
+        matrix = data_fetcher.fetch_feature_matrix_sync(
+            batch.lats, batch.lons, day_offset, use_live_data=use_live_data
+        )
+    with metrics.timer("ensemble_score", rows=len(batch)):
+        scores = np.clip(_get_score(matrix), 0.0, 1.0)
+    batch.features = matrix
+    return batch.classify(scores)
+
+
+# Zoom pyramid over the same per-cell scoring as /api/risk/tiles. It keeps
+# its cells in its own LRU so filling the base level cannot evict the tile cache.
+risk_pyramid = RiskPyramid(score_cells)
+model_loader.add_reload_listener(risk_pyramid.clear)
+
+
+def pyramid_tile(z: int, x: int, y: int, day_offset: int = 0, use_live_data: bool = False) -> PyramidTile:
+    with metrics.timer("pyramid_tile", z=str(z)):
+        return risk_pyramid.tile(z, x, y, day_offset, use_live_data, version=model_loader.version)
+
+
+def offline_fingerprint() -> str:
+    """Identifies what offline scores depend on: the model files and the static rasters."""
+    return f"{model_loader.fingerprint}-{static_layers.signature}"
+
+
+# Precomputed global grids, served by /api/risk/tiles when the request matches.
+snapshot_store = SnapshotStore(SNAPSHOT_DIR or None)
+precomputer = Precomputer(
+    score_tile_batch,
+    lambda batch: [t.to_dict() for t in _scored_tiles(batch)],
+    offline_fingerprint,
+    snapshot_store,
+)
+model_loader.add_reload_listener(precomputer.trigger)
+if PRECOMPUTE_ENABLED:
+    precomputer.start()
+if inference_pool.enabled:
+    inference_pool.start()
+
+
+def precomputed_snapshot(min_lat, min_lon, max_lat, max_lon, tile_deg, day_offset) -> Optional[Snapshot]:
+    for grid in precomputer.grids:
+        if grid.matches(min_lat, min_lon, max_lat, max_lon, tile_deg):
+            snapshot = snapshot_store.get(grid, day_offset, offline_fingerprint())
+            if snapshot is not None and snapshot.tiles is None:
+                snapshot.tiles = [t.to_dict() for t in _scored_tiles(snapshot.batch)]
+            return snapshot
+    return None
 
 
 def score_single_tile_sync(zone_id, lat, lon, day_offset: int = 0):
-    features = data_fetcher.fetch_features_sync(lat, lon, day_offset)
+    return zone_payload(zone_id, lat, lon, data_fetcher.fetch_features_sync(lat, lon, day_offset))
+
+
+def zone_payload(zone_id, lat, lon, features):
+    """Score one tile's fetched features (CPU only; shared by the sync and async APIs)."""
     matrix = np.array([features.to_numpy()], dtype=np.float32)
     score = float(np.clip(_get_score(matrix)[0], 0.0, 1.0))
     tile = Tile(id=zone_id, lat=lat, lon=lon, lat_size=1.0, lon_size=1.0)
@@ -89,15 +391,18 @@ def score_single_tile_sync(zone_id, lat, lon, day_offset: int = 0):
     return payload
 
 
-def forecast_sync(lat, lon):
-    days = []
-    for offset in range(10):
-        features = data_fetcher.fetch_features_sync(lat, lon, offset)
-        matrix = np.array([features.to_numpy()], dtype=np.float32)
-        score = float(np.clip(_get_score(matrix)[0], 0.0, 1.0))
+def forecast_sync(lat, lon, days: int = 10):
+    return forecast_payload(lat, lon, data_fetcher.fetch_forecast_matrix_sync(lat, lon, days))
+
+
+def forecast_payload(lat, lon, matrix):
+    """Score a ``(days, 14)`` forecast matrix (CPU only; shared by the sync and async APIs)."""
+    scores = np.clip(_get_score(matrix), 0.0, 1.0)
+    forecast_days = []
+    for offset, score in enumerate(scores):
         tile = Tile(id=f"fc_{offset}", lat=lat, lon=lon, lat_size=1, lon_size=1)
-        tile.classify(score)
-        days.append(
+        tile.classify(float(score))
+        forecast_days.append(
             {
                 "day": offset,
                 "date": (date.today() + timedelta(days=offset)).isoformat(),
@@ -110,7 +415,7 @@ def forecast_sync(lat, lon):
     return {
         "lat": lat,
         "lon": lon,
-        "forecast_days": days,
+        "forecast_days": forecast_days,
         "model_active": model_loader.is_loaded(),
         "model_names": model_loader.model_names,
     }
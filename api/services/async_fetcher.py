@@ -0,0 +1,132 @@
+"""PyroScan DataFetcher — async ASGI version.
+
+Same features, cache keys and fallbacks as ``DataFetcher`` (request
+parameters, response parsing and feature assembly are inherited), with the
+upstream calls awaited on ``AsyncFetchEngine``. The module singleton shares
+``data_fetcher``'s cache, so the sync and async paths fill one cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from api.services.async_http import async_fetch_engine
+from api.services.data_fetcher import (
+    CACHE_GRID_DEG, OPEN_METEO_URL, OWM_API_KEY, OWM_URL, DataFetcher, data_fetcher,
+)
+from api.services.http_pool import FETCH_DEADLINE
+
+logger = logging.getLogger("pyroscan.async_fetcher")
+
+
+class AsyncDataFetcher(DataFetcher):
+    def __init__(self, cache=None, grid_deg=CACHE_GRID_DEG, ttls=None, http=None, ahttp=None):
+        super().__init__(cache=cache, grid_deg=grid_deg, ttls=ttls, http=http)
+        self.ahttp = ahttp if ahttp is not None else async_fetch_engine
+
+    async def fetch_weather(self, lat, lon):
+        return await self._weather_async(lat, lon, use_live_data=True)
+
+    async def fetch_features(self, lat, lon, day_offset=0, use_live_data=True):
+        w, f = await asyncio.gather(
+            self._weather_async(lat, lon, use_live_data),
+            self._forecast_async(lat, lon, day_offset, use_live_data),
+        )
+        return self._assemble(lat, lon, w, f)
+
+    async def fetch_forecast_matrix(self, lat, lon, days=10, use_live_data=True):
+        """Feature matrix ``(days, 14)`` for one location, one row per day offset."""
+        if use_live_data:
+            w, daily = await asyncio.gather(
+                self._weather_async(lat, lon, use_live_data), self._daily_or_none(lat, lon, days),
+            )
+        else:
+            w, daily = self._synth_weather(lat, lon), None
+        forecasts = (
+            [self._summarise_daily(daily, offset) for offset in range(days)] if daily is not None
+            else [self._synth_forecast(offset) for offset in range(days)]
+        )
+        return np.stack([self._assemble(lat, lon, w, f).to_numpy() for f in forecasts])
+
+    async def fetch_feature_cube(self, lats, lons, day_offsets, use_live_data=True, deadline=FETCH_DEADLINE):
+        """Feature cube ``(days, N, 14)``; see ``DataFetcher.fetch_feature_cube_sync``."""
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        day_offsets = list(day_offsets)
+        if not use_live_data or not len(lats):
+            return self._cube(lats, lons, day_offsets)
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+        dailies, weather = await self._grid_upstream(lat_list, lon_list, max(day_offsets) + 1, deadline)
+        return self._cube(lats, lons, day_offsets, dailies, weather)
+
+    async def fetch_feature_matrix(self, lats, lons, day_offset=0, use_live_data=True, deadline=FETCH_DEADLINE):
+        return (await self.fetch_feature_cube(lats, lons, [day_offset], use_live_data, deadline))[0]
+
+    async def prefetch_grid(self, lats, lons, days, deadline=FETCH_DEADLINE):
+        """Fill the cache with every upstream series a sync grid fetch would need."""
+        await self._grid_upstream(list(lats), list(lons), days, deadline)
+
+    async def _grid_upstream(self, lats, lons, days, deadline):
+        end = time.monotonic() + deadline if deadline else None
+        dailies = await self._daily_grid_async(lats, lons, days, deadline)
+        weather = None
+        if OWM_API_KEY:
+            remaining = max(0.001, end - time.monotonic()) if end else None
+            weather = await self.ahttp.gather(
+                lambda ll: self._live_weather_async(*ll), list(zip(lats, lons)), deadline=remaining,
+            )
+        return dailies, weather
+
+    async def _weather_async(self, lat, lon, use_live_data=True):
+        if use_live_data and OWM_API_KEY:
+            try:
+                return await self._live_weather_async(lat, lon)
+            except Exception:
+                pass
+        return self._synth_weather(lat, lon)
+
+    async def _live_weather_async(self, lat, lon):
+        key = self._cache_key("weather", lat, lon)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        r = await self.ahttp.get(OWM_URL, params=self._weather_params(key), timeout=6)
+        return self._store_weather(key, r.json())
+
+    async def _forecast_async(self, lat, lon, day_offset, use_live_data=True):
+        daily = await self._daily_or_none(lat, lon, day_offset + 1) if use_live_data else None
+        if daily is None:
+            return self._synth_forecast(day_offset)
+        return self._summarise_daily(daily, day_offset)
+
+    async def _daily_or_none(self, lat, lon, days):
+        key = self._cache_key("forecast", lat, lon)
+        daily = self._cached_daily(key, days)
+        if daily is not None:
+            return daily
+        try:
+            r = await self.ahttp.get(OPEN_METEO_URL, params=self._point_daily_params(key, days), timeout=6)
+            return self._store_dailies([key], r.json())[0]
+        except Exception:
+            return None
+
+    async def _daily_grid_async(self, lats, lons, days, deadline=FETCH_DEADLINE):
+        keys, dailies, chunks = self._daily_plan(lats, lons, days)
+        results = await self.ahttp.gather(lambda chunk: self._daily_chunk_async(chunk, days), chunks, deadline=deadline)
+        for chunk, fetched in zip(chunks, results):
+            if fetched is None:
+                logger.warning("Open-Meteo grid chunk failed or timed out; using synthetic forecast")
+                continue
+            dailies.update(zip(chunk, fetched))
+        return [dailies.get(key) for key in keys]
+
+    async def _daily_chunk_async(self, keys, days):
+        r = await self.ahttp.get(OPEN_METEO_URL, params=self._daily_params(keys, days), timeout=6)
+        return self._store_dailies(keys, r.json())
+
+
+async_data_fetcher = AsyncDataFetcher(cache=data_fetcher.cache)
@@ -0,0 +1,152 @@
+"""PyroScan async upstream fetch engine.
+
+The asyncio counterpart of ``http_pool.FetchEngine`` for the ASGI entry
+point: a pooled ``httpx.AsyncClient``, the same per-host rate limits, and
+``gather`` with the same contract as ``FetchEngine.map`` (order preserved,
+failures and deadline misses come back as ``None``). A slow upstream costs a
+suspended coroutine rather than a thread, so one process can hold hundreds
+of lookups in flight.
+
+Requires ``httpx`` (``pip install httpx``); it is imported on first use.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from urllib.parse import urlsplit
+
+from api.services.http_pool import DEFAULT_RATE_LIMIT, FETCH_DEADLINE, HOST_RATE_LIMITS, DeadlineExceeded
+from api.services.metrics import metrics
+
+logger = logging.getLogger("pyroscan.async_http")
+
+ASYNC_FETCH_CONNECTIONS = int(os.getenv("PYROSCAN_ASYNC_FETCH_CONNECTIONS", "100"))
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("pyroscan_deadline", default=None)
+
+
+class AsyncHostRateLimiter:
+    """Spaces requests to one host at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        # No await between reading and advancing the slot, so no lock is needed.
+        now = time.monotonic()
+        slot = max(now, self._next)
+        if deadline is not None and slot > deadline:
+            raise DeadlineExceeded("rate limit slot falls after the deadline")
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncFetchEngine:
+    def __init__(
+        self,
+        max_connections: int = ASYNC_FETCH_CONNECTIONS,
+        rate_limits: Optional[dict[str, float]] = None,
+        default_rate: float = DEFAULT_RATE_LIMIT,
+    ) -> None:
+        self.max_connections = max(1, max_connections)
+        self._rate_limits = {**HOST_RATE_LIMITS, **(rate_limits or {})}
+        self._default_rate = default_rate
+        self._limiters: dict[str, AsyncHostRateLimiter] = {}
+        self._client: Any = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.deadline_misses = 0
+
+    def client(self):
+        """The pooled client of the running event loop (created on first use)."""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def get(self, url: str, params: Any = None, timeout: float = 6, **kwargs: Any):
+        """Rate-limited GET on the pooled client, clipped to the active deadline."""
+        deadline = _deadline.get()
+        await self._limiter(url).acquire(deadline)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(url)
+            timeout = min(timeout, remaining)
+        host = urlsplit(url).hostname or ""
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return await self.client().get(url, params=params, timeout=timeout, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.observe(
+                "upstream_request", time.perf_counter() - started, host=host, status=status
+            )
+
+    async def gather(
+        self,
+        fn: Callable[[Any], Awaitable[Any]],
+        items: Iterable[Any],
+        deadline: Optional[float] = FETCH_DEADLINE,
+    ) -> list[Any]:
+        """Await ``fn`` over ``items`` concurrently, preserving order.
+
+        Items that raise, or are not finished ``deadline`` seconds from now,
+        come back as ``None``.
+        """
+        items = list(items)
+        if not items:
+            return []
+        end = time.monotonic() + deadline if deadline else None
+        tasks = [asyncio.ensure_future(self._call(fn, item, end)) for item in items]
+        done, pending = await asyncio.wait(tasks, timeout=deadline or None)
+        for task in pending:
+            task.cancel()
+        if pending:
+            self.deadline_misses += len(pending)
+            logger.warning("%d upstream lookups missed the %.1fs deadline", len(pending), deadline)
+        return [
+            task.result() if task in done and task.exception() is None else None
+            for task in tasks
+        ]
+
+    @staticmethod
+    async def _call(fn: Callable[[Any], Awaitable[Any]], item: Any, deadline: Optional[float]) -> Any:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded("deadline passed before the lookup started")
+        _deadline.set(deadline)   # each task runs in its own context copy
+        return await fn(item)
+
+    def _limiter(self, url: str) -> AsyncHostRateLimiter:
+        host = urlsplit(url).hostname or ""
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = AsyncHostRateLimiter(
+                self._rate_limits.get(host, self._default_rate)
+            )
+        return limiter
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async_fetch_engine = AsyncFetchEngine()
@@ -1,13 +1,89 @@
 """PyroScan DataFetcher — sync Flask version"""
 from __future__ import annotations
-import logging, os, random
+import logging, os, random, threading, time
+from collections import OrderedDict
+from datetime import date
 import numpy as np
-import requests as req_lib
+
+from api.services.http_pool import FETCH_DEADLINE, fetch_engine
+from api.services.static_layers import STATIC_LAYERS, static_layers
 
 logger = logging.getLogger("pyroscan.data_fetcher")
 OWM_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY", "")
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+OWM_URL = "https://api.openweathermap.org/data/2.5/weather"
+# Open-Meteo accepts comma-separated coordinate lists; keep each URL well
+# below common proxy limits.
+OPEN_METEO_CHUNK = 100
+
+# Upstream responses are cached per grid cell: coordinates are snapped to
+# CACHE_GRID_DEG so nearby requests (e.g. the same map centroid hitting
+# weather, vegetation and temperature endpoints at once) share one fetch.
+CACHE_GRID_DEG = float(os.getenv("PYROSCAN_CACHE_GRID_DEG", "0.1"))
+CACHE_MAX_ENTRIES = int(os.getenv("PYROSCAN_CACHE_MAX_ENTRIES", "4096"))
+CACHE_TTLS = {
+    "weather": float(os.getenv("PYROSCAN_CACHE_WEATHER_TTL", "600")),
+    "forecast": float(os.getenv("PYROSCAN_CACHE_FORECAST_TTL", "3600")),
+}
+
+from dataclasses import dataclass, fields
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTLs and hit/miss/eviction counters.
+
+    Anything exposing ``get``/``put``/``clear``/``stats`` can be passed to
+    :class:`DataFetcher` instead.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            expires_at = self._clock() + ttl if ttl is not None else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
 
-from dataclasses import dataclass
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "expirations": self.expirations,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
 
 @dataclass
 class TileFeatures:
@@ -34,86 +110,347 @@ class TileFeatures:
             self.fuel_moisture_code, self.historical_fire_count], dtype=np.float32)
 
 
+FEATURE_COLUMNS = tuple(f.name for f in fields(TileFeatures))
+
+# Synthetic layers use a counter-based RNG: every draw is a pure hash of the
+# quantised coordinates and a per-draw stream id, so a whole grid is generated
+# with a handful of array operations and any tile is reproducible on its own.
+_STREAMS = {name: i + 1 for i, name in enumerate((
+    "temp", "humidity", "wind_speed", "wind_dir", "slope", "aspect",
+    "elevation", "ndvi", "evi", "human", "fire"))}
+_K_LAT = np.uint64(0x9E3779B97F4A7C15)
+_K_LON = np.uint64(0xC2B2AE3D27D4EB4F)
+_K_STREAM = np.uint64(0x165667B19E3779F9)
+
+
+def _mix64(x):
+    """splitmix64 finaliser over a uint64 array."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(lats, lons, stream, low=0.0, high=1.0):
+    qlat = np.round(lats * 1e4).astype(np.int64).view(np.uint64)
+    qlon = np.round(lons * 1e4).astype(np.int64).view(np.uint64)
+    bits = _mix64(qlat * _K_LAT ^ _mix64(qlon * _K_LON ^ np.uint64(_STREAMS[stream]) * _K_STREAM))
+    return low + (high - low) * ((bits >> np.uint64(11)).astype(np.float64) * 2.0**-53)
+
+
+def _synth_weather_columns(lats, lons):
+    return {"temp": 35-np.abs(lats)*0.5+_uniform(lats, lons, "temp", -5, 5),
+            "humidity": _uniform(lats, lons, "humidity", 20, 70),
+            "wind_speed": _uniform(lats, lons, "wind_speed", 1, 15),
+            "wind_dir": _uniform(lats, lons, "wind_dir", 0, 360)}
+
+
+def _terrain_columns(lats, lons):
+    return {"slope": _uniform(lats, lons, "slope", 0, 35),
+            "aspect": _uniform(lats, lons, "aspect", 0, 360),
+            "elevation": np.abs(lats)*20+_uniform(lats, lons, "elevation", 0, 300)}
+
+
+def _vegetation_columns(lats, lons):
+    ndvi = np.clip(0.6-np.abs(lats)*0.005+_uniform(lats, lons, "ndvi", -0.2, 0.2), -0.2, 0.9)
+    return {"ndvi": ndvi, "evi": ndvi*0.9+_uniform(lats, lons, "evi", -0.05, 0.05)}
+
+
+def _human_column(lats, lons):
+    return np.round(_uniform(lats, lons, "human", 0, 0.8), 3)
+
+
+def _hist_fire_column(lats, lons):
+    return np.floor(_uniform(lats, lons, "fire", 0, 13))
+
+
+def _fmc_column(temp, humidity, wind, precip):
+    return np.clip(temp*0.3+(100-humidity)*0.4+wind*0.2-precip*0.1, 0, 100)
+
+
+# Columns that vary with the forecast day; every other column is the same
+# for all day offsets of a tile.
+DAY_COLUMNS = (6, 11, 12)
+
+
+def synth_static_columns(lats, lons):
+    """Synthetic values of every location-only column, keyed by feature name."""
+    t = _terrain_columns(lats, lons)
+    v = _vegetation_columns(lats, lons)
+    return {"ndvi": v["ndvi"], "evi": v["evi"], **t,
+            "human_density_index": _human_column(lats, lons),
+            "historical_fire_count": _hist_fire_column(lats, lons)}
+
+
+def _static_columns(lats, lons):
+    # Precomputed rasters win; anything not on disk is generated on the fly.
+    stored = static_layers.lookup(lats, lons)
+    if len(stored) == len(STATIC_LAYERS):
+        return stored
+    return {**synth_static_columns(lats, lons), **stored}
+
+
+_STATIC_INDEX = {name: FEATURE_COLUMNS.index(name) for name in STATIC_LAYERS}
+
+
+def _base_feature_matrix(lats, lons):
+    """Day-independent part of the synthetic matrix plus the weather columns used for FMC."""
+    w = _synth_weather_columns(lats, lons)
+    matrix = np.empty((len(lats), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for name, values in _static_columns(lats, lons).items():
+        matrix[:, _STATIC_INDEX[name]] = values
+    matrix[:, 2], matrix[:, 3] = w["temp"], w["humidity"]
+    matrix[:, 4], matrix[:, 5] = w["wind_speed"], w["wind_dir"]
+    return matrix, w
+
+
+def _set_day_columns(matrix, w, precip, days_since_rain):
+    matrix[:, 6] = precip
+    matrix[:, 11] = days_since_rain
+    matrix[:, 12] = _fmc_column(w["temp"], w["humidity"], w["wind_speed"], precip)
+
+
+def synth_feature_matrix(lats, lons, day_offset=0):
+    """Synthetic ``(N, 14)`` float32 feature matrix for arrays of tile centroids."""
+    lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+    lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+    matrix, w = _base_feature_matrix(lats, lons)
+    f = DataFetcher._synth_forecast(day_offset)
+    _set_day_columns(matrix, w, f["precip_7d"], f["days_since_rain"])
+    return matrix
+
+
+def _scalar(columns):
+    return {key: value.item() for key, value in columns.items()}
+
+
 class DataFetcher:
+    def __init__(self, cache=None, grid_deg=CACHE_GRID_DEG, ttls=None, http=None):
+        self.cache = cache if cache is not None else ResponseCache()
+        self.http = http if http is not None else fetch_engine
+        self.grid_deg = grid_deg
+        self.ttls = {**CACHE_TTLS, **(ttls or {})}
+
     def fetch_features_sync(self, lat, lon, day_offset=0, use_live_data=True):
         w = self._weather(lat, lon, use_live_data=use_live_data)
         f = self._forecast(lat, lon, day_offset, use_live_data=use_live_data)
-        t = self._terrain(lat, lon)
-        v = self._vegetation(lat, lon)
+        return self._assemble(lat, lon, w, f)
+
+    def fetch_feature_matrix_sync(self, lats, lons, day_offset=0, use_live_data=True, deadline=FETCH_DEADLINE):
+        """Feature matrix ``(N, 14)`` for a whole grid of tile centroids.
+
+        Synthetic layers are generated in one vectorised pass; with live data
+        the forecast (and, with an OpenWeatherMap key, weather) columns are
+        overlaid. Upstream lookups run concurrently on the fetch engine and any
+        tile still missing after ``deadline`` seconds keeps its synthetic values.
+        """
+        return self.fetch_feature_cube_sync(lats, lons, [day_offset], use_live_data, deadline)[0]
+
+    def fetch_feature_cube_sync(self, lats, lons, day_offsets, use_live_data=True, deadline=FETCH_DEADLINE):
+        """Feature cube ``(days, N, 14)``: one feature matrix per day offset.
+
+        Static and weather columns are built once per tile; only DAY_COLUMNS
+        change between days, all derived from one daily series per cell.
+        """
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        day_offsets = list(day_offsets)
+        if not use_live_data or not len(lats):
+            return self._cube(lats, lons, day_offsets)
+        end = time.monotonic() + deadline if deadline else None
+        lat_list, lon_list = lats.tolist(), lons.tolist()
+        dailies = self._daily_grid(lat_list, lon_list, max(day_offsets) + 1, deadline=deadline)
+        weather = None
+        if OWM_API_KEY:
+            remaining = max(0.001, end - time.monotonic()) if end else None
+            weather = self.http.map(lambda ll: self._live_weather(*ll), zip(lat_list, lon_list), deadline=remaining)
+        return self._cube(lats, lons, day_offsets, dailies, weather)
+
+    def _cube(self, lats, lons, day_offsets, dailies=None, weather=None):
+        """Assemble the feature cube from upstream results (``None`` entries stay synthetic)."""
+        base, w = _base_feature_matrix(lats, lons)
+        cube = np.repeat(base[None], len(day_offsets), axis=0)
+        if dailies is None:
+            for matrix, day_offset in zip(cube, day_offsets):
+                f = self._synth_forecast(day_offset)
+                _set_day_columns(matrix, w, f["precip_7d"], f["days_since_rain"])
+            return cube
+        if weather is not None:
+            for i, live in enumerate(weather):
+                if live is not None:
+                    base[i, 2:6] = (live["temp"], live["humidity"], live["wind_speed"], live["wind_dir"])
+            cube[:, :, 2:6] = base[:, 2:6]
+        w = {"temp": base[:, 2].astype(np.float64), "humidity": base[:, 3].astype(np.float64),
+             "wind_speed": base[:, 4].astype(np.float64)}
+        for matrix, day_offset in zip(cube, day_offsets):
+            forecasts = [self._summarise_daily(daily, day_offset) if daily is not None
+                         else self._synth_forecast(day_offset) for daily in dailies]
+            _set_day_columns(matrix, w, np.array([f["precip_7d"] for f in forecasts], dtype=np.float64),
+                             [f["days_since_rain"] for f in forecasts])
+        return cube
+
+    def fetch_forecast_matrix_sync(self, lat, lon, days=10, use_live_data=True):
+        """Feature matrix ``(days, 14)`` for one location, one row per day offset.
+
+        The daily series is fetched once and every day's row is derived from it.
+        """
+        w = self._weather(lat, lon, use_live_data=use_live_data)
+        forecasts = self._forecast_days(lat, lon, days, use_live_data=use_live_data)
+        return np.stack([self._assemble(lat, lon, w, f).to_numpy() for f in forecasts])
+
+    def _assemble(self, lat, lon, w, f):
+        st = _scalar(_static_columns(np.array([lat], dtype=np.float64), np.array([lon], dtype=np.float64)))
         fmc = self._calc_fmc(w["temp"], w["humidity"], w["wind_speed"], f["precip_7d"])
-        return TileFeatures(ndvi=v["ndvi"], evi=v["evi"],
+        return TileFeatures(ndvi=st["ndvi"], evi=st["evi"],
             land_surface_temp=w["temp"], relative_humidity=w["humidity"],
             wind_speed=w["wind_speed"], wind_direction=w["wind_dir"],
-            precipitation_7d=f["precip_7d"], slope=t["slope"], aspect=t["aspect"],
-            elevation=t["elevation"], human_density_index=self._human(lat, lon),
+            precipitation_7d=f["precip_7d"], slope=st["slope"], aspect=st["aspect"],
+            elevation=st["elevation"], human_density_index=st["human_density_index"],
             days_since_last_rain=f["days_since_rain"], fuel_moisture_code=fmc,
-            historical_fire_count=self._hist_fire(lat, lon))
+            historical_fire_count=int(st["historical_fire_count"]))
 
     def fetch_weather_sync(self, lat, lon):
         return self._weather(lat, lon, use_live_data=True)
 
+    def _snap(self, value):
+        if self.grid_deg <= 0:
+            return round(value, 4)
+        return round(round(value / self.grid_deg) * self.grid_deg, 6)
+
+    def _cache_key(self, source, lat, lon):
+        return (source, self._snap(lat), self._snap(lon), date.today().isoformat())
+
     def _weather(self, lat, lon, use_live_data=True):
         if use_live_data and OWM_API_KEY:
             try:
-                r = req_lib.get("https://api.openweathermap.org/data/2.5/weather",
-                    params={"lat": lat, "lon": lon, "appid": OWM_API_KEY, "units": "metric"}, timeout=6)
-                d = r.json()
-                return {"temp": d["main"]["temp"], "humidity": d["main"]["humidity"],
-                        "wind_speed": d["wind"]["speed"], "wind_dir": d["wind"].get("deg",0),
-                        "description": d["weather"][0]["description"]}
+                return self._live_weather(lat, lon)
             except Exception: pass
         return self._synth_weather(lat, lon)
 
+    def _live_weather(self, lat, lon):
+        key = self._cache_key("weather", lat, lon)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        r = self.http.get(OWM_URL, params=self._weather_params(key), timeout=6)
+        return self._store_weather(key, r.json())
+
+    # Request parameters and response parsing are shared with AsyncDataFetcher.
+    @staticmethod
+    def _weather_params(key):
+        return {"lat": key[1], "lon": key[2], "appid": OWM_API_KEY, "units": "metric"}
+
+    def _store_weather(self, key, d):
+        w = {"temp": d["main"]["temp"], "humidity": d["main"]["humidity"],
+             "wind_speed": d["wind"]["speed"], "wind_dir": d["wind"].get("deg",0),
+             "description": d["weather"][0]["description"]}
+        self.cache.put(key, w, self.ttls["weather"])
+        return w
+
+    def _cached_daily(self, key, days):
+        daily = self.cache.get(key)
+        if daily is not None and len(daily.get("precipitation_sum", ())) >= days:
+            return daily
+        return None
+
+    @staticmethod
+    def _point_daily_params(key, days):
+        return {"latitude": key[1], "longitude": key[2],
+                "daily": "precipitation_sum,rain_sum",
+                "forecast_days": max(days, 10), "timezone": "auto"}
+
+    @staticmethod
+    def _daily_params(keys, days):
+        return {"latitude": ",".join(f"{k[1]:.4f}" for k in keys),
+                "longitude": ",".join(f"{k[2]:.4f}" for k in keys),
+                "daily": "precipitation_sum,rain_sum",
+                "forecast_days": max(days, 10), "timezone": "auto"}
+
+    def _store_dailies(self, keys, d):
+        # A single coordinate comes back as an object, several as a list.
+        items = d if isinstance(d, list) else [d]
+        if len(items) != len(keys):
+            raise ValueError(f"Open-Meteo returned {len(items)} locations, expected {len(keys)}")
+        dailies = [item.get("daily", {}) for item in items]
+        for key, daily in zip(keys, dailies):
+            self.cache.put(key, daily, self.ttls["forecast"])
+        return dailies
+
+    def _daily(self, lat, lon, days):
+        """Open-Meteo daily series for one cell; raises when the upstream fails."""
+        key = self._cache_key("forecast", lat, lon)
+        daily = self._cached_daily(key, days)
+        if daily is not None:
+            return daily
+        r = self.http.get(OPEN_METEO_URL, params=self._point_daily_params(key, days), timeout=6)
+        return self._store_dailies([key], r.json())[0]
+
     def _forecast(self, lat, lon, day_offset, use_live_data=True):
         if not use_live_data:
             return self._synth_forecast(day_offset)
         try:
-            r = req_lib.get("https://api.open-meteo.com/v1/forecast",
-                params={"latitude": lat, "longitude": lon,
-                        "daily": "precipitation_sum,rain_sum",
-                        "forecast_days": max(day_offset+1, 10), "timezone": "auto"}, timeout=6)
-            d = r.json()
-            precip = d.get("daily", {}).get("precipitation_sum", [0]*10)
-            rain   = d.get("daily", {}).get("rain_sum", [0]*10)
-            idx = min(day_offset, len(precip)-1)
-            p7 = sum(precip[max(0,idx-6):idx+1])
-            dsr = next((i for i,v in enumerate(reversed(rain[:idx+1])) if v and v>0.1), idx+1)
-            return {"precip_7d": p7, "days_since_rain": dsr}
+            return self._summarise_daily(self._daily(lat, lon, day_offset+1), day_offset)
         except Exception:
             return self._synth_forecast(day_offset)
 
-    @staticmethod
-    def _synth_weather(lat, lon):
-        rng = random.Random(int((lat*1000+lon*1000)%99999))
-        return {"temp": 35-abs(lat)*0.5+rng.uniform(-5,5),
-                "humidity": rng.uniform(20,70), "wind_speed": rng.uniform(1,15),
-                "wind_dir": rng.uniform(0,360), "description": "synthetic"}
+    def _forecast_days(self, lat, lon, days, use_live_data=True):
+        if use_live_data:
+            try:
+                daily = self._daily(lat, lon, days)
+                return [self._summarise_daily(daily, offset) for offset in range(days)]
+            except Exception:
+                pass
+        return [self._synth_forecast(offset) for offset in range(days)]
 
-    @staticmethod
-    def _synth_forecast(day_offset):
-        rng = random.Random(day_offset*42)
-        p = rng.uniform(0,5) if rng.random()>0.6 else 0.0
-        return {"precip_7d": p*7, "days_since_rain": max(0, day_offset-rng.randint(0,3))}
+    def _daily_grid(self, lats, lons, days, deadline=FETCH_DEADLINE):
+        """Daily series per tile (``None`` where the upstream failed or timed out)."""
+        keys, dailies, chunks = self._daily_plan(lats, lons, days)
+        for chunk, fetched in zip(chunks, self.http.map(
+                lambda chunk: self._daily_chunk(chunk, days), chunks, deadline=deadline)):
+            if fetched is None:
+                logger.warning("Open-Meteo grid chunk failed or timed out; using synthetic forecast")
+                continue
+            dailies.update(zip(chunk, fetched))
+        return [dailies.get(key) for key in keys]
 
-    @staticmethod
-    def _terrain(lat, lon):
-        rng = random.Random(int((lat*7+lon*13)%88888))
-        return {"slope": rng.uniform(0,35), "aspect": rng.uniform(0,360),
-                "elevation": abs(lat)*20+rng.uniform(0,300)}
+    def _daily_plan(self, lats, lons, days):
+        """Cache key per tile, cached series per key, and the missing keys in request-sized chunks."""
+        keys = [self._cache_key("forecast", lat, lon) for lat, lon in zip(lats, lons)]
+        dailies = {}
+        for key in dict.fromkeys(keys):
+            daily = self._cached_daily(key, days)
+            if daily is not None:
+                dailies[key] = daily
+        missing = [key for key in dict.fromkeys(keys) if key not in dailies]
+        chunks = [missing[start:start+OPEN_METEO_CHUNK] for start in range(0, len(missing), OPEN_METEO_CHUNK)]
+        return keys, dailies, chunks
+
+    def _daily_chunk(self, keys, days):
+        """Daily series for several cache keys in one multi-coordinate request."""
+        r = self.http.get(OPEN_METEO_URL, params=self._daily_params(keys, days), timeout=6)
+        return self._store_dailies(keys, r.json())
 
     @staticmethod
-    def _vegetation(lat, lon):
-        rng = random.Random(int((lat*3+lon*17)%77777))
-        ndvi = max(-0.2, min(0.9, 0.6-abs(lat)*0.005+rng.uniform(-0.2,0.2)))
-        return {"ndvi": ndvi, "evi": ndvi*0.9+rng.uniform(-0.05,0.05)}
+    def _summarise_daily(daily, day_offset):
+        precip = daily.get("precipitation_sum", [0]*10)
+        rain   = daily.get("rain_sum", [0]*10)
+        idx = min(day_offset, len(precip)-1)
+        p7 = sum(v or 0 for v in precip[max(0,idx-6):idx+1])
+        dsr = next((i for i,v in enumerate(reversed(rain[:idx+1])) if v and v>0.1), idx+1)
+        return {"precip_7d": p7, "days_since_rain": dsr}
 
     @staticmethod
-    def _human(lat, lon):
-        return round(random.Random(int((lat*11+lon*7)%55555)).uniform(0,0.8), 3)
+    def _synth_weather(lat, lon):
+        return {**_scalar(_synth_weather_columns(np.array([lat], dtype=np.float64),
+                                                 np.array([lon], dtype=np.float64))),
+                "description": "synthetic"}
 
     @staticmethod
-    def _hist_fire(lat, lon):
-        return random.Random(int((lat*5+lon*19)%44444)).randint(0,12)
+    def _synth_forecast(day_offset):
+        rng = random.Random(day_offset*42)
+        p = rng.uniform(0,5) if rng.random()>0.6 else 0.0
+        return {"precip_7d": p*7, "days_since_rain": max(0, day_offset-rng.randint(0,3))}
 
     @staticmethod
     def _calc_fmc(temp, humidity, wind, precip):
@@ -0,0 +1,153 @@
+"""PyroScan directory watching.
+
+``open_watcher`` returns an inotify watcher on Linux (via ctypes, no extra
+dependency) and a stat-polling watcher everywhere else. Both expose
+``wait(timeout) -> set[str]``: the names of matching files that changed
+within ``timeout`` seconds (empty if none). Callers debounce by waiting
+again with a short timeout until a call comes back empty. If the watched
+directory itself is replaced, the inotify watcher reports ``OVERFLOW`` and
+watches the path again, or polls it if the path is gone.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger("pyroscan.fs_watch")
+
+# Returned instead of names when the kernel dropped events.
+OVERFLOW = "*"
+
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+# Complete writes, renames, deletions and touches. Plain IN_MODIFY is left
+# out on purpose: it fires for every chunk of a partially written file.
+_WATCH_MASK = (
+    _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+    | _IN_DELETE_SELF | _IN_MOVE_SELF
+)
+_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    def __init__(self, directory: Path | str, suffixes: Iterable[str], interval: float = 5.0) -> None:
+        self.directory = Path(directory)
+        self.suffixes = {suffix.lower() for suffix in suffixes}
+        self.interval = interval
+        self._last = self._stat()
+
+    def _stat(self) -> dict[str, tuple[int, int]]:
+        try:
+            return {
+                path.name: (stat.st_size, stat.st_mtime_ns)
+                for path in self.directory.iterdir()
+                if path.suffix.lower() in self.suffixes
+                for stat in (path.stat(),)
+            }
+        except OSError:
+            return {}
+
+    def wait(self, timeout: Optional[float] = None) -> set[str]:
+        time.sleep(self.interval if timeout is None else timeout)
+        current = self._stat()
+        changed = {name for name in current.keys() | self._last.keys() if current.get(name) != self._last.get(name)}
+        self._last = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    interval = 1.0   # default wait; events arrive immediately regardless
+
+    def __init__(self, directory: Path | str, suffixes: Iterable[str], poll_interval: float = 5.0) -> None:
+        self.directory = Path(directory)
+        self.suffixes = {suffix.lower() for suffix in suffixes}
+        self.poll_interval = poll_interval
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._polling: Optional[PollingWatcher] = None
+        self._fd = self._open()
+
+    def _open(self) -> int:
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if self._libc.inotify_add_watch(fd, os.fsencode(self.directory), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch failed for {self.directory}")
+        return fd
+
+    def _rewatch(self) -> None:
+        # The watched directory was deleted, moved or unmounted: the old watch
+        # is gone (or follows the moved inode), so watch the path afresh.
+        os.close(self._fd)
+        self._fd = -1
+        try:
+            self._fd = self._open()
+        except OSError as exc:
+            logger.warning("Lost the inotify watch on %s (%s); polling every %.0fs",
+                           self.directory, exc, self.poll_interval)
+            self._polling = PollingWatcher(self.directory, self.suffixes, self.poll_interval)
+
+    def wait(self, timeout: Optional[float] = None) -> set[str]:
+        if self._polling is not None:
+            return self._polling.wait(timeout)
+        ready, _, _ = select.select([self._fd], [], [], self.interval if timeout is None else timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed: set[str] = set()
+        lost = False
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+            if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                changed.add(OVERFLOW)
+                lost = True
+            elif mask & _IN_Q_OVERFLOW:
+                changed.add(OVERFLOW)
+            elif Path(name).suffix.lower() in self.suffixes:
+                changed.add(name)
+        if lost:
+            self._rewatch()
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def open_watcher(directory: Path | str, suffixes: Iterable[str], poll_interval: float = 5.0):
+    """An inotify watcher where available, else a polling one."""
+    suffixes = tuple(suffixes)
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, suffixes, poll_interval)
+        except (OSError, AttributeError) as exc:   # no inotify symbols, or limits reached
+            logger.warning("inotify unavailable (%s); polling %s every %.0fs", exc, directory, poll_interval)
+    return PollingWatcher(directory, suffixes, poll_interval)
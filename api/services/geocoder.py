@@ -0,0 +1,350 @@
+"""PyroScan place search, sync and async.
+
+A search is answered by the first of:
+
+1. the result cache: normalized query → results, an in-memory LRU with a
+   TTL, optionally backed by a SQLite file so results survive restarts and
+   are shared between worker processes (``PYROSCAN_GEOCODE_CACHE_DB``);
+2. the bundled gazetteer (``api/data/gazetteer.tsv``): a sorted index over
+   major places. It answers a query that exactly names one of them ("San
+   Francisco, CA"), and, by prefix, queries shorter than
+   ``GEOCODE_MIN_UPSTREAM_CHARS`` ("sa", "san"). A longer partial name is
+   not an answer: "Mali" must not resolve to Malibu only;
+3. Nominatim, whose results are cached. If Nominatim fails, gazetteer places
+   matching the query by prefix, or by a prefix of each word, are returned
+   instead, if any.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+from typing import Optional
+
+from api.services.data_fetcher import ResponseCache
+from api.services.metrics import metrics
+
+logger = logging.getLogger("pyroscan.geocoder")
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+NOMINATIM_HEADERS = {"User-Agent": "PyroScan/1.0"}
+NOMINATIM_TIMEOUT = 8
+SEARCH_LIMIT = 5
+
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("PYROSCAN_GEOCODE_CACHE_MAX_ENTRIES", "4096"))
+GEOCODE_CACHE_TTL = float(os.getenv("PYROSCAN_GEOCODE_CACHE_TTL", "604800"))
+GEOCODE_CACHE_DB = os.getenv("PYROSCAN_GEOCODE_CACHE_DB", "")
+# Shorter queries are answered from gazetteer prefixes when any match.
+GEOCODE_MIN_UPSTREAM_CHARS = int(os.getenv("PYROSCAN_GEOCODE_MIN_UPSTREAM_CHARS", "4"))
+GAZETTEER_PATH = os.getenv(
+    "PYROSCAN_GAZETTEER", str(Path(__file__).resolve().parent.parent / "data" / "gazetteer.tsv")
+)
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-, accent-, punctuation- and whitespace-insensitive form of a query."""
+    text = unicodedata.normalize("NFKD", query)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", text.casefold()).split())
+
+
+def _params(query: str) -> dict:
+    return {"q": query, "format": "json", "limit": SEARCH_LIMIT}
+
+
+def parse_results(items) -> list[dict]:
+    return [
+        {"name": item.get("display_name", ""), "lat": float(item["lat"]),
+         "lon": float(item["lon"]), "type": item.get("type", "")}
+        for item in items
+    ]
+
+
+class Gazetteer:
+    """Prefix index over a tab-separated table of places.
+
+    Columns: ``name admin country lat lon type population alternates``
+    (alternates ``|``-separated). Every place is indexed under its name,
+    its alternates, and each of those followed by its admin area or country
+    (and the admin area's own alternates: "san francisco ca"). Matches rank
+    exact keys first, then by population. The file is read on first use.
+    """
+
+    def __init__(self, path: Optional[Path | str] = GAZETTEER_PATH) -> None:
+        self.path = Path(path) if path else None
+        self._places: list[dict] = []
+        self._population: list[int] = []
+        self._keys: list[str] = []      # sorted
+        self._ids: list[int] = []       # place index per key
+        self._words: list[str] = []     # sorted
+        self._word_ids: list[int] = []
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._places)
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = []
+            if self.path is not None:
+                try:
+                    with open(self.path, newline="", encoding="utf-8") as fh:
+                        rows = list(csv.DictReader(fh, delimiter="\t"))
+                except OSError as exc:
+                    logger.warning("Gazetteer %s unavailable (%s); searches go to Nominatim", self.path, exc)
+            admin_alternates = {
+                row["name"]: _split(row.get("alternates")) for row in rows if row["name"] == row["admin"]
+            }
+            keys, words = set(), set()
+            for index, row in enumerate(rows):
+                names = [row["name"], *_split(row.get("alternates"))]
+                qualifiers = {row["admin"], row["country"], *admin_alternates.get(row["admin"], ())}
+                for name in names:
+                    keys.add((normalize_query(name), index))
+                    for qualifier in qualifiers - {name}:
+                        keys.add((normalize_query(f"{name} {qualifier}"), index))
+                for name in names:
+                    words.update((word, index) for word in normalize_query(name).split())
+                self._places.append({
+                    "name": ", ".join(dict.fromkeys(
+                        part for part in (row["name"], row["admin"], row["country"]) if part
+                    )),
+                    "lat": float(row["lat"]),
+                    "lon": float(row["lon"]),
+                    "type": row["type"],
+                })
+                self._population.append(int(row.get("population") or 0))
+            self._keys, self._ids = _columns(keys)
+            self._words, self._word_ids = _columns(words)
+            self._loaded = True
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT, exact: bool = False) -> list[dict]:
+        """Places with a key starting with (``exact``: equal to) the query."""
+        key = normalize_query(query)
+        if not key:
+            return []
+        self._load()
+        matches: set[int] = set()   # exact key matches
+        found: set[int] = set()
+        for i in range(bisect_left(self._keys, key), bisect_left(self._keys, key + "\uffff")):
+            found.add(self._ids[i])
+            if self._keys[i] == key:
+                matches.add(self._ids[i])
+        return self._ranked(matches if exact else found, matches, limit)
+
+    def search_words(self, query: str, limit: int = SEARCH_LIMIT) -> list[dict]:
+        """Places with, for every query word, a name word starting with it."""
+        words = normalize_query(query).split()
+        if not words:
+            return []
+        self._load()
+        found: Optional[set[int]] = None
+        for word in words:
+            lo, hi = bisect_left(self._words, word), bisect_left(self._words, word + "\uffff")
+            ids = set(self._word_ids[lo:hi])
+            found = ids if found is None else found & ids
+        return self._ranked(found or set(), set(), limit)
+
+    def _ranked(self, found: set[int], exact: set[int], limit: int) -> list[dict]:
+        order = sorted(found, key=lambda i: (i not in exact, -self._population[i], i))
+        return [dict(self._places[i]) for i in order[:limit]]
+
+
+def _split(alternates: Optional[str]) -> list[str]:
+    return [name for name in (alternates or "").split("|") if name]
+
+
+def _columns(pairs: set[tuple[str, int]]) -> tuple[list[str], list[int]]:
+    ordered = sorted(pairs)
+    return [key for key, _ in ordered], [index for _, index in ordered]
+
+
+class GeocodeStore:
+    """Geocoding results in a SQLite file, with wall-clock expiry."""
+
+    def __init__(self, path: Path | str, clock=time.time) -> None:
+        self.path = str(path)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.DatabaseError:
+                pass   # e.g. a network filesystem; the default journal still works
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode "
+                "(query TEXT PRIMARY KEY, expires REAL NOT NULL, results TEXT NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[tuple[float, list[dict]]]:
+        """``(seconds left, results)`` for a fresh entry, else ``None``."""
+        with self._lock:
+            row = self._conn.execute("SELECT expires, results FROM geocode WHERE query = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        remaining = row[0] - self._clock()
+        return (remaining, json.loads(row[1])) if remaining > 0 else None
+
+    def put(self, key: str, results: list[dict], ttl: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (query, expires, results) VALUES (?, ?, ?)",
+                (key, self._clock() + ttl, json.dumps(results)),
+            )
+
+    def purge(self) -> int:
+        """Delete expired entries; returns how many were removed."""
+        with self._lock:
+            return self._conn.execute("DELETE FROM geocode WHERE expires <= ?", (self._clock(),)).rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM geocode")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+
+class GeocodeCache:
+    """In-memory LRU in front of an optional ``GeocodeStore``."""
+
+    def __init__(
+        self,
+        max_entries: int = GEOCODE_CACHE_MAX_ENTRIES,
+        ttl: float = GEOCODE_CACHE_TTL,
+        path: Optional[Path | str] = GEOCODE_CACHE_DB,
+    ) -> None:
+        self.ttl = ttl
+        self.memory = ResponseCache(max_entries)
+        self.store: Optional[GeocodeStore] = None
+        self.store_hits = 0
+        if path:
+            try:
+                self.store = GeocodeStore(path)
+                self.store.purge()
+            except sqlite3.Error as exc:
+                logger.warning("Geocode cache %s unavailable (%s); caching in memory only", path, exc)
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        results = self.memory.get(key)
+        if results is None and self.store is not None:
+            try:
+                hit = self.store.get(key)
+            except sqlite3.Error as exc:
+                logger.warning("Geocode cache read failed: %s", exc)
+                hit = None
+            if hit is not None:
+                remaining, results = hit
+                self.memory.put(key, results, remaining)
+                self.store_hits += 1
+        return results
+
+    def put(self, key: str, results: list[dict]) -> None:
+        self.memory.put(key, results, self.ttl)
+        if self.store is not None:
+            try:
+                self.store.put(key, results, self.ttl)
+            except sqlite3.Error as exc:
+                logger.warning("Geocode cache write failed: %s", exc)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> dict:
+        return {
+            **self.memory.stats(),
+            "persistent": self.store.path if self.store is not None else None,
+            "persistent_hits": self.store_hits,
+        }
+
+
+class Geocoder:
+    def __init__(
+        self,
+        cache: Optional[GeocodeCache] = None,
+        gazetteer: Optional[Gazetteer] = None,
+        min_upstream_chars: int = GEOCODE_MIN_UPSTREAM_CHARS,
+    ) -> None:
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.gazetteer = gazetteer if gazetteer is not None else Gazetteer()
+        self.min_upstream_chars = min_upstream_chars
+
+    def _local(self, key: str) -> tuple[Optional[list[dict]], str]:
+        results = self.cache.get(key)
+        if results is not None:
+            return results, "cache"
+        results = self.gazetteer.search(key, exact=len(key) >= self.min_upstream_chars)
+        return (results, "gazetteer") if results else (None, "nominatim")
+
+    def _fallback(self, key: str, exc: Exception) -> list[dict]:
+        results = self.gazetteer.search(key) or self.gazetteer.search_words(key)
+        if not results:
+            raise exc
+        logger.warning("Nominatim failed (%s); answering %r from the gazetteer", exc, key)
+        return results
+
+    def search_sync(self, query: str, http=None) -> list[dict]:
+        started = time.perf_counter()
+        key = normalize_query(query)
+        results, source = self._local(key)
+        if results is None:
+            if http is None:
+                from api.services.http_pool import fetch_engine as http
+            try:
+                r = http.get(NOMINATIM_URL, params=_params(query.strip()), headers=NOMINATIM_HEADERS, timeout=NOMINATIM_TIMEOUT)
+                results = parse_results(r.json())
+            except Exception as exc:
+                results, source = self._fallback(key, exc), "fallback"
+            else:
+                self.cache.put(key, results)
+        metrics.observe("geocode", time.perf_counter() - started, source=source)
+        return results
+
+    async def search(self, query: str, http=None) -> list[dict]:
+        started = time.perf_counter()
+        key = normalize_query(query)
+        results, source = self._local(key)
+        if results is None:
+            if http is None:
+                from api.services.async_http import async_fetch_engine as http
+            try:
+                r = await http.get(NOMINATIM_URL, params=_params(query.strip()), headers=NOMINATIM_HEADERS, timeout=NOMINATIM_TIMEOUT)
+                results = parse_results(r.json())
+            except Exception as exc:
+                results, source = self._fallback(key, exc), "fallback"
+            else:
+                self.cache.put(key, results)
+        metrics.observe("geocode", time.perf_counter() - started, source=source)
+        return results
+
+
+geocoder = Geocoder()
+
+
+def geocode_sync(query: str, http=None) -> list[dict]:
+    return geocoder.search_sync(query, http)
+
+
+async def geocode(query: str, http=None) -> list[dict]:
+    return await geocoder.search(query, http)
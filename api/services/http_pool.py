@@ -0,0 +1,165 @@
+"""PyroScan upstream fetch engine.
+
+A pooled ``requests.Session`` shared by every upstream call, plus a bounded
+thread pool for issuing many lookups at once. Each host has its own rate
+limit, and batch work runs against a global deadline: anything still pending
+when the deadline passes is reported as missing so callers can substitute
+synthetic values instead of blowing the serverless time budget.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api.services.metrics import metrics
+
+logger = logging.getLogger("pyroscan.http_pool")
+
+FETCH_CONCURRENCY = int(os.getenv("PYROSCAN_FETCH_CONCURRENCY", "16"))
+FETCH_DEADLINE = float(os.getenv("PYROSCAN_FETCH_DEADLINE", "20"))
+
+# Requests per second allowed towards each upstream host.
+HOST_RATE_LIMITS = {
+    "api.open-meteo.com": 10.0,
+    "api.openweathermap.org": 10.0,
+    "nominatim.openstreetmap.org": 1.0,
+}
+DEFAULT_RATE_LIMIT = 20.0
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class HostRateLimiter:
+    """Spaces requests to one host at least ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            if deadline is not None and slot > deadline:
+                raise DeadlineExceeded("rate limit slot falls after the deadline")
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class FetchEngine:
+    def __init__(
+        self,
+        max_workers: int = FETCH_CONCURRENCY,
+        rate_limits: Optional[dict[str, float]] = None,
+        default_rate: float = DEFAULT_RATE_LIMIT,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=self.max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._rate_limits = {**HOST_RATE_LIMITS, **(rate_limits or {})}
+        self._default_rate = default_rate
+        self._limiters: dict[str, HostRateLimiter] = {}
+        self._limiters_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._local = threading.local()
+        self.deadline_misses = 0
+
+    def get(self, url: str, params: Any = None, timeout: float = 6, **kwargs: Any) -> requests.Response:
+        """Rate-limited GET on the pooled session, clipped to the active deadline."""
+        deadline = getattr(self._local, "deadline", None)
+        self._limiter(url).acquire(deadline)
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded(url)
+            timeout = min(timeout, remaining)
+        host = urlsplit(url).hostname or ""
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            return self.session.get(url, params=params, timeout=timeout, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.observe(
+                "upstream_request", time.perf_counter() - started, host=host, status=status
+            )
+
+    def map(
+        self,
+        fn: Callable[[Any], Any],
+        items: Iterable[Any],
+        deadline: Optional[float] = FETCH_DEADLINE,
+    ) -> list[Any]:
+        """Run ``fn`` over ``items`` concurrently, preserving order.
+
+        Items that raise, or are not finished ``deadline`` seconds from now,
+        come back as ``None``.
+        """
+        items = list(items)
+        if not items:
+            return []
+        end = time.monotonic() + deadline if deadline else None
+        executor = self._pool()
+        futures = [executor.submit(self._call, fn, item, end) for item in items]
+        done, pending = wait(futures, timeout=deadline or None)
+        for future in pending:
+            future.cancel()
+        if pending:
+            self.deadline_misses += len(pending)
+            logger.warning("%d upstream lookups missed the %.1fs deadline", len(pending), deadline)
+
+        results = []
+        for future in futures:
+            if future in done and future.exception() is None:
+                results.append(future.result())
+            else:
+                results.append(None)
+        return results
+
+    def _call(self, fn: Callable[[Any], Any], item: Any, deadline: Optional[float]) -> Any:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded("deadline passed before the lookup started")
+        self._local.deadline = deadline
+        try:
+            return fn(item)
+        finally:
+            self._local.deadline = None
+
+    def _limiter(self, url: str) -> HostRateLimiter:
+        host = urlsplit(url).hostname or ""
+        with self._limiters_lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostRateLimiter(self._rate_limits.get(host, self._default_rate))
+                self._limiters[host] = limiter
+            return limiter
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="PyroFetch",
+                )
+            return self._executor
+
+
+fetch_engine = FetchEngine()
@@ -0,0 +1,156 @@
+"""PyroScan multi-process inference.
+
+``ModelLoader.predict`` runs on request threads, so NumPy-heavy members
+(the legacy ``ModelWrapper`` profiles, feature adaptation) are capped by the
+GIL. With ``PYROSCAN_INFERENCE_PROCESSES=N`` large score requests are split
+into contiguous row shards and scored by N worker processes instead.
+
+Each worker loads the models once, at start-up, through its own
+``model_loader`` (no watcher, no calibration, one inference thread). Rows
+never go through pickle: the parent copies the feature matrix into one
+``multiprocessing.shared_memory`` block that also holds the score vector,
+and each task only carries the block name and its row range. Every task
+also carries the parent's model fingerprint; a worker whose models differ
+rescans (incrementally) before scoring, so hot reloads reach the pool too.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from api.services.metrics import metrics
+
+logger = logging.getLogger("pyroscan.inference_pool")
+
+INFERENCE_PROCESSES = int(os.getenv("PYROSCAN_INFERENCE_PROCESSES", "0"))
+# Requests smaller than this stay in-process: shipping them costs more than it saves.
+PROCESS_MIN_ROWS = int(os.getenv("PYROSCAN_PROCESS_MIN_ROWS", "512"))
+SHARD_MIN_ROWS = int(os.getenv("PYROSCAN_SHARD_MIN_ROWS", "256"))
+
+# Applied in each worker before its model_loader is imported.
+_WORKER_ENV = {
+    "PYROSCAN_INFERENCE_PROCESSES": "0",
+    "PYROSCAN_INFERENCE_THREADS": "1",
+    "PYROSCAN_WATCH_MODELS": "0",
+    "PYROSCAN_LAZY_MODELS": "0",
+    "PYROSCAN_CALIBRATE_BATCH": "0",
+}
+
+
+def shard_bounds(rows: int, workers: int, min_rows: int = SHARD_MIN_ROWS) -> list[tuple[int, int]]:
+    """Contiguous ``(start, stop)`` ranges: at most ``workers``, each ≥ ``min_rows`` where possible."""
+    shards = max(1, min(workers, math.ceil(rows / max(1, min_rows))))
+    edges = np.linspace(0, rows, shards + 1).round().astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(edges[:-1], edges[1:]) if stop > start]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python ≥ 3.13
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _views(buffer, rows: int, cols: int) -> tuple[np.ndarray, np.ndarray]:
+    features = np.ndarray((rows, cols), dtype=np.float32, buffer=buffer)
+    scores = np.ndarray((rows,), dtype=np.float32, buffer=buffer, offset=features.nbytes)
+    return features, scores
+
+
+def _init_worker() -> None:
+    os.environ.update(_WORKER_ENV)
+    from api.services.model_loader import model_loader
+
+    logger.info("Inference worker %d ready: %s", os.getpid(), model_loader.model_name)
+
+
+def _score_shard(name: str, rows: int, cols: int, start: int, stop: int, fingerprint: str) -> int:
+    from api.services.model_loader import model_loader
+
+    if model_loader.fingerprint != fingerprint:
+        model_loader._scan(only_if_changed=True)
+    block = _attach(name)
+    features = scores = None
+    try:
+        features, scores = _views(block.buf, rows, cols)
+        scores[start:stop] = model_loader.predict(features[start:stop])
+    finally:
+        del features, scores   # views must be released before the buffer closes
+        block.close()
+    return os.getpid()
+
+
+class InferencePool:
+    def __init__(self, processes: int = INFERENCE_PROCESSES, min_rows: int = PROCESS_MIN_ROWS) -> None:
+        self.processes = processes
+        self.min_rows = min_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def accepts(self, rows: int) -> bool:
+        return self.enabled and rows >= self.min_rows
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    # spawn: forking a process that already runs threads is unsafe.
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def warm(self) -> None:
+        """Start every worker now rather than on the first large request."""
+        pool = self._pool()
+        for future in [pool.submit(os.getpid) for _ in range(self.processes)]:
+            future.result()
+
+    def start(self) -> None:
+        """Warm the workers in the background."""
+        threading.Thread(target=self.warm, daemon=True, name="PyroPoolWarm").start()
+
+    def predict(self, features: np.ndarray, fingerprint: str) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(features, dtype=np.float32))
+        rows, cols = matrix.shape
+        block = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes + rows * 4))
+        shared = scores = None
+        try:
+            shared, scores = _views(block.buf, rows, cols)
+            shared[:] = matrix
+            with metrics.timer("process_infer", rows=rows):
+                pool = self._pool()
+                futures = [
+                    pool.submit(_score_shard, block.name, rows, cols, start, stop, fingerprint)
+                    for start, stop in shard_bounds(rows, self.processes)
+                ]
+                for future in futures:
+                    future.result()
+            return scores.astype(np.float64)
+        finally:
+            del shared, scores
+            block.close()
+            block.unlink()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+inference_pool = InferencePool()
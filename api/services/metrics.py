@@ -0,0 +1,127 @@
+"""PyroScan lightweight runtime metrics.
+
+Timings are kept per (metric, labels) series in a bounded rolling window so
+percentiles reflect recent traffic; call and row counters are cumulative.
+Everything lives in-process: ``snapshot`` feeds ``/api/health`` and
+``prometheus`` renders the same data for ``/api/metrics``.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+METRICS_WINDOW = int(os.getenv("PYROSCAN_METRICS_WINDOW", "1024"))
+METRICS_WINDOW_SECONDS = float(os.getenv("PYROSCAN_METRICS_WINDOW_SECONDS", "300"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+LabelSet = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class _Series:
+    samples: deque = field(default_factory=lambda: deque(maxlen=METRICS_WINDOW))
+    count: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    # Nearest-rank percentile over an already sorted window.
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class MetricsRegistry:
+    def __init__(self, window_seconds: float = METRICS_WINDOW_SECONDS, clock=time.monotonic) -> None:
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._series: dict[tuple[str, LabelSet], _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, rows: int = 0, **labels: str) -> None:
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.samples.append((self._clock(), seconds))
+            series.count += 1
+            series.rows += int(rows)
+            series.total_seconds += seconds
+
+    @contextmanager
+    def timer(self, name: str, rows: int = 0, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, rows=rows, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def _summaries(self) -> list[tuple[str, LabelSet, _Series, list[float]]]:
+        cutoff = self._clock() - self.window_seconds
+        with self._lock:
+            return [
+                (name, labels, series, sorted(s for t, s in series.samples if t >= cutoff))
+                for (name, labels), series in sorted(self._series.items())
+            ]
+
+    def snapshot(self) -> dict[str, list[dict]]:
+        out: dict[str, list[dict]] = {}
+        for name, labels, series, window in self._summaries():
+            entry = {
+                "labels": dict(labels),
+                "count": series.count,
+                "rows": series.rows,
+                "total_ms": round(series.total_seconds * 1000.0, 3),
+                "window": len(window),
+            }
+            for q in QUANTILES:
+                value: Optional[float] = _quantile(window, q) * 1000.0 if window else None
+                entry[f"p{int(q * 100)}_ms"] = round(value, 3) if value is not None else None
+            out.setdefault(name, []).append(entry)
+        return out
+
+    def prometheus(self) -> str:
+        families: dict[str, list[tuple[LabelSet, _Series, list[float]]]] = {}
+        for name, labels, series, window in self._summaries():
+            families.setdefault(name, []).append((labels, series, window))
+
+        lines: list[str] = []
+        for name, members in families.items():
+            metric = f"pyroscan_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for labels, series, window in members:
+                for q in QUANTILES:
+                    if window:
+                        lines.append(
+                            f"{metric}{_labels(labels, quantile=str(q))} {_quantile(window, q):.6f}"
+                        )
+                lines.append(f"{metric}_sum{_labels(labels)} {series.total_seconds:.6f}")
+                lines.append(f"{metric}_count{_labels(labels)} {series.count}")
+            lines.append(f"# TYPE pyroscan_{name}_rows_total counter")
+            for labels, series, _ in members:
+                lines.append(f"pyroscan_{name}_rows_total{_labels(labels)} {series.rows}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: LabelSet, **extra: str) -> str:
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+metrics = MetricsRegistry()
@@ -2,21 +2,76 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
+import os
 import threading
+import time
 import warnings
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
 from enum import Enum
 from pathlib import Path
-from typing import Any, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Optional
 
 import numpy as np
 
+from api.services.fs_watch import OVERFLOW, open_watcher
+from api.services.metrics import metrics
+from api.services.onnx_export import SOURCE_DIGEST_KEY
+
 logger = logging.getLogger("pyroscan.model_loader")
 
 MODELS_DIR = Path(__file__).resolve().parent.parent / "models"
-SUPPORTED_EXTENSIONS = {".pkl", ".pt", ".onnx", ".h5"}
+SUPPORTED_EXTENSIONS = {".pkl", ".joblib", ".pt", ".onnx", ".h5"}
+MANIFEST_NAME = "manifest.json"
+
+# A serverless function serves one request per cold start, so it skips the
+# file watcher and loads model weights on first inference. Metadata (names,
+# backends, feature names) then comes from api/models/manifest.json, written
+# with ``python -m api.services.model_loader --write-manifest``.
+SERVERLESS = os.getenv("PYROSCAN_SERVERLESS", "1" if os.getenv("VERCEL") else "0") == "1"
+LAZY_MODELS = os.getenv("PYROSCAN_LAZY_MODELS", "1" if SERVERLESS else "0") == "1"
+WATCH_MODELS = os.getenv("PYROSCAN_WATCH_MODELS", "0" if SERVERLESS else "1") == "1"
+# The watcher uses inotify where available and polls otherwise. A burst of
+# events (a multi-file copy, a slow write) is collapsed into one rescan once
+# the directory has been quiet for RELOAD_DEBOUNCE seconds.
+MODEL_POLL_INTERVAL = float(os.getenv("PYROSCAN_MODEL_POLL_INTERVAL", "5"))
+RELOAD_DEBOUNCE = float(os.getenv("PYROSCAN_RELOAD_DEBOUNCE", "0.5"))
+# .joblib files are opened with this mmap_mode so large arrays stay in the page cache.
+JOBLIB_MMAP_MODE = os.getenv("PYROSCAN_JOBLIB_MMAP_MODE", "r") or None
+
+# Ensemble members run concurrently on a shared pool (sklearn, ONNX Runtime,
+# torch and large NumPy ops release the GIL). Tiny batches stay sequential
+# because the thread hand-off costs more than it saves.
+INFERENCE_THREADS = int(os.getenv("PYROSCAN_INFERENCE_THREADS", "4"))
+PARALLEL_MIN_ROWS = int(os.getenv("PYROSCAN_PARALLEL_MIN_ROWS", "64"))
+
+# After each scan the ensemble is timed on a few batch sizes; the smallest
+# size that reaches CALIBRATION_EFFICIENCY of the best rows/sec becomes the
+# ensemble's optimal batch size (used by the streaming tile path).
+CALIBRATE_BATCH = os.getenv("PYROSCAN_CALIBRATE_BATCH", "1") == "1"
+CALIBRATION_SIZES = (16, 64, 256, 1024)
+CALIBRATION_EFFICIENCY = 0.9
+DEFAULT_BATCH_SIZE = int(os.getenv("PYROSCAN_DEFAULT_BATCH_SIZE", "256"))
+
+# A model exported next to its pickle (see api/services/onnx_export.py) is
+# loaded through ONNX Runtime instead, as long as the export records the
+# pickle's current content digest. Members already run concurrently, so each
+# session defaults to a single thread.
+PREFER_ONNX = os.getenv("PYROSCAN_PREFER_ONNX", "1") == "1"
+ONNX_INTRA_OP_THREADS = int(os.getenv("PYROSCAN_ONNX_INTRA_OP_THREADS", "1"))
+ONNX_INTER_OP_THREADS = int(os.getenv("PYROSCAN_ONNX_INTER_OP_THREADS", "1"))
+
+# Legacy predict_server.ModelWrapper members differ only in weights and a few
+# scalars, so two or more of them are scored together by one fused scorer.
+FUSE_LEGACY = os.getenv("PYROSCAN_FUSE_LEGACY", "1") == "1"
+
+# ``--joblib`` exports record their pickle's digest in ``<name>.joblib.source``
+# (ONNX exports keep it in their metadata).
+SOURCE_SUFFIX = ".source"
 
 
 class ModelState(str, Enum):
@@ -30,43 +85,140 @@ class ModelNotAvailableError(Exception):
     pass
 
 
+_RESOLVE_LOCK = threading.Lock()
+
+
 @dataclass
 class LoadedModel:
     name: str
     path: Path
     backend: str
-    model: Any
+    model: Any                      # None until first use for manifest-only entries
+    feature_names: tuple[str, ...] = ()
+    source: str = ""                # backend the model was exported from, e.g. "sklearn-bundle"
+    output: Optional[str] = None    # ONNX output to read scores from
+    kind: str = ""                  # class of the loaded object, e.g. "predict_server.ModelWrapper"
+    digest: str = ""                # content digest of ``path``; filled in on first fingerprint
+    load: Optional[Callable[[], Any]] = field(default=None, repr=False)
+
+    @property
+    def resident(self) -> bool:
+        return self.model is not None
+
+    def resolve(self) -> Any:
+        """The model object, loading it on first use."""
+        if self.model is None and self.load is not None:
+            with _RESOLVE_LOCK:
+                if self.model is None:
+                    started = time.perf_counter()
+                    self.model = self.load()
+                    metrics.observe("model_load", time.perf_counter() - started, model=self.name)
+        return self.model
+
+
+@dataclass
+class FusedGroup:
+    """Members scored together; ``score`` returns one column per member."""
+
+    members: tuple[LoadedModel, ...]
     feature_names: tuple[str, ...] = ()
+    _scorer: Any = field(default=None, repr=False)
+
+    @property
+    def names(self) -> tuple[str, ...]:
+        return tuple(entry.name for entry in self.members)
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        if self._scorer is None:
+            from predict_server import FusedModelWrapper
+
+            self._scorer = FusedModelWrapper(entry.resolve() for entry in self.members)
+        return self._scorer.score(features)
+
+
+@dataclass(frozen=True)
+class Ensemble:
+    """Immutable snapshot of the loaded models.
+
+    ``_scan`` builds a complete replacement off to the side and publishes it
+    with a single attribute assignment, so readers take a reference without
+    locking and never observe a half-loaded ensemble.
+    """
+
+    models: tuple[LoadedModel, ...] = ()
+    weights: tuple[float, ...] = ()
+    errors: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    state: ModelState = ModelState.PENDING
+    version: int = 0
+    optimal_batch_size: int = DEFAULT_BATCH_SIZE
+    fingerprint: str = ""
+    fused: Optional[FusedGroup] = None
+
+    @property
+    def active(self) -> bool:
+        return self.state == ModelState.ACTIVE and bool(self.models)
 
 
 class ModelLoader:
     def __init__(self) -> None:
-        self._models: list[LoadedModel] = []
-        self._errors: dict[str, str] = {}
+        self._ensemble = Ensemble()
         self._config: dict[str, Any] = {}
         self._lock = threading.RLock()
         self._stop_event = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.last_timings: dict[str, float] = {}
+        self._reload_listeners: list[Callable[[], None]] = []
         self.state = ModelState.PENDING
         self.model_name: Optional[str] = None
+        # Loaded members by file, with the (size, mtime_ns) they were loaded at.
+        self._members: dict[Path, tuple[tuple[int, int], LoadedModel]] = {}
         MODELS_DIR.mkdir(parents=True, exist_ok=True)
+        # Watch before the first scan so no change can slip in between.
+        watcher = open_watcher(MODELS_DIR, SUPPORTED_EXTENSIONS | {SOURCE_SUFFIX}, MODEL_POLL_INTERVAL) if WATCH_MODELS else None
         self._scan()
-        watcher = threading.Thread(
-            target=self._poll,
-            daemon=True,
-            name="ModelWatcher",
-        )
-        watcher.start()
+        if watcher is not None:
+            thread = threading.Thread(
+                target=self._watch,
+                args=(watcher,),
+                daemon=True,
+                name="ModelWatcher",
+            )
+            thread.start()
 
     def is_loaded(self) -> bool:
-        return self.state == ModelState.ACTIVE and bool(self._models)
+        return self._ensemble.active
+
+    @property
+    def version(self) -> int:
+        """Increments every time a rescan publishes a new ensemble."""
+        return self._ensemble.version
+
+    @property
+    def fingerprint(self) -> str:
+        """Content digest of the loaded model files.
+
+        Equal on every instance serving the same files, and unchanged by
+        restarts, checkouts or deploys that only rewrite mtimes.
+        """
+        return self._ensemble.fingerprint
+
+    @property
+    def optimal_batch_size(self) -> int:
+        """Rows per ``predict`` call beyond which throughput stops improving."""
+        return self._ensemble.optimal_batch_size
+
+    def add_reload_listener(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` after each newly published ensemble."""
+        self._reload_listeners.append(callback)
 
     @property
     def model_names(self) -> list[str]:
-        return [entry.name for entry in self._models]
+        return [entry.name for entry in self._ensemble.models]
 
     @property
     def load_errors(self) -> dict[str, str]:
-        return dict(self._errors)
+        return dict(self._ensemble.errors)
 
     def describe(self) -> list[dict[str, Any]]:
         return [
@@ -75,33 +227,98 @@ class ModelLoader:
                 "backend": entry.backend,
                 "path": str(entry.path.relative_to(MODELS_DIR.parent)),
                 "feature_names": list(entry.feature_names),
+                "resident": entry.resident,
+                "last_inference_ms": self.last_timings.get(entry.name),
             }
-            for entry in self._models
+            for entry in self._ensemble.models
         ]
 
     def predict(self, features: np.ndarray) -> np.ndarray:
         matrix = np.atleast_2d(np.asarray(features, dtype=np.float32))
-        with self._lock:
-            if not self.is_loaded():
-                raise ModelNotAvailableError(
-                    "No compatible models are loaded. Check the /models folder."
-                )
+        ensemble = self._ensemble
+        if not ensemble.active:
+            raise ModelNotAvailableError(
+                "No compatible models are loaded. Check the /models folder."
+            )
 
-            predictions = []
-            weights = []
-            for entry in self._models:
-                adapted = self._adapt_features(matrix, entry.feature_names)
-                raw = self._infer(entry, adapted)
-                predictions.append(np.clip(raw, 0.0, 1.0))
-                weights.append(self._weight(entry))
+        # Members sharing a feature schema share one adapted matrix.
+        adapted = {}
+        for names in dict.fromkeys(entry.feature_names for entry in ensemble.models):
+            with metrics.timer("adapt_features", rows=len(matrix)):
+                adapted[names] = self._adapt_features(matrix, names)
+        fused = ensemble.fused
+        fused_names = set(fused.names) if fused else set()
+        jobs = [
+            (self._timed_infer, entry, adapted[entry.feature_names])
+            for entry in ensemble.models
+            if entry.name not in fused_names
+        ]
+        if fused:
+            jobs.append((self._timed_fused, fused, adapted[fused.feature_names]))
+        if len(jobs) > 1 and len(matrix) >= PARALLEL_MIN_ROWS and INFERENCE_THREADS > 1:
+            pool = self._pool()
+            results = [f.result() for f in [pool.submit(*job) for job in jobs]]
+        else:
+            results = [run(*args) for run, *args in jobs]
+
+        raw_by_name: dict[str, np.ndarray] = {}
+        timings: dict[str, float] = {}
+        for (_, member, _), (raw, elapsed) in zip(jobs, results):
+            if isinstance(member, FusedGroup):
+                for i, name in enumerate(member.names):
+                    raw_by_name[name] = raw[:, i]
+                    timings[name] = elapsed
+            else:
+                raw_by_name[member.name] = raw
+                timings[member.name] = elapsed
+        self.last_timings = timings
+        predictions = [np.clip(raw_by_name[entry.name], 0.0, 1.0) for entry in ensemble.models]
 
         if len(predictions) == 1:
             return predictions[0]
 
         stacked = np.vstack(predictions)
-        return np.average(stacked, axis=0, weights=np.asarray(weights, dtype=np.float32))
-
-    def _scan(self) -> None:
+        return np.average(stacked, axis=0, weights=np.asarray(ensemble.weights, dtype=np.float32))
+
+    def _timed_infer(self, entry: LoadedModel, features: np.ndarray) -> tuple[np.ndarray, float]:
+        started = time.perf_counter()
+        raw = self._infer(entry, features)
+        elapsed = time.perf_counter() - started
+        metrics.observe("model_infer", elapsed, rows=len(features), model=entry.name)
+        return raw, round(elapsed * 1000.0, 3)
+
+    def _timed_fused(self, group: FusedGroup, features: np.ndarray) -> tuple[np.ndarray, float]:
+        started = time.perf_counter()
+        raw = np.asarray(group.score(features))
+        elapsed = time.perf_counter() - started
+        metrics.observe("model_infer", elapsed, rows=len(features), model="fused")
+        return raw, round(elapsed * 1000.0, 3)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=INFERENCE_THREADS,
+                    thread_name_prefix="PyroInfer",
+                )
+            return self._executor
+
+    def _publish(self, ensemble: Ensemble) -> None:
+        ensemble = replace(ensemble, version=self._ensemble.version + 1)
+        self._ensemble = ensemble
+        self.model_name = ", ".join(entry.name for entry in ensemble.models) or None
+        self.state = ensemble.state
+        for callback in list(self._reload_listeners):
+            try:
+                callback()
+            except Exception:  # pragma: no cover - listeners must not break reloads
+                logger.exception("Model reload listener failed")
+
+    def _scan(self, only_if_changed: bool = False) -> None:
+        # Only one scan runs at a time; predictions keep using the previous
+        # snapshot until the replacement is published. Files unchanged since
+        # the last scan keep their loaded member, so a reload only pays for
+        # what changed.
         with self._lock:
             self.state = ModelState.LOADING
             self._config = self._load_config()
@@ -110,25 +327,207 @@ class ModelLoader:
             )
 
             if not candidates:
-                self._models = []
-                self._errors = {}
-                self.model_name = None
-                self.state = ModelState.PENDING
+                self._members = {}
+                self._publish(Ensemble())
                 return
 
+            manifest = self._load_manifest() if LAZY_MODELS else {}
+            previous = getattr(self, "_members", {})
+            members: dict[Path, tuple[tuple[int, int], LoadedModel]] = {}
             loaded: list[LoadedModel] = []
             errors: dict[str, str] = {}
-            for path in candidates:
-                try:
-                    loaded.append(self._load_candidate(path))
-                except Exception as exc:  # pragma: no cover - defensive logging
-                    logger.exception("Failed to load model %s", path.name)
-                    errors[path.name] = str(exc)
+            for paths in self._group_siblings(candidates):
+                entry = None
+                for path in paths:
+                    signature = _signature(path)
+                    cached = previous.get(path)
+                    if cached is not None and cached[0] == signature:
+                        entry = cached[1]
+                        break
+                    entry = self._from_manifest(manifest.get("models", {}), [path])
+                    if entry is not None:
+                        break
+                    try:
+                        entry = self._load_candidate(path)
+                        break
+                    except Exception as exc:
+                        if path is not paths[-1]:
+                            logger.warning("Could not load %s (%s); trying %s", path.name, exc, paths[-1].name)
+                            continue
+                        logger.exception("Failed to load model %s", path.name)
+                        errors[path.name] = str(exc)
+                        # A half-written replacement must not drop a working member.
+                        stale = next((previous[p] for p in paths if p in previous), None)
+                        if stale is not None:
+                            members[stale[1].path] = stale
+                            loaded.append(stale[1])
+                if entry is not None:
+                    members[entry.path] = (signature, entry)
+                    loaded.append(entry)
+
+            self._members = members
+            current = self._ensemble
+            if (
+                only_if_changed
+                and current.state != ModelState.PENDING
+                and tuple(map(id, loaded)) == tuple(map(id, current.models))
+                and errors == dict(current.errors)
+            ):
+                self.state = current.state
+                return   # nothing changed; keep the published version
+
+            fused = self._fuse(loaded)
+            if all(entry.resident for entry in loaded):
+                batch_size = self._calibrate_batch_size(loaded, fused)
+            else:
+                batch_size = int(manifest.get("optimal_batch_size") or DEFAULT_BATCH_SIZE)
+            self._publish(
+                Ensemble(
+                    models=tuple(loaded),
+                    weights=tuple(self._weight(entry) for entry in loaded),
+                    errors=MappingProxyType(errors),
+                    state=ModelState.ACTIVE if loaded else ModelState.ERROR,
+                    optimal_batch_size=batch_size,
+                    fingerprint=self._fingerprint(loaded),
+                    fused=fused,
+                )
+            )
 
-            self._models = loaded
-            self._errors = errors
-            self.model_name = ", ".join(entry.name for entry in loaded) if loaded else None
-            self.state = ModelState.ACTIVE if loaded else ModelState.ERROR
+    @staticmethod
+    def _group_siblings(candidates: list[Path]) -> list[list[Path]]:
+        """Files per model stem in load order: up-to-date .onnx/.joblib exports before their .pkl."""
+        by_stem: dict[str, list[Path]] = {}
+        for path in candidates:
+            by_stem.setdefault(path.stem, []).append(path)
+        groups = []
+        for paths in by_stem.values():
+            pkl = next((p for p in paths if p.suffix.lower() == ".pkl"), None)
+            if pkl is not None and len(paths) > 1:
+                # By content, not mtime: checkouts and deploys rewrite mtimes.
+                current = _file_digest(pkl)
+                exports = []
+                for suffix in ((".onnx",) if PREFER_ONNX else ()) + (".joblib",):
+                    for path in paths:
+                        if path.suffix.lower() != suffix:
+                            continue
+                        if _export_source_digest(path) != current:
+                            logger.warning("Ignoring stale %s: not exported from the current %s",
+                                           path.name, pkl.name)
+                            continue
+                        exports.append(path)
+                paths = exports + [pkl]
+            groups.append(paths)
+        return groups
+
+    def _load_manifest(self) -> dict[str, Any]:
+        path = MODELS_DIR / MANIFEST_NAME
+        if not path.exists():
+            return {}
+        try:
+            with path.open() as handle:
+                return json.load(handle)
+        except Exception:  # pragma: no cover - a bad manifest only costs laziness
+            logger.warning("Could not parse %s", MANIFEST_NAME, exc_info=True)
+            return {}
+
+    def _from_manifest(self, entries: Mapping[str, dict], paths: list[Path]) -> Optional[LoadedModel]:
+        """A not-yet-loaded entry for the first of ``paths`` the manifest still describes."""
+        for path in paths:
+            meta = entries.get(path.stem)
+            if meta and meta.get("file") == path.name and meta.get("digest") == _file_digest(path):
+                return LoadedModel(
+                    name=path.stem,
+                    path=path,
+                    backend=meta["backend"],
+                    model=None,
+                    feature_names=tuple(meta.get("feature_names") or ()),
+                    source=meta.get("source", ""),
+                    output=meta.get("output"),
+                    kind=meta.get("kind", ""),
+                    digest=meta["digest"],
+                    load=lambda path=path: self._load_candidate(path).model,
+                )
+        return None
+
+    def write_manifest(self, path: Optional[Path] = None) -> Path:
+        """Record the current ensemble's metadata so cold starts can skip loading weights."""
+        ensemble = self._ensemble
+        document = {
+            "optimal_batch_size": ensemble.optimal_batch_size,
+            "models": {
+                entry.name: {
+                    "file": entry.path.name,
+                    "digest": entry.digest or _file_digest(entry.path),
+                    "backend": entry.backend,
+                    "feature_names": list(entry.feature_names),
+                    "source": entry.source,
+                    "output": entry.output,
+                    "kind": entry.kind,
+                }
+                for entry in ensemble.models
+            },
+        }
+        path = Path(path) if path else MODELS_DIR / MANIFEST_NAME
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(document, indent=2) + "\n")
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def _fuse(models: list[LoadedModel]) -> Optional[FusedGroup]:
+        if not FUSE_LEGACY:
+            return None
+        try:
+            from predict_server import ModelWrapper
+        except ImportError:  # pragma: no cover - only needed for legacy pickles
+            return None
+        kind = _kind(ModelWrapper)
+        members = [
+            entry for entry in models
+            if entry.backend == "pickle" and entry.kind == kind and not entry.feature_names
+        ]
+        if len(members) < 2:
+            return None
+        logger.info("Fusing legacy models: %s", ", ".join(entry.name for entry in members))
+        return FusedGroup(members=tuple(members))
+
+    @staticmethod
+    def _fingerprint(models: list[LoadedModel]) -> str:
+        digest = hashlib.blake2b(digest_size=8)
+        for entry in models:
+            # Manifest entries carry their digest; members reused across
+            # rescans keep the one computed here the first time.
+            if not entry.digest:
+                entry.digest = _file_digest(entry.path)
+            digest.update(f"{entry.name}:{entry.digest};".encode())
+        return digest.hexdigest()
+
+    def _calibrate_batch_size(self, models: list[LoadedModel], fused: Optional[FusedGroup] = None) -> int:
+        if not models or not CALIBRATE_BATCH:
+            return DEFAULT_BATCH_SIZE
+        rng = np.random.default_rng(0)
+        throughput: dict[int, float] = {}
+        try:
+            for size in CALIBRATION_SIZES:
+                matrix = (rng.random((size, 14), dtype=np.float32) * 40).astype(np.float32)
+                adapted = {
+                    names: self._adapt_features(matrix, names)
+                    for names in dict.fromkeys(entry.feature_names for entry in models)
+                }
+                started = time.perf_counter()
+                for entry in models:
+                    if not fused or entry.name not in fused.names:
+                        self._infer(entry, adapted[entry.feature_names])
+                if fused:
+                    fused.score(adapted[fused.feature_names])
+                throughput[size] = size / max(time.perf_counter() - started, 1e-9)
+        except Exception:  # pragma: no cover - calibration is advisory
+            logger.warning("Batch size calibration failed", exc_info=True)
+            return DEFAULT_BATCH_SIZE
+        best = max(throughput.values())
+        size = min(s for s, rate in throughput.items() if rate >= CALIBRATION_EFFICIENCY * best)
+        logger.info("Calibrated optimal batch size: %d rows", size)
+        return size
 
     def _load_config(self) -> dict[str, Any]:
         cfg = MODELS_DIR / "model_config.json"
@@ -143,16 +542,21 @@ class ModelLoader:
 
     def _load_candidate(self, path: Path) -> LoadedModel:
         ext = path.suffix.lower()
-        if ext == ".pkl":
-            import pickle
+        if ext in {".pkl", ".joblib"}:
+            with warnings.catch_warnings():
+                warnings.filterwarnings(
+                    "ignore",
+                    message="Trying to unpickle estimator .* from version .*",
+                )
+                if ext == ".joblib":
+                    import joblib
 
-            with path.open("rb") as handle:
-                with warnings.catch_warnings():
-                    warnings.filterwarnings(
-                        "ignore",
-                        message="Trying to unpickle estimator .* from version .*",
-                    )
-                    obj = pickle.load(handle)
+                    obj = joblib.load(path, mmap_mode=JOBLIB_MMAP_MODE)
+                else:
+                    import pickle
+
+                    with path.open("rb") as handle:
+                        obj = pickle.load(handle)
 
             feature_names: tuple[str, ...] = ()
             backend = "pickle"
@@ -160,7 +564,10 @@ class ModelLoader:
             if isinstance(obj, dict) and "model" in obj:
                 model = obj["model"]
                 backend = "sklearn-bundle"
-                raw_names = obj.get("feature_names") or getattr(model, "feature_names_in_", ())
+                raw_names = next(
+                    (obj[key] for key in ("feature_names", "features") if obj.get(key) is not None),
+                    getattr(model, "feature_names_in_", ()),
+                )
                 feature_names = self._normalise_feature_names(raw_names)
             else:
                 feature_names = self._normalise_feature_names(
@@ -173,6 +580,7 @@ class ModelLoader:
                 backend=backend,
                 model=model,
                 feature_names=feature_names,
+                kind=_kind(type(model)),
             )
 
         if ext == ".pt":
@@ -184,8 +592,24 @@ class ModelLoader:
         if ext == ".onnx":
             import onnxruntime as ort
 
-            model = ort.InferenceSession(str(path))
-            return LoadedModel(name=path.stem, path=path, backend="onnx", model=model)
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+            options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            model = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+            meta = model.get_modelmeta().custom_metadata_map
+            outputs = [output.name for output in model.get_outputs()]
+            return LoadedModel(
+                name=path.stem,
+                path=path,
+                backend="onnx",
+                model=model,
+                feature_names=self._normalise_feature_names(json.loads(meta.get("feature_names", "[]"))),
+                source=meta.get("pyroscan_source", ""),
+                # skl2onnx classifiers emit (label, probabilities).
+                output="probabilities" if "probabilities" in outputs else outputs[0],
+            )
 
         if ext == ".h5":
             import tensorflow as tf
@@ -205,14 +629,14 @@ class ModelLoader:
         return ()
 
     def _weight(self, entry: LoadedModel) -> float:
-        if entry.backend == "sklearn-bundle":
+        if "sklearn-bundle" in (entry.backend, entry.source):
             return 1.25
         if entry.name == "local_model":
             return 1.05
         return 1.0
 
     def _infer(self, entry: LoadedModel, features: np.ndarray) -> np.ndarray:
-        model = entry.model
+        model = entry.resolve()
         if entry.backend in {"pickle", "sklearn-bundle"}:
             if hasattr(model, "predict_proba"):
                 with warnings.catch_warnings():
@@ -243,8 +667,11 @@ class ModelLoader:
 
         if entry.backend == "onnx":
             input_name = model.get_inputs()[0].name
-            output = model.run(None, {input_name: features.astype(np.float32)})[0]
-            return np.asarray(output).reshape(-1).astype(float)
+            features = np.ascontiguousarray(features, dtype=np.float32)
+            output = np.asarray(model.run([entry.output] if entry.output else None, {input_name: features})[0])
+            if output.ndim == 2 and output.shape[1] > 1:
+                return output[:, 1].astype(float)
+            return output.reshape(-1).astype(float)
 
         if entry.backend == "keras":
             return np.asarray(model.predict(features.astype(np.float32), verbose=0)).reshape(-1)
@@ -325,23 +752,95 @@ class ModelLoader:
 
         return np.column_stack(columns).astype(np.float32, copy=False)
 
-    def _snapshot(self) -> frozenset[tuple[str, float]]:
+    def _watch(self, watcher) -> None:
         try:
-            return frozenset(
-                (path.name, path.stat().st_mtime)
-                for path in MODELS_DIR.iterdir()
-                if path.suffix.lower() in SUPPORTED_EXTENSIONS
-            )
-        except Exception:
-            return frozenset()
+            while not self._stop_event.is_set():
+                changed = watcher.wait()
+                if not changed:
+                    continue
+                while True:
+                    more = watcher.wait(RELOAD_DEBOUNCE)
+                    if not more:
+                        break
+                    changed |= more
+                logger.info("Model files changed: %s", ", ".join(sorted(changed - {OVERFLOW})) or "(overflow)")
+                try:
+                    self._scan(only_if_changed=True)
+                except Exception:  # pragma: no cover - keep watching after a failed scan
+                    logger.exception("Model rescan failed")
+        finally:
+            watcher.close()
+
 
-    def _poll(self) -> None:
-        last = self._snapshot()
-        while not self._stop_event.wait(5):
-            current = self._snapshot()
-            if current != last:
-                self._scan()
-                last = current
+def _kind(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _signature(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _file_digest(path: Path) -> str:
+    # Content, not mtime: checkouts and deploys rewrite mtimes.
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _export_source_digest(path: Path) -> Optional[str]:
+    """Digest of the pickle ``path`` was exported from, or None if it isn't recorded."""
+    try:
+        if path.suffix.lower() == ".onnx":
+            try:
+                import onnx
+            except ImportError:
+                import onnxruntime as ort
+
+                session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+                return session.get_modelmeta().custom_metadata_map.get(SOURCE_DIGEST_KEY)
+            props = onnx.load(str(path), load_external_data=False).metadata_props
+            return next((prop.value for prop in props if prop.key == SOURCE_DIGEST_KEY), None)
+        return path.with_name(path.name + SOURCE_SUFFIX).read_text().strip()
+    except Exception:
+        return None
 
 
 model_loader = ModelLoader()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect PyroScan models.")
+    parser.add_argument("--write-manifest", action="store_true",
+                        help=f"write api/models/{MANIFEST_NAME} for lazy (serverless) loading")
+    parser.add_argument("--joblib", action="store_true",
+                        help="also write an uncompressed, memory-mappable .joblib next to each .pkl")
+    args = parser.parse_args(argv)
+    if args.joblib:
+        import joblib
+        import pickle
+
+        for entry in model_loader._ensemble.models:
+            if entry.path.suffix.lower() != ".pkl":
+                continue
+            target = entry.path.with_suffix(".joblib")
+            source = target.with_name(target.name + SOURCE_SUFFIX)
+            # Drop the old record first: an interrupted export then reads as stale.
+            source.unlink(missing_ok=True)
+            with entry.path.open("rb") as handle:
+                joblib.dump(pickle.load(handle), target)
+            source.write_text(_file_digest(entry.path) + "\n")
+            print(f"wrote {target}")
+        model_loader._scan()
+    if args.write_manifest:
+        print(f"wrote {model_loader.write_manifest()}")
+    if not (args.joblib or args.write_manifest):
+        print(json.dumps(model_loader.describe(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
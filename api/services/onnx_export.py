@@ -0,0 +1,151 @@
+"""PyroScan ONNX export for sklearn model bundles.
+
+Converts every ``{"model": estimator, "features"|"feature_names": [...]}``
+pickle in ``api/models/`` into a sibling ``<name>.onnx``, which
+``ModelLoader`` then loads through ONNX Runtime instead of unpickling the
+bundle. The bundle's feature names are stored in the ONNX metadata
+(``feature_names``, JSON) so the feature adapter keeps working unchanged,
+along with the pickle's content digest (``pyroscan_source_digest``): the
+loader only prefers an export made from the pickle that is there now.
+
+Needs ``skl2onnx`` (export only) and ``onnxruntime`` (to verify)::
+
+    python -m api.services.onnx_export              # every bundle in api/models
+    python -m api.services.onnx_export fire_risk_model --no-verify
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import warnings
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+# Same directory as model_loader.MODELS_DIR; importing that module would load every model.
+MODELS_DIR = Path(__file__).resolve().parent.parent / "models"
+ONNX_OPSET = 17
+SOURCE_KEY = "pyroscan_source"
+SOURCE_DIGEST_KEY = "pyroscan_source_digest"
+FEATURE_NAMES_KEY = "feature_names"
+VERIFY_ROWS = 256
+VERIFY_ATOL = 1e-4
+
+
+def file_digest(path: Path) -> str:
+    # Same as model_loader._file_digest, which the loader compares this with.
+    digest = hashlib.blake2b(digest_size=16)
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_bundle(path: Path) -> tuple[object, tuple[str, ...]]:
+    with path.open("rb") as handle:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="Trying to unpickle estimator .* from version .*")
+            obj = pickle.load(handle)
+    if not (isinstance(obj, dict) and "model" in obj):
+        raise ValueError(f"{path.name} is not an sklearn bundle")
+    model = obj["model"]
+    raw = obj.get("feature_names")
+    if raw is None:
+        raw = obj.get("features")
+    if raw is None:
+        raw = getattr(model, "feature_names_in_", ())
+    names = tuple(str(name) for name in (raw.tolist() if isinstance(raw, np.ndarray) else raw))
+    return model, names
+
+
+def export_bundle(path: Path | str, out: Optional[Path | str] = None, verify: bool = True) -> Path:
+    """Write ``path``'s estimator as ONNX next to it (or to ``out``); returns the output path."""
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+
+    path = Path(path)
+    out = Path(out) if out else path.with_suffix(".onnx")
+    model, names = load_bundle(path)
+    n_features = len(names) or int(model.n_features_in_)
+    options = {id(model): {"zipmap": False}} if hasattr(model, "predict_proba") else None
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("input", FloatTensorType([None, n_features]))],
+        options=options,
+        target_opset=ONNX_OPSET,
+    )
+    meta = {
+        FEATURE_NAMES_KEY: json.dumps(list(names)),
+        SOURCE_KEY: "sklearn-bundle",
+        SOURCE_DIGEST_KEY: file_digest(path),
+    }
+    for key, value in meta.items():
+        entry = onnx_model.metadata_props.add()
+        entry.key, entry.value = key, value
+
+    tmp = out.with_suffix(".onnx.tmp")
+    tmp.write_bytes(onnx_model.SerializeToString())
+    if verify:
+        try:
+            _verify(model, tmp, n_features)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+    os.replace(tmp, out)   # the model watcher never sees a half-written file
+    return out
+
+
+def _verify(model, onnx_path: Path, n_features: int) -> None:
+    import onnxruntime as ort
+
+    rng = np.random.default_rng(0)
+    sample = (rng.random((VERIFY_ROWS, n_features)) * 40).astype(np.float32)
+    session = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+    outputs = dict(zip((o.name for o in session.get_outputs()), session.run(None, {"input": sample})))
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names, but .*")
+        if "probabilities" in outputs:
+            expected, actual = model.predict_proba(sample)[:, 1], outputs["probabilities"][:, 1]
+        else:
+            expected, actual = model.predict(sample), next(iter(outputs.values()))
+    error = float(np.max(np.abs(np.asarray(actual, dtype=np.float64).reshape(-1) - expected)))
+    if error > VERIFY_ATOL:
+        raise ValueError(f"ONNX export of {onnx_path.stem} differs from sklearn by {error:.2e}")
+
+
+def bundle_paths(directory: Path | str = MODELS_DIR, names: Iterable[str] = ()) -> list[Path]:
+    directory = Path(directory)
+    wanted = set(names)
+    paths = []
+    for path in sorted(directory.glob("*.pkl")):
+        if wanted and path.stem not in wanted:
+            continue
+        try:
+            load_bundle(path)
+        except ValueError:
+            continue   # legacy wrappers and bare estimators are not bundles
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export PyroScan sklearn bundles to ONNX.")
+    parser.add_argument("names", nargs="*", help="bundle names (default: every bundle)")
+    parser.add_argument("--dir", default=str(MODELS_DIR), help="models directory (default: %(default)s)")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="skip comparing ONNX Runtime output with sklearn")
+    args = parser.parse_args(argv)
+    paths = bundle_paths(args.dir, args.names)
+    if not paths:
+        parser.error(f"no sklearn bundles found in {args.dir}")
+    for path in paths:
+        print(f"wrote {export_bundle(path, verify=not args.no_verify)}")
+
+
+if __name__ == "__main__":
+    main()
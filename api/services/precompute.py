@@ -0,0 +1,249 @@
+"""PyroScan background precompute.
+
+Scores fixed grids (by default the frontend's global 5° view) for every
+forecast day ahead of time and keeps the results in a snapshot store that
+``/api/risk/tiles`` serves from directly. A snapshot is only used while the
+ensemble and static rasters that produced it are still loaded: snapshots
+are keyed by their content fingerprint, which also lets a standalone run
+(cron, CLI) hand its results to server processes through
+``PYROSCAN_SNAPSHOT_DIR``.
+
+Run in-process with ``PYROSCAN_PRECOMPUTE=1``, or standalone::
+
+    python -m api.services.precompute --once
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+from api.services.tile_processor import TileBatch, tile_processor
+
+logger = logging.getLogger("pyroscan.precompute")
+
+PRECOMPUTE_ENABLED = os.getenv("PYROSCAN_PRECOMPUTE", "0") == "1"
+PRECOMPUTE_INTERVAL = float(os.getenv("PYROSCAN_PRECOMPUTE_INTERVAL", "1800"))
+PRECOMPUTE_DAYS = tuple(range(10))
+SNAPSHOT_DIR = os.getenv("PYROSCAN_SNAPSHOT_DIR", "")
+SNAPSHOT_MAX_AGE = float(os.getenv("PYROSCAN_SNAPSHOT_MAX_AGE", "86400"))
+
+
+@dataclass(frozen=True)
+class GridSpec:
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    tile_deg: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.min_lat:g}_{self.min_lon:g}_{self.max_lat:g}_{self.max_lon:g}_{self.tile_deg:g}"
+
+    def matches(self, min_lat, min_lon, max_lat, max_lon, tile_deg) -> bool:
+        if tile_deg is None:
+            return False
+        return np.allclose(
+            (self.min_lat, self.min_lon, self.max_lat, self.max_lon, self.tile_deg),
+            (min_lat, min_lon, max_lat, max_lon, tile_deg),
+        )
+
+    def batch(self) -> TileBatch:
+        return tile_processor.generate_batch(
+            self.min_lat, self.min_lon, self.max_lat, self.max_lon, self.tile_deg
+        )
+
+
+# The frontend's initial globe request.
+DEFAULT_GRIDS = (GridSpec(-60.0, -180.0, 75.0, 180.0, 5.0),)
+
+
+@dataclass
+class Snapshot:
+    grid: GridSpec
+    day_offset: int
+    fingerprint: str
+    created: float
+    batch: TileBatch                 # scored, with feature rows
+    tiles: Optional[list] = None     # rendered tile dicts for the default JSON response
+
+
+class SnapshotStore:
+    def __init__(self, directory: Optional[Path | str] = None) -> None:
+        self.directory = Path(directory) if directory else None
+        self._snapshots: dict[tuple[str, int], Snapshot] = {}
+        self._lock = threading.Lock()
+
+    def put(self, snapshot: Snapshot, persist: bool = False) -> None:
+        with self._lock:
+            self._snapshots[(snapshot.grid.key, snapshot.day_offset)] = snapshot
+        if persist and self.directory is not None:
+            self._save(snapshot)
+
+    def get(self, grid: GridSpec, day_offset: int, fingerprint: str) -> Optional[Snapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get((grid.key, day_offset))
+        if not self._fresh(snapshot, fingerprint) and self.directory is not None:
+            snapshot = self._load(grid, day_offset)
+            if snapshot is not None:
+                with self._lock:
+                    self._snapshots[(grid.key, day_offset)] = snapshot
+        return snapshot if self._fresh(snapshot, fingerprint) else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+    def describe(self) -> list[dict]:
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        return [
+            {
+                "grid": s.grid.key,
+                "day_offset": s.day_offset,
+                "fingerprint": s.fingerprint,
+                "age_s": round(time.time() - s.created, 1),
+                "tile_count": len(s.batch),
+            }
+            for s in sorted(snapshots, key=lambda s: (s.grid.key, s.day_offset))
+        ]
+
+    @staticmethod
+    def _fresh(snapshot: Optional[Snapshot], fingerprint: str) -> bool:
+        return (
+            snapshot is not None
+            and snapshot.fingerprint == fingerprint
+            and time.time() - snapshot.created <= SNAPSHOT_MAX_AGE
+        )
+
+    def _path(self, grid: GridSpec, day_offset: int) -> Path:
+        return self.directory / f"{grid.key}_d{day_offset}.npz"
+
+    def _save(self, snapshot: Snapshot) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        batch = snapshot.batch
+        path = self._path(snapshot.grid, snapshot.day_offset)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp,
+            lats=batch.lats, lons=batch.lons, lat_sizes=batch.lat_sizes, lon_sizes=batch.lon_sizes,
+            scores=batch.scores, features=batch.features, ids=np.array(batch.ids),
+            meta=np.array(json.dumps({"fingerprint": snapshot.fingerprint, "created": snapshot.created})),
+        )
+        os.replace(tmp, path)   # readers never see a half-written file
+
+    def _load(self, grid: GridSpec, day_offset: int) -> Optional[Snapshot]:
+        path = self._path(grid, day_offset)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                meta = json.loads(str(data["meta"]))
+                batch = TileBatch(
+                    lats=data["lats"], lons=data["lons"],
+                    lat_sizes=data["lat_sizes"], lon_sizes=data["lon_sizes"],
+                    features=data["features"], _ids=data["ids"].tolist(),
+                ).classify(data["scores"])
+        except Exception:  # pragma: no cover - a corrupt file is just a miss
+            logger.warning("Could not read snapshot %s", path.name, exc_info=True)
+            return None
+        return Snapshot(grid, day_offset, meta["fingerprint"], meta["created"], batch)
+
+
+ScoreFn = Callable[[TileBatch, int, bool], TileBatch]
+RenderFn = Callable[[TileBatch], list]
+
+
+class Precomputer:
+    def __init__(
+        self,
+        score_batch: ScoreFn,
+        render: RenderFn,
+        fingerprint: Callable[[], str],
+        store: SnapshotStore,
+        grids: Iterable[GridSpec] = DEFAULT_GRIDS,
+        days: Iterable[int] = PRECOMPUTE_DAYS,
+        interval: float = PRECOMPUTE_INTERVAL,
+    ) -> None:
+        self._score_batch = score_batch
+        self._render = render
+        self._fingerprint = fingerprint
+        self.store = store
+        self.grids = tuple(grids)
+        self.days = tuple(days)
+        self.interval = interval
+        self.last_run: Optional[float] = None
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, persist: bool = False) -> int:
+        """Score every grid for every day; returns the number of snapshots written."""
+        written = 0
+        for grid in self.grids:
+            for day_offset in self.days:
+                fingerprint = self._fingerprint()
+                batch = self._score_batch(grid.batch(), day_offset, False)
+                if self._fingerprint() != fingerprint:
+                    continue   # models changed mid-run; the reload trigger reruns us
+                snapshot = Snapshot(grid, day_offset, fingerprint, time.time(), batch, self._render(batch))
+                self.store.put(snapshot, persist=persist)
+                written += 1
+        self.last_run = time.time()
+        return written
+
+    def trigger(self) -> None:
+        """Recompute as soon as possible (e.g. after a model reload)."""
+        self._wake.set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="PyroPrecompute")
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.clear()
+            started = time.perf_counter()
+            try:
+                count = self.run_once(persist=self.store.directory is not None)
+                logger.info("Precomputed %d snapshots in %.1fs", count, time.perf_counter() - started)
+            except Exception:  # pragma: no cover - keep the scheduler alive
+                logger.exception("Precompute run failed")
+            self._wake.wait(self.interval if self.interval > 0 else None)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute PyroScan risk snapshots.")
+    parser.add_argument("--dir", default=SNAPSHOT_DIR or None, required=not SNAPSHOT_DIR,
+                        help="snapshot directory shared with the server (PYROSCAN_SNAPSHOT_DIR)")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--interval", type=float, default=PRECOMPUTE_INTERVAL,
+                        help="seconds between passes (default: %(default)s)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from api.routers.predict import precomputer
+
+    precomputer.store.directory = Path(args.dir)
+    while True:
+        started = time.perf_counter()
+        count = precomputer.run_once(persist=True)
+        print(f"wrote {count} snapshots to {args.dir} in {time.perf_counter() - started:.1f}s")
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
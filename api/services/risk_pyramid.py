@@ -0,0 +1,202 @@
+"""PyroScan multi-resolution risk pyramid.
+
+Tiles use an XYZ scheme on the equirectangular (plate carrée) globe: zoom
+``z`` has ``2**(z+1)`` columns by ``2**z`` rows of square tiles, ``y`` counting
+down from the north pole. Every tile is a ``TILE_CELLS × TILE_CELLS`` grid of
+risk cells.
+
+Cells are only scored at the base zoom (PYRAMID_BASE_ZOOM) and deeper. Each
+coarser tile is built from its four children by 2×2 max and mean reduction,
+so zooming out reuses fine work and never runs the ensemble again. Built
+tiles are cached per (z, x, y, day, ensemble version) in the pyramid's own
+bounded LRU, separate from the per-cell tile cache of /api/risk/tiles.
+
+A coarse tile whose missing base tiles exceed PYRAMID_MAX_CELLS cells, and
+every coarse ``live`` tile, is instead sampled: its own cell centres are
+scored directly (``sampled`` in the document). Live tiles are not cached
+here; their upstream data is cached by the fetcher.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+from api.services.data_fetcher import ResponseCache
+from api.services.tile_processor import TIER_COLOR_ORDER, TIER_ORDER, TileBatch, tier_indices
+
+TILE_CELLS = int(os.getenv("PYROSCAN_PYRAMID_TILE_CELLS", "16"))
+PYRAMID_BASE_ZOOM = int(os.getenv("PYROSCAN_PYRAMID_BASE_ZOOM", "4"))
+PYRAMID_MAX_ZOOM = int(os.getenv("PYROSCAN_PYRAMID_MAX_ZOOM", "10"))
+PYRAMID_CACHE_MAX_ENTRIES = int(os.getenv("PYROSCAN_PYRAMID_CACHE_MAX_ENTRIES", "8192"))
+# Most cells one request may score to fill the base level; the same bound
+# /api/risk/tiles puts on one request.
+PYRAMID_MAX_CELLS = int(os.getenv("PYROSCAN_PYRAMID_MAX_CELLS", "2048"))
+SCORE_CHUNK = 8192   # cells per scoring call when filling the base level
+
+AGGREGATIONS = ("max", "mean")
+
+
+@dataclass(frozen=True)
+class PyramidTile:
+    z: int
+    x: int
+    y: int
+    max: np.ndarray    # (TILE_CELLS, TILE_CELLS) scores 0–1, row 0 = north edge
+    mean: np.ndarray
+    sampled: bool = False   # scored at its own cell centres, not aggregated
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        return tile_bounds(self.z, self.x, self.y)
+
+
+def tile_size(z: int) -> float:
+    """Edge length of a zoom-``z`` tile in degrees."""
+    return 180.0 / 2**z
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of an XYZ tile."""
+    size = tile_size(z)
+    max_lat = 90.0 - y * size
+    min_lon = -180.0 + x * size
+    return max_lat - size, min_lon, max_lat, min_lon + size
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= PYRAMID_MAX_ZOOM and 0 <= x < 2 ** (z + 1) and 0 <= y < 2**z
+
+
+def cell_batch(z: int, x: int, y: int) -> TileBatch:
+    """Cell centres of one tile, north row first, as an unscored batch."""
+    min_lat, min_lon, max_lat, _ = tile_bounds(z, x, y)
+    cell = tile_size(z) / TILE_CELLS
+    lats = max_lat - (np.arange(TILE_CELLS) + 0.5) * cell
+    lons = min_lon + (np.arange(TILE_CELLS) + 0.5) * cell
+    lat_grid, lon_grid = np.meshgrid(lats, lons, indexing="ij")
+    n = lat_grid.size
+    return TileBatch(
+        lats=np.round(lat_grid.ravel(), 6),
+        lons=np.round(lon_grid.ravel(), 6),
+        lat_sizes=np.full(n, cell, dtype=np.float64),
+        lon_sizes=np.full(n, cell, dtype=np.float64),
+    )
+
+
+def _reduce(children: list[np.ndarray], how: str) -> np.ndarray:
+    # children in (NW, NE, SW, SE) order → one grid at half the resolution.
+    top = np.hstack(children[:2])
+    bottom = np.hstack(children[2:])
+    full = np.vstack([top, bottom]).reshape(TILE_CELLS, 2, TILE_CELLS, 2)
+    return full.max(axis=(1, 3)) if how == "max" else full.mean(axis=(1, 3))
+
+
+ScoreFn = Callable[[TileBatch, int, bool], TileBatch]
+
+
+class RiskPyramid:
+    def __init__(self, score_batch: ScoreFn, max_entries: int = PYRAMID_CACHE_MAX_ENTRIES,
+                 max_cells: int = PYRAMID_MAX_CELLS) -> None:
+        self._score_batch = score_batch
+        self.cache = ResponseCache(max_entries=max_entries)
+        self.max_cells = max_cells
+
+    def tile(self, z: int, x: int, y: int, day_offset: int = 0, use_live_data: bool = False,
+             version: int = 0) -> PyramidTile:
+        if not valid_tile(z, x, y):
+            raise ValueError(f"tile {z}/{x}/{y} is outside the pyramid")
+        cached = self.cache.get((z, x, y, day_offset, use_live_data, version))
+        if cached is not None:
+            return cached
+        if z >= PYRAMID_BASE_ZOOM:
+            return self._score_tiles([(z, x, y)], day_offset, use_live_data, version)[0]
+        if use_live_data:
+            return self._sampled(z, x, y, day_offset, use_live_data, version)
+        missing = self._missing_base(z, x, y, day_offset, use_live_data, version)
+        if len(missing) * TILE_CELLS * TILE_CELLS > self.max_cells:
+            return self._sampled(z, x, y, day_offset, use_live_data, version)
+        if missing:
+            self._score_tiles(missing, day_offset, use_live_data, version)
+        return self._aggregate(z, x, y, day_offset, use_live_data, version)
+
+    def _aggregate(self, z, x, y, day_offset, use_live_data, version) -> PyramidTile:
+        children = [
+            self.tile(z + 1, 2 * x + dx, 2 * y + dy, day_offset, use_live_data, version)
+            for dy in (0, 1) for dx in (0, 1)
+        ]
+        tile = PyramidTile(
+            z, x, y,
+            max=_reduce([child.max for child in children], "max"),
+            mean=_reduce([child.mean for child in children], "mean"),
+            sampled=any(child.sampled for child in children),
+        )
+        if not tile.sampled:
+            self.cache.put((z, x, y, day_offset, use_live_data, version), tile)
+        return tile
+
+    def _missing_base(self, z, x, y, day_offset, use_live_data, version) -> list[tuple[int, int, int]]:
+        """Base tiles under (z, x, y) that are not cached yet."""
+        span = 2 ** (PYRAMID_BASE_ZOOM - z)
+        return [
+            (PYRAMID_BASE_ZOOM, bx, by)
+            for by in range(y * span, (y + 1) * span)
+            for bx in range(x * span, (x + 1) * span)
+            if self.cache.get((PYRAMID_BASE_ZOOM, bx, by, day_offset, use_live_data, version)) is None
+        ]
+
+    def _sampled(self, z, x, y, day_offset, use_live_data, version) -> PyramidTile:
+        # Cached apart from the aggregated tile, which replaces it once the
+        # base level under it has been filled by finer requests.
+        key = (z, x, y, day_offset, use_live_data, version, "sampled")
+        tile = self.cache.get(key)
+        if tile is None:
+            tile = self._score_tiles([(z, x, y)], day_offset, use_live_data, version, sampled=True)[0]
+        return tile
+
+    def _score_tiles(self, coords, day_offset, use_live_data, version, sampled=False) -> list[PyramidTile]:
+        cells = TILE_CELLS * TILE_CELLS
+        batches = [cell_batch(*coord) for coord in coords]
+        merged = TileBatch(
+            lats=np.concatenate([b.lats for b in batches]),
+            lons=np.concatenate([b.lons for b in batches]),
+            lat_sizes=np.concatenate([b.lat_sizes for b in batches]),
+            lon_sizes=np.concatenate([b.lon_sizes for b in batches]),
+        )
+        scores = np.concatenate([
+            self._score_batch(merged[start:start + SCORE_CHUNK], day_offset, use_live_data).scores
+            for start in range(0, len(merged), SCORE_CHUNK)
+        ])
+        tiles = []
+        for i, (z, x, y) in enumerate(coords):
+            grid = scores[i * cells:(i + 1) * cells].reshape(TILE_CELLS, TILE_CELLS).astype(np.float32)
+            tiles.append(PyramidTile(z, x, y, grid, grid, sampled=sampled))
+            if not use_live_data:
+                key = (z, x, y, day_offset, use_live_data, version)
+                self.cache.put(key + ("sampled",) if sampled else key, tiles[-1])
+        return tiles
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+def tile_document(tile: PyramidTile, how: str, meta: Optional[dict] = None) -> dict:
+    scores = tile.max if how == "max" else tile.mean
+    min_lat, min_lon, max_lat, max_lon = tile.bounds
+    return {
+        **(meta or {}),
+        "z": tile.z,
+        "x": tile.x,
+        "y": tile.y,
+        "bounds": [[min_lat, min_lon], [max_lat, max_lon]],
+        "cell_deg": tile_size(tile.z) / TILE_CELLS,
+        "aggregation": how,
+        "sampled": tile.sampled,
+        "tier_names": [tier.value for tier in TIER_ORDER],
+        "tier_colors": TIER_COLOR_ORDER,
+        "risk_scores": np.round(scores.astype(np.float64) * 100, 1).tolist(),
+        "tiers": tier_indices(scores).tolist(),
+    }
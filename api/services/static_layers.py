@@ -0,0 +1,183 @@
+"""PyroScan static feature rasters.
+
+Terrain, vegetation, human density and fire history depend only on
+location, so they can be precomputed on a global grid and stored as one
+``<layer>.npy`` float32 array per layer in ``api/static_layers/``. Arrays
+are opened memory-mapped: a lookup is a fancy-index into the page cache,
+shared by every worker process on the host.
+
+Each raster is equirectangular and covers the globe: shape ``(rows, 2 *
+rows)``, row 0 at the southern edge (-90°), column 0 at -180°. The
+resolution is ``180 / rows`` degrees and may differ per layer, so a real
+raster (e.g. DEM-derived slope, ESA land cover mapped to NDVI) can replace
+a synthetic one by dropping in a file with the same name. Layers without a
+file fall back to the synthetic generator.
+
+Build the synthetic store with::
+
+    python -m api.services.static_layers --resolution 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("pyroscan.static_layers")
+
+STATIC_LAYERS_DIR = Path(
+    os.getenv("PYROSCAN_STATIC_LAYERS_DIR", Path(__file__).resolve().parent.parent / "static_layers")
+)
+STATIC_RESOLUTION = float(os.getenv("PYROSCAN_STATIC_RESOLUTION", "0.25"))
+
+# Feature columns that only depend on (lat, lon), named as in TileFeatures.
+STATIC_LAYERS = (
+    "ndvi",
+    "evi",
+    "slope",
+    "aspect",
+    "elevation",
+    "human_density_index",
+    "historical_fire_count",
+)
+_BUILD_ROWS = 64   # raster rows generated per pass while building
+
+
+class StaticLayerStore:
+    def __init__(self, directory: Path | str = STATIC_LAYERS_DIR) -> None:
+        self.directory = Path(directory)
+        self._layers: dict[str, np.ndarray] = {}
+        self._signature: Optional[str] = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> None:
+        """(Re)open every layer file present in the directory."""
+        layers: dict[str, np.ndarray] = {}
+        for name in STATIC_LAYERS:
+            path = self.directory / f"{name}.npy"
+            if not path.exists():
+                continue
+            try:
+                grid = np.load(path, mmap_mode="r")
+            except Exception:  # pragma: no cover - defensive logging
+                logger.exception("Could not open static layer %s", path.name)
+                continue
+            if grid.ndim != 2 or grid.shape[1] != 2 * grid.shape[0]:
+                logger.warning("Ignoring %s: expected a global (rows, 2*rows) raster, got %s",
+                               path.name, grid.shape)
+                continue
+            layers[name] = grid
+        with self._lock:
+            self._layers = layers
+            self._signature = None
+
+    @property
+    def layers(self) -> tuple[str, ...]:
+        return tuple(self._layers)
+
+    @property
+    def signature(self) -> str:
+        """Content digest of the opened rasters ("" when every layer is synthetic).
+
+        Offline scores depend on these as much as on the models, so anything
+        keyed by the model fingerprint also carries this.
+        """
+        with self._lock:
+            if self._signature is None:
+                digest = hashlib.blake2b(digest_size=8)
+                for name, grid in self._layers.items():
+                    digest.update(f"{name}:{grid.shape}:".encode())
+                    for start in range(0, grid.shape[0], _BUILD_ROWS):
+                        digest.update(np.ascontiguousarray(grid[start:start + _BUILD_ROWS]).data)
+                self._signature = digest.hexdigest() if self._layers else ""
+            return self._signature
+
+    def lookup(self, lats, lons) -> dict[str, np.ndarray]:
+        """Values of every stored layer at the given points (missing layers are omitted)."""
+        layers = self._layers
+        if not layers:
+            return {}
+        lats = np.asarray(lats, dtype=np.float64).reshape(-1)
+        lons = np.asarray(lons, dtype=np.float64).reshape(-1)
+        out = {}
+        for name, grid in layers.items():
+            rows, cols = grid.shape
+            r = np.clip(np.floor((lats + 90.0) * rows / 180.0).astype(np.intp), 0, rows - 1)
+            c = np.floor(((lons + 180.0) % 360.0) * cols / 360.0).astype(np.intp) % cols
+            out[name] = np.asarray(grid[r, c], dtype=np.float64)
+        return out
+
+    def describe(self) -> dict[str, dict]:
+        return {
+            name: {"shape": list(grid.shape), "resolution_deg": 180.0 / grid.shape[0]}
+            for name, grid in self._layers.items()
+        }
+
+
+def cell_centres(resolution: float) -> tuple[np.ndarray, np.ndarray]:
+    rows = int(round(180.0 / resolution))
+    lats = -90.0 + (np.arange(rows) + 0.5) * 180.0 / rows
+    lons = -180.0 + (np.arange(2 * rows) + 0.5) * 180.0 / rows
+    return lats, lons
+
+
+def build(
+    directory: Path | str = STATIC_LAYERS_DIR,
+    resolution: float = STATIC_RESOLUTION,
+    layers: Optional[Iterable[str]] = None,
+) -> list[Path]:
+    """Write synthetic rasters for ``layers`` (default: all) at ``resolution`` degrees."""
+    from api.services.data_fetcher import synth_static_columns
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    names = list(layers or STATIC_LAYERS)
+    unknown = set(names) - set(STATIC_LAYERS)
+    if unknown:
+        raise ValueError(f"Unknown static layers: {sorted(unknown)}")
+    lats, lons = cell_centres(resolution)
+    grids = {
+        name: np.lib.format.open_memmap(
+            directory / f"{name}.npy", mode="w+", dtype=np.float32, shape=(len(lats), len(lons))
+        )
+        for name in names
+    }
+    for start in range(0, len(lats), _BUILD_ROWS):
+        band = lats[start:start + _BUILD_ROWS]
+        lat_grid, lon_grid = np.meshgrid(band, lons, indexing="ij")
+        columns = synth_static_columns(lat_grid.ravel(), lon_grid.ravel())
+        for name, grid in grids.items():
+            grid[start:start + len(band)] = columns[name].reshape(lat_grid.shape)
+    paths = []
+    for name, grid in grids.items():
+        grid.flush()
+        paths.append(directory / f"{name}.npy")
+    return paths
+
+
+static_layers = StaticLayerStore()
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the PyroScan static feature rasters.")
+    parser.add_argument("--resolution", type=float, default=STATIC_RESOLUTION,
+                        help="grid resolution in degrees (default: %(default)s)")
+    parser.add_argument("--dir", default=str(STATIC_LAYERS_DIR),
+                        help="output directory (default: %(default)s)")
+    parser.add_argument("--layers", nargs="+", choices=STATIC_LAYERS,
+                        help="only build these layers (e.g. to keep a dropped-in real raster)")
+    args = parser.parse_args(argv)
+    for path in build(args.dir, args.resolution, args.layers):
+        print(f"wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,13 @@ handles GeoJSON ingestion from user uploads.
 
 from __future__ import annotations
 
+import hashlib
 import math
-import uuid
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
 
 
 class RiskTier(str, Enum):
@@ -37,7 +39,63 @@ TIER_COLORS = {
 }
 
 
-@dataclass
+# Linear attribution weights used by build_factor_breakdown.
+FACTOR_WEIGHTS = {
+    "Land Surface Temperature": 0.20,
+    "Relative Humidity":        0.18,
+    "Wind Speed":               0.14,
+    "NDVI Vegetation Index":    0.13,
+    "Days Since Last Rain":     0.12,
+    "Fuel Moisture Code":       0.10,
+    "Slope":                    0.07,
+    "Human Density Index":      0.06,
+}
+
+
+# Column-friendly views of the tier table: tier index i (and colour index i)
+# refers to TIER_ORDER[i]; -1 marks an unscored tile.
+TIER_ORDER = [tier for _, tier in RISK_THRESHOLDS]
+TIER_COLOR_ORDER = [TIER_COLORS[tier] for tier in TIER_ORDER]
+_TIER_EDGES = np.array([threshold for threshold, _ in RISK_THRESHOLDS], dtype=np.float64)
+
+
+def tier_indices(scores) -> np.ndarray:
+    """Tier index per score (0–1): the first threshold the score does not exceed."""
+    scores = np.asarray(scores, dtype=np.float64)
+    idx = np.searchsorted(_TIER_EDGES, scores, side="left").astype(np.int8)
+    idx[(idx >= len(_TIER_EDGES)) | np.isnan(scores)] = -1
+    return idx
+
+
+def cell_ids(tile_deg, lats, lons) -> List[str]:
+    """
+    Stable ids for tiles of size ``tile_deg`` centred on (lats, lons).
+
+    Each cell is located by its (row, col) on a global lattice anchored at
+    (-90, -180). Grids whose origin is not lattice-aligned also carry the
+    sub-cell phase, so two different centres never share an id.
+    """
+    tile_deg = np.broadcast_to(np.asarray(tile_deg, dtype=np.float64), np.shape(lats))
+    lat_pos = np.round((np.asarray(lats, dtype=np.float64) + 90.0) / tile_deg - 0.5, 6)
+    lon_pos = np.round((np.asarray(lons, dtype=np.float64) + 180.0) / tile_deg - 0.5, 6)
+    rows, cols = np.floor(lat_pos), np.floor(lon_pos)
+    phase_lat, phase_lon = np.round(lat_pos - rows, 6), np.round(lon_pos - cols, 6)
+    return [
+        hashlib.blake2b(
+            f"{deg:.6f}:{int(row)}:{int(col)}:{plat:.6f}:{plon:.6f}".encode(), digest_size=6
+        ).hexdigest()
+        for deg, row, col, plat, plon in zip(
+            tile_deg.tolist(), rows.tolist(), cols.tolist(), phase_lat.tolist(), phase_lon.tolist()
+        )
+    ]
+
+
+def cell_id(tile_deg: float, lat: float, lon: float) -> str:
+    """Stable id for a single tile; see :func:`cell_ids`."""
+    return cell_ids(tile_deg, [lat], [lon])[0]
+
+
+@dataclass(slots=True)
 class Tile:
     id: str
     lat: float
@@ -76,6 +134,105 @@ class Tile:
         }
 
 
+@dataclass
+class TileBatch:
+    """
+    Columnar tile grid: one NumPy array per attribute.
+
+    Scores are stored 0–1 (NaN until classified) and ``tiers`` holds the
+    tier/colour index into TIER_ORDER / TIER_COLOR_ORDER. ``Tile`` objects
+    are only built when a caller indexes or iterates the batch.
+    """
+
+    lats: np.ndarray
+    lons: np.ndarray
+    lat_sizes: np.ndarray
+    lon_sizes: np.ndarray
+    scores: Optional[np.ndarray] = None
+    tiers: Optional[np.ndarray] = None
+    features: Optional[np.ndarray] = None   # (N, 14) rows the scores came from
+    _ids: Optional[List[str]] = None
+
+    def __post_init__(self):
+        n = len(self.lats)
+        if self.scores is None:
+            self.scores = np.full(n, np.nan, dtype=np.float64)
+        if self.tiers is None:
+            self.tiers = np.full(n, -1, dtype=np.int8)
+
+    @classmethod
+    def from_tiles(cls, tiles: Sequence[Tile]) -> "TileBatch":
+        batch = cls(
+            lats=np.array([t.lat for t in tiles], dtype=np.float64),
+            lons=np.array([t.lon for t in tiles], dtype=np.float64),
+            lat_sizes=np.array([t.lat_size for t in tiles], dtype=np.float64),
+            lon_sizes=np.array([t.lon_size for t in tiles], dtype=np.float64),
+            _ids=[t.id for t in tiles],
+        )
+        for i, t in enumerate(tiles):
+            if t.risk_score is not None:
+                batch.scores[i] = t.risk_score / 100
+        batch.tiers = tier_indices(batch.scores)
+        return batch
+
+    @property
+    def ids(self) -> List[str]:
+        if self._ids is None:
+            self._ids = cell_ids(self.lat_sizes, self.lats, self.lons)
+        return self._ids
+
+    @property
+    def risk_scores(self) -> np.ndarray:
+        """Scores on the 0–100 scale used by the API."""
+        return np.round(self.scores * 100, 1)
+
+    def classify(self, scores) -> "TileBatch":
+        self.scores = np.clip(np.asarray(scores, dtype=np.float64), 0.0, 1.0)
+        self.tiers = tier_indices(self.scores)
+        return self
+
+    def tile(self, i: int) -> Tile:
+        tier = int(self.tiers[i])
+        score = float(self.scores[i])
+        return Tile(
+            id=self.ids[i],
+            lat=float(self.lats[i]),
+            lon=float(self.lons[i]),
+            lat_size=float(self.lat_sizes[i]),
+            lon_size=float(self.lon_sizes[i]),
+            risk_score=None if math.isnan(score) else round(score * 100, 1),
+            risk_tier=TIER_ORDER[tier] if tier >= 0 else None,
+            color=TIER_COLOR_ORDER[tier] if tier >= 0 else None,
+        )
+
+    def to_tiles(self) -> List[Tile]:
+        return [self.tile(i) for i in range(len(self))]
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def __iter__(self) -> Iterator[Tile]:
+        return (self.tile(i) for i in range(len(self)))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Tile, "TileBatch"]:
+        if isinstance(index, slice):
+            return TileBatch(
+                lats=self.lats[index],
+                lons=self.lons[index],
+                lat_sizes=self.lat_sizes[index],
+                lon_sizes=self.lon_sizes[index],
+                scores=self.scores[index],
+                tiers=self.tiers[index],
+                features=self.features[index] if self.features is not None else None,
+                _ids=self._ids[index] if self._ids is not None else None,
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("tile index out of range")
+        return self.tile(index)
+
+
 class TileProcessor:
     """
     Generates and classifies tile grids.
@@ -88,15 +245,15 @@ class TileProcessor:
     MIN_TILES = 4
     MAX_TILES = 256
 
-    def generate_grid(
+    def generate_batch(
         self,
         min_lat: float,
         min_lon: float,
         max_lat: float,
         max_lon: float,
         tile_deg: Optional[float] = None,
-    ) -> List[Tile]:
-        """Generate a grid of tiles covering the bounding box."""
+    ) -> TileBatch:
+        """Generate a columnar grid of tiles covering the bounding box."""
         lat_span = max_lat - min_lat
         lon_span = max_lon - min_lon
 
@@ -107,31 +264,38 @@ class TileProcessor:
                 math.sqrt((lat_span * lon_span) / self.MAX_TILES),
             )
 
-        tiles: List[Tile] = []
-        lat = min_lat + tile_deg / 2
-        while lat < max_lat:
-            lon = min_lon + tile_deg / 2
-            while lon < max_lon:
-                tiles.append(
-                    Tile(
-                        id=str(uuid.uuid4())[:8],
-                        lat=round(lat, 6),
-                        lon=round(lon, 6),
-                        lat_size=tile_deg,
-                        lon_size=tile_deg,
-                    )
-                )
-                lon += tile_deg
-            lat += tile_deg
+        lat_centres = np.arange(min_lat + tile_deg / 2, max_lat, tile_deg, dtype=np.float64)
+        lon_centres = np.arange(min_lon + tile_deg / 2, max_lon, tile_deg, dtype=np.float64)
+        lat_centres = lat_centres[lat_centres < max_lat]
+        lon_centres = lon_centres[lon_centres < max_lon]
+        lat_grid, lon_grid = np.meshgrid(lat_centres, lon_centres, indexing="ij")
+        n = lat_grid.size
+        return TileBatch(
+            lats=np.round(lat_grid.ravel(), 6),
+            lons=np.round(lon_grid.ravel(), 6),
+            lat_sizes=np.full(n, tile_deg, dtype=np.float64),
+            lon_sizes=np.full(n, tile_deg, dtype=np.float64),
+        )
 
-        return tiles
+    def generate_grid(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        tile_deg: Optional[float] = None,
+    ) -> List[Tile]:
+        """Generate a grid of tiles covering the bounding box."""
+        return self.generate_batch(min_lat, min_lon, max_lat, max_lon, tile_deg).to_tiles()
 
     def classify_tiles(
         self,
-        tiles: List[Tile],
+        tiles: Union[List[Tile], TileBatch],
         scores: list,  # list of float 0–1
-    ) -> List[Tile]:
+    ) -> Union[List[Tile], TileBatch]:
         """Attach risk scores and tier classifications to tiles."""
+        if isinstance(tiles, TileBatch):
+            return tiles.classify(scores)
         for tile, score in zip(tiles, scores):
             tile.classify(float(score))
         return tiles
@@ -146,18 +310,8 @@ class TileProcessor:
         Uses simple linear attribution based on feature importance heuristics.
         In production this would use SHAP values.
         """
-        weights = {
-            "Land Surface Temperature": 0.20,
-            "Relative Humidity":        0.18,
-            "Wind Speed":               0.14,
-            "NDVI Vegetation Index":    0.13,
-            "Days Since Last Rain":     0.12,
-            "Fuel Moisture Code":       0.10,
-            "Slope":                    0.07,
-            "Human Density Index":      0.06,
-        }
         breakdown = {}
-        for factor, weight in weights.items():
+        for factor, weight in FACTOR_WEIGHTS.items():
             contribution = round(risk_score * weight * 100, 1)
             breakdown[factor] = contribution
         return breakdown
@@ -0,0 +1,200 @@
+"""
+PyroScan tile serializers
+=========================
+Compact encodings for scored tile batches, as an opt-in alternative to the
+per-tile JSON objects of ``Tile.to_dict``.
+
+Formats (``format=`` query parameter or ``Accept`` header):
+
+* ``json``     — default per-tile objects.
+* ``columnar`` — one JSON array per column (ids, lats, lons, scores, tier
+  codes); tier names/colours and factor weights are sent once.
+* ``binary``   — ``PYRT`` frame: a JSON header followed by packed
+  little-endian float32/int8 column buffers.
+* ``msgpack``  — the columnar document with numeric columns as raw
+  float32/int8 buffers (requires the optional ``msgpack`` package).
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+
+from api.services.tile_processor import (
+    FACTOR_WEIGHTS, TIER_COLOR_ORDER, TIER_ORDER, TileBatch, tier_indices,
+)
+
+try:
+    import msgpack
+    _has_msgpack = True
+except ImportError:
+    _has_msgpack = False
+
+FORMAT_MIMETYPES = {
+    "json": "application/json",
+    "columnar": "application/vnd.pyroscan.columnar+json",
+    "binary": "application/vnd.pyroscan.tiles",
+    "msgpack": "application/msgpack",
+}
+_ACCEPT_FORMATS = [
+    ("application/vnd.pyroscan.columnar+json", "columnar"),
+    ("application/vnd.pyroscan.tiles", "binary"),
+    ("application/octet-stream", "binary"),
+    ("application/msgpack", "msgpack"),
+    ("application/x-msgpack", "msgpack"),
+]
+
+BINARY_MAGIC = b"PYRT"
+BINARY_VERSION = 1
+# Column order inside a binary frame: name, dtype.
+BINARY_COLUMNS = (
+    ("lat", "<f4"),
+    ("lon", "<f4"),
+    ("risk_score", "<f4"),
+    ("tier", "i1"),
+)
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+def negotiate_format(requested: Optional[str], accept: str = "") -> str:
+    """Pick a response format from an explicit ``format=`` value or the Accept header."""
+    if requested:
+        fmt = requested.strip().lower()
+        if fmt not in FORMAT_MIMETYPES:
+            raise UnsupportedFormatError(
+                f"Unknown format {requested!r}; expected one of {sorted(FORMAT_MIMETYPES)}"
+            )
+    else:
+        fmt = next((name for mime, name in _ACCEPT_FORMATS if mime in accept), "json")
+    if fmt == "msgpack" and not _has_msgpack:
+        raise UnsupportedFormatError("msgpack is not installed on this server")
+    return fmt
+
+
+def _uniform_or_list(values: np.ndarray):
+    if len(values) and np.all(values == values[0]):
+        return float(values[0])
+    return values.tolist()
+
+
+def columnar_meta(batch: TileBatch) -> dict:
+    """Per-response constants the client needs to rebuild tile objects."""
+    return {
+        "format": "columnar",
+        "tier_names": [tier.value for tier in TIER_ORDER],
+        "tier_colors": TIER_COLOR_ORDER,
+        "factor_weights": FACTOR_WEIGHTS,
+        "lat_size": _uniform_or_list(batch.lat_sizes),
+        "lon_size": _uniform_or_list(batch.lon_sizes),
+    }
+
+
+def columnar_columns(batch: TileBatch) -> dict:
+    return {
+        "id": batch.ids,
+        "lat": batch.lats.tolist(),
+        "lon": batch.lons.tolist(),
+        "risk_score": batch.risk_scores.tolist(),
+        "tier": batch.tiers.tolist(),
+    }
+
+
+def columnar_document(batch: TileBatch, meta: dict) -> dict:
+    return {**meta, **columnar_meta(batch), "tile_count": len(batch), "columns": columnar_columns(batch)}
+
+
+def cube_document(batch: TileBatch, scores: np.ndarray, day_offsets: list, meta: dict) -> dict:
+    """
+    Multi-day scores as a ``tiles × days`` cube: ``risk_scores[i][d]`` (0–100)
+    and ``tiers[i][d]`` belong to tile ``columns.id[i]`` on ``day_offsets[d]``.
+    """
+    today = date.today()
+    return {
+        **meta,
+        **columnar_meta(batch),
+        "format": "cube",
+        "day_offsets": list(day_offsets),
+        "dates": [(today + timedelta(days=offset)).isoformat() for offset in day_offsets],
+        "tile_count": len(batch),
+        "columns": {"id": batch.ids, "lat": batch.lats.tolist(), "lon": batch.lons.tolist()},
+        "risk_scores": np.round(scores * 100, 1).tolist(),
+        "tiers": tier_indices(scores).tolist(),
+    }
+
+
+def _column_arrays(batch: TileBatch) -> dict:
+    return {
+        "lat": batch.lats.astype("<f4"),
+        "lon": batch.lons.astype("<f4"),
+        "risk_score": batch.risk_scores.astype("<f4"),
+        "tier": batch.tiers.astype("i1"),
+    }
+
+
+def pack_binary(batch: TileBatch, meta: dict) -> bytes:
+    """
+    Frame layout::
+
+        b"PYRT" | u8 version | u32 header length | header JSON (utf-8)
+        | zero padding to a 4-byte boundary | column buffers in BINARY_COLUMNS order
+
+    The header carries the metadata, tile ids and the column layout.
+    """
+    header = {
+        **meta,
+        **columnar_meta(batch),
+        "format": "binary",
+        "tile_count": len(batch),
+        "ids": batch.ids,
+        "columns": [[name, dtype] for name, dtype in BINARY_COLUMNS],
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    prefix = BINARY_MAGIC + struct.pack("<BI", BINARY_VERSION, len(header_bytes)) + header_bytes
+    padding = b"\0" * (-len(prefix) % 4)
+    arrays = _column_arrays(batch)
+    return prefix + padding + b"".join(arrays[name].tobytes() for name, _ in BINARY_COLUMNS)
+
+
+def unpack_binary(payload: bytes) -> tuple[dict, dict]:
+    """Inverse of :func:`pack_binary`; returns (header, columns)."""
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError("Not a PyroScan tile frame")
+    version, header_len = struct.unpack_from("<BI", payload, 4)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    start = 4 + struct.calcsize("<BI")
+    header = json.loads(payload[start:start + header_len].decode("utf-8"))
+    offset = start + header_len
+    offset += -offset % 4
+    n = header["tile_count"]
+    columns = {}
+    for name, dtype in header["columns"]:
+        size = np.dtype(dtype).itemsize * n
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=n, offset=offset)
+        offset += size
+    return header, columns
+
+
+def pack_msgpack(batch: TileBatch, meta: dict) -> bytes:
+    if not _has_msgpack:
+        raise UnsupportedFormatError("msgpack is not installed on this server")
+    arrays = _column_arrays(batch)
+    document = {
+        **meta,
+        **columnar_meta(batch),
+        "format": "msgpack",
+        "tile_count": len(batch),
+        "columns": {
+            "id": batch.ids,
+            **{name: arrays[name].tobytes() for name, _ in BINARY_COLUMNS},
+        },
+        "dtypes": {name: dtype for name, dtype in BINARY_COLUMNS},
+    }
+    return msgpack.packb(document, use_bin_type=True)
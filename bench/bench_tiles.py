@@ -0,0 +1,233 @@
+"""
+PyroScan tile-scoring benchmarks
+================================
+Times the tile-scoring hot path and writes the results as JSON:
+
+* grid generation (columnar batch and Tile list)
+* feature assembly, per tile vs whole-grid matrix
+* feature adaptation, single-model and full-ensemble inference, heuristic fallback
+* end-to-end ``/api/risk/tiles``: sync, NDJSON streaming, columnar, heuristic fallback
+
+Every case runs at grid sizes 16 … 2048 tiles. Caches are cleared before each
+repetition, so results measure cold work.
+
+Run with:
+    python bench/bench_tiles.py                          # print results as JSON
+    python bench/bench_tiles.py --out results.json
+    python bench/bench_tiles.py --compare                # check against bench/baseline.json
+    python bench/bench_tiles.py --save-baseline          # refresh bench/baseline.json
+
+``--compare`` exits with status 1 when a case's median is more than
+``--threshold`` (default 25%) and ``--min-delta-ms`` (default 1 ms) slower
+than its baseline, or when a case has no baseline entry. Baselines depend on
+the machine, so refresh them on the machine you compare on.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+GRID_SIZES = (16, 64, 256, 1024, 2048)
+QUICK_SIZES = (16, 256, 2048)
+PER_TILE_MAX = 256   # per-tile feature assembly is only timed up to this size
+
+
+def grid_bbox(n_tiles: int) -> tuple[float, float, float, float, float]:
+    """A 1°-tile bbox holding exactly ``n_tiles`` tiles, at most 64 columns wide."""
+    cols = min(n_tiles, 64)
+    rows = n_tiles // cols
+    return 0.0, 0.0, float(rows), float(cols), 1.0
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    if setup:
+        setup()
+    fn()   # warm-up: imports, pools, lazy ids
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+    }
+
+
+def run_cases(sizes, repeat: int, name_filter: str = "") -> dict:
+    from api.index import app
+    from api.routers import predict
+    from api.services.data_fetcher import data_fetcher
+    from api.services.model_loader import model_loader
+    from api.services.tile_processor import tile_processor
+
+    client = app.test_client()
+
+    def cold():
+        predict.tile_score_cache.clear()
+        predict.snapshot_store.clear()
+
+    results = {}
+
+    def case(name, rows, fn, setup=None):
+        if name_filter and name_filter not in name:
+            return
+        entry = measure(fn, repeat, setup)
+        entry["rows"] = rows
+        entry["rows_per_s"] = round(rows / (entry["median_ms"] / 1000.0), 1) if entry["median_ms"] else None
+        results[name] = entry
+        print(f"  {name:<44} {entry['median_ms']:>10.3f} ms", file=sys.stderr)
+
+    for n in sizes:
+        min_lat, min_lon, max_lat, max_lon, deg = grid_bbox(n)
+        batch = tile_processor.generate_batch(min_lat, min_lon, max_lat, max_lon, deg)
+        matrix = data_fetcher.fetch_feature_matrix_sync(batch.lats, batch.lons, use_live_data=False)
+        query = {"min_lat": min_lat, "min_lon": min_lon, "max_lat": max_lat, "max_lon": max_lon,
+                 "tile_deg": deg}
+
+        case(f"grid/batch/{n}", n,
+             lambda: tile_processor.generate_batch(min_lat, min_lon, max_lat, max_lon, deg).ids)
+        case(f"grid/tiles/{n}", n,
+             lambda: tile_processor.generate_grid(min_lat, min_lon, max_lat, max_lon, deg))
+        if n <= PER_TILE_MAX:
+            case(f"features/per_tile/{n}", n, lambda: [
+                data_fetcher.fetch_features_sync(lat, lon, use_live_data=False)
+                for lat, lon in zip(batch.lats.tolist(), batch.lons.tolist())
+            ])
+        case(f"features/matrix/{n}", n,
+             lambda: data_fetcher.fetch_feature_matrix_sync(batch.lats, batch.lons, use_live_data=False))
+        case(f"infer/heuristic/{n}", n, lambda: predict._heuristic_scores(matrix))
+
+        if model_loader.is_loaded():
+            models = model_loader._ensemble.models
+            for names in dict.fromkeys(entry.feature_names for entry in models):
+                label = "named" if names else "positional"
+                case(f"adapt/{label}/{n}", n, lambda names=names: model_loader._adapt_features(matrix, names))
+            for entry in models:
+                adapted = model_loader._adapt_features(matrix, entry.feature_names)
+                case(f"infer/model/{entry.name}/{n}", n,
+                     lambda entry=entry, adapted=adapted: model_loader._infer(entry, adapted))
+            fused = model_loader._ensemble.fused
+            if fused:
+                case(f"infer/fused/{n}", n, lambda fused=fused: fused.score(matrix))
+            case(f"infer/ensemble/{n}", n, lambda: model_loader.predict(matrix))
+
+        case(f"e2e/sync/{n}", n, lambda: client.get("/api/risk/tiles", query_string=query).data, cold)
+        case(f"e2e/stream/{n}", n,
+             lambda: client.get("/api/risk/tiles", query_string={**query, "stream": 1}).data, cold)
+        case(f"e2e/columnar/{n}", n,
+             lambda: client.get("/api/risk/tiles", query_string={**query, "format": "columnar"}).data, cold)
+        case(f"e2e/heuristic/{n}", n,
+             lambda: heuristic_only(lambda: client.get("/api/risk/tiles", query_string=query).data), cold)
+    return results
+
+
+def heuristic_only(fn):
+    """Run ``fn`` as if no model were loaded (the heuristic fallback path)."""
+    from api.routers import predict
+
+    scorer = predict._get_score
+    predict._get_score = predict._heuristic_scores
+    try:
+        return fn()
+    finally:
+        predict._get_score = scorer
+
+
+def environment() -> dict:
+    from api.services.model_loader import model_loader
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "models": model_loader.model_names,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float = 0.0) -> list[dict]:
+    regressions = []
+    for name, entry in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("median_ms"):
+            continue
+        ratio = entry["median_ms"] / base["median_ms"]
+        entry["baseline_median_ms"] = base["median_ms"]
+        entry["ratio"] = round(ratio, 3)
+        if ratio > 1.0 + threshold and entry["median_ms"] - base["median_ms"] > min_delta_ms:
+            regressions.append({"case": name, "median_ms": entry["median_ms"],
+                                "baseline_median_ms": base["median_ms"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+def missing_cases(results: dict, baseline: dict) -> list[str]:
+    """Cases that ran but have no baseline entry, so ``compare`` cannot check them."""
+    recorded = baseline.get("results", {})
+    return sorted(name for name in results if name not in recorded)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--quick", action="store_true", help=f"only sizes {QUICK_SIZES}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--compare", action="store_true", help="fail on regressions against --baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown as a fraction of the baseline median (default: %(default)s)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore slowdowns smaller than this many ms (timer noise; default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else GRID_SIZES
+    report = {"environment": environment(), "results": run_cases(sizes, args.repeat, args.filter)}
+
+    status = 0
+    if args.compare:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(report["results"], baseline, args.threshold, args.min_delta_ms)
+        missing = missing_cases(report["results"], baseline)
+        report["threshold"] = args.threshold
+        report["regressions"] = regressions
+        report["missing_baseline"] = missing
+        for item in regressions:
+            print(f"REGRESSION {item['case']}: {item['median_ms']} ms vs "
+                  f"{item['baseline_median_ms']} ms (x{item['ratio']})", file=sys.stderr)
+        for name in missing:
+            print(f"NO BASELINE {name}: refresh with --save-baseline", file=sys.stderr)
+        status = 1 if regressions or missing else 0
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.baseline).write_text(text + "\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -77,67 +77,134 @@ class ModelWrapper:
         return (scores >= 0.5).astype(np.int64)
 
     def _score(self, matrix: np.ndarray) -> np.ndarray:
-        matrix = np.atleast_2d(matrix).astype(np.float32, copy=False)
-        if matrix.shape[1] != self.n_features_in_:
-            raise ValueError(
-                f"{self.model_name} expects {self.n_features_in_} features, "
-                f"received {matrix.shape[1]}."
-            )
-
+        matrix = _check_matrix(matrix, self.model_name, self.n_features_in_)
         weights = self._PROFILE_WEIGHTS.get(
             self.model_name, self._PROFILE_WEIGHTS["global_model"]
         )
-
-        ndvi = np.clip(matrix[:, 0], -1.0, 1.0)
-        evi = np.clip(matrix[:, 1], -1.0, 1.0)
-        temp = matrix[:, 2]
-        humidity = np.clip(matrix[:, 3], 0.0, 100.0)
-        wind = np.clip(matrix[:, 4], 0.0, None)
-        precip_7d = np.clip(matrix[:, 6], 0.0, None)
-        slope = np.clip(matrix[:, 7], 0.0, None)
-        human_density = np.clip(matrix[:, 10], 0.0, 1.0)
-        days_since_rain = np.clip(matrix[:, 11], 0.0, None)
-        fuel_moisture = np.clip(matrix[:, 12], 0.0, 100.0)
-        fire_history = np.clip(matrix[:, 13], 0.0, None)
-
-        heat = np.clip((temp - 12.0) / 48.0, 0.0, 1.0)
-        dryness = np.clip(1.0 - (humidity / 100.0), 0.0, 1.0)
-        wind_risk = np.clip(wind / 22.0, 0.0, 1.0)
-        vegetation_stress = np.clip(1.0 - ((ndvi + evi) / 2.0 + 0.2), 0.0, 1.0)
-        terrain = np.clip(slope / 40.0, 0.0, 1.0)
-        rain_deficit = np.clip(days_since_rain / 18.0, 0.0, 1.0)
-        fuel_risk = np.clip(fuel_moisture / 100.0, 0.0, 1.0)
-        fire_memory = np.clip(fire_history / 12.0, 0.0, 1.0)
-        precip_relief = np.clip(precip_7d / 35.0, 0.0, 1.0)
+        terms = _terms(matrix)
 
         hotspot = np.clip(
-            (fire_memory * 0.6 + human_density * 0.4)
+            terms["hotspot"]
             * (1.0 + self.local_variance)
             * (1.0 + self.hotspot_strength),
             0.0,
             1.0,
         )
 
-        seasonal = 0.5 + 0.5 * np.sin(
-            (days_since_rain / 3.0) + self.temporal_shift + (wind_risk * math.pi / 2.0)
-        )
+        seasonal = 0.5 + 0.5 * np.sin(terms["phase"] + self.temporal_shift)
 
         score = (
             self.baseline
             + self.amplitude
             * (
-                weights["heat"] * heat
-                + weights["dryness"] * dryness
-                + weights["wind"] * wind_risk
-                + weights["vegetation"] * vegetation_stress
-                + weights["terrain"] * terrain
-                + weights["human"] * human_density
+                sum(weights[name] * terms[name] for name in _LINEAR_TERMS)
                 + weights["hotspot"] * hotspot
-                + weights["rain"] * rain_deficit
             )
             + 0.08 * seasonal
-            + 0.06 * fuel_risk
-            - 0.10 * precip_relief
+            + terms["offset"]
         )
 
         return np.clip(score, 0.0, 1.0)
+
+
+# Terms that enter every profile's score linearly, in weight-matrix row order.
+_LINEAR_TERMS = ("heat", "dryness", "wind", "vegetation", "terrain", "human", "rain")
+
+
+def _check_matrix(matrix: np.ndarray, model_name: str, n_features: int) -> np.ndarray:
+    matrix = np.atleast_2d(matrix).astype(np.float32, copy=False)
+    if matrix.shape[1] != n_features:
+        raise ValueError(
+            f"{model_name} expects {n_features} features, received {matrix.shape[1]}."
+        )
+    return matrix
+
+
+def _terms(matrix: np.ndarray) -> dict[str, np.ndarray]:
+    """Risk terms shared by every ModelWrapper profile, independent of its scalars."""
+    ndvi = np.clip(matrix[:, 0], -1.0, 1.0)
+    evi = np.clip(matrix[:, 1], -1.0, 1.0)
+    temp = matrix[:, 2]
+    humidity = np.clip(matrix[:, 3], 0.0, 100.0)
+    wind = np.clip(matrix[:, 4], 0.0, None)
+    precip_7d = np.clip(matrix[:, 6], 0.0, None)
+    slope = np.clip(matrix[:, 7], 0.0, None)
+    human_density = np.clip(matrix[:, 10], 0.0, 1.0)
+    days_since_rain = np.clip(matrix[:, 11], 0.0, None)
+    fuel_moisture = np.clip(matrix[:, 12], 0.0, 100.0)
+    fire_history = np.clip(matrix[:, 13], 0.0, None)
+
+    wind_risk = np.clip(wind / 22.0, 0.0, 1.0)
+    fuel_risk = np.clip(fuel_moisture / 100.0, 0.0, 1.0)
+    fire_memory = np.clip(fire_history / 12.0, 0.0, 1.0)
+    precip_relief = np.clip(precip_7d / 35.0, 0.0, 1.0)
+
+    return {
+        "heat": np.clip((temp - 12.0) / 48.0, 0.0, 1.0),
+        "dryness": np.clip(1.0 - (humidity / 100.0), 0.0, 1.0),
+        "wind": wind_risk,
+        "vegetation": np.clip(1.0 - ((ndvi + evi) / 2.0 + 0.2), 0.0, 1.0),
+        "terrain": np.clip(slope / 40.0, 0.0, 1.0),
+        "human": human_density,
+        "rain": np.clip(days_since_rain / 18.0, 0.0, 1.0),
+        # Unclipped hotspot; each profile scales it by its own variance/strength.
+        "hotspot": fire_memory * 0.6 + human_density * 0.4,
+        # Seasonal phase before the profile's temporal shift.
+        "phase": (days_since_rain / 3.0) + (wind_risk * math.pi / 2.0),
+        # Profile-independent additive part of the score.
+        "offset": 0.06 * fuel_risk - 0.10 * precip_relief,
+    }
+
+
+class FusedModelWrapper:
+    """Several ModelWrapper profiles evaluated in one pass.
+
+    The shared terms are computed once; the per-profile linear weights
+    (scaled by amplitude) are stacked into one ``(terms, profiles)`` matrix so
+    the weighted sums are a single matmul. The seasonal sine is expanded as
+    ``sin(a + s) = sin a·cos s + cos a·sin s`` so it, too, is shared.
+    """
+
+    n_features_in_ = ModelWrapper.n_features_in_
+
+    def __init__(self, wrappers: Iterable[ModelWrapper]) -> None:
+        self.wrappers = tuple(wrappers)
+        if not self.wrappers:
+            raise ValueError("FusedModelWrapper needs at least one ModelWrapper.")
+        profiles = [
+            ModelWrapper._PROFILE_WEIGHTS.get(w.model_name, ModelWrapper._PROFILE_WEIGHTS["global_model"])
+            for w in self.wrappers
+        ]
+        amplitude = np.array([w.amplitude for w in self.wrappers], dtype=np.float32)
+        self.linear = (
+            np.array([[p[name] for p in profiles] for name in _LINEAR_TERMS], dtype=np.float32)
+            * amplitude
+        )
+        self.hotspot_gain = np.array(
+            [(1.0 + w.local_variance) * (1.0 + w.hotspot_strength) for w in self.wrappers],
+            dtype=np.float32,
+        )
+        self.hotspot_weight = np.array([p["hotspot"] for p in profiles], dtype=np.float32) * amplitude
+        shift = np.array([w.temporal_shift for w in self.wrappers], dtype=np.float64)
+        # rows: (sin a, cos a) → 0.04·sin(a + shift)
+        self.seasonal = (0.04 * np.vstack([np.cos(shift), np.sin(shift)])).astype(np.float32)
+        self.bias = np.array([w.baseline + 0.04 for w in self.wrappers], dtype=np.float32)
+
+    @property
+    def model_names(self) -> list[str]:
+        return [w.model_name for w in self.wrappers]
+
+    def score(self, features: Iterable[Iterable[float]]) -> np.ndarray:
+        """``(rows, profiles)`` scores, column ``i`` matching ``wrappers[i]._score``."""
+        matrix = _check_matrix(np.asarray(features, dtype=np.float32), "FusedModelWrapper", self.n_features_in_)
+        terms = _terms(matrix)
+        linear = np.column_stack([terms[name] for name in _LINEAR_TERMS]).astype(np.float32, copy=False)
+        phase = terms["phase"]
+        trig = np.column_stack([np.sin(phase), np.cos(phase)]).astype(np.float32, copy=False)
+        hotspot = np.clip(terms["hotspot"][:, None] * self.hotspot_gain, 0.0, 1.0)
+
+        score = linear @ self.linear + trig @ self.seasonal
+        score += hotspot * self.hotspot_weight
+        score += self.bias
+        score += terms["offset"][:, None]
+        return np.clip(score, 0.0, 1.0)
@@ -5,6 +5,7 @@ Tests all core API endpoints and internal services.
 Run with: pytest test/test_api.py -v
 """
 
+import asyncio
 import sys
 import os
 import io
@@ -94,6 +95,52 @@ class TestTileProcessor:
         # Total should be approximately risk_score * 100 (80) with weights summing to 1.0
         assert 70 < total < 90
 
+    def test_tile_ids_are_stable_across_requests(self):
+        first = self.processor.generate_grid(0, 0, 5, 5, tile_deg=1.0)
+        second = self.processor.generate_grid(0, 0, 5, 5, tile_deg=1.0)
+        assert [t.id for t in first] == [t.id for t in second]
+        assert len({t.id for t in first}) == len(first)
+
+    def test_overlapping_viewports_share_cell_ids(self):
+        a = {(t.lat, t.lon): t.id for t in self.processor.generate_grid(0, 0, 4, 4, tile_deg=1.0)}
+        b = {(t.lat, t.lon): t.id for t in self.processor.generate_grid(2, 2, 6, 6, tile_deg=1.0)}
+        shared = set(a) & set(b)
+        assert shared
+        assert all(a[key] == b[key] for key in shared)
+
+    def test_cell_ids_differ_by_resolution_and_phase(self):
+        from api.services.tile_processor import cell_id
+        assert cell_id(1.0, 0.5, 0.5) != cell_id(0.5, 0.5, 0.5)
+        assert cell_id(1.0, 0.5, 0.5) != cell_id(1.0, 0.75, 0.5)
+
+    def test_batch_matches_tile_grid(self):
+        batch = self.processor.generate_batch(-10, 20, 7, 31, tile_deg=2.0)
+        tiles = self.processor.generate_grid(-10, 20, 7, 31, tile_deg=2.0)
+        assert len(batch) == len(tiles) == 40
+        assert batch.ids == [t.id for t in tiles]
+        np.testing.assert_allclose(batch.lats, [t.lat for t in tiles])
+        np.testing.assert_allclose(batch.lons, [t.lon for t in tiles])
+
+    def test_batch_classification_matches_tile_classify(self):
+        from api.services.tile_processor import Tile
+        scores = np.array([0.0, 0.25, 0.2500001, 0.5, 0.74, 0.75, 0.76, 1.0])
+        batch = self.processor.generate_batch(0, 0, 1, 8, tile_deg=1.0)
+        self.processor.classify_tiles(batch, scores)
+        for tile, score in zip(batch, scores):
+            expected = Tile(id="x", lat=0, lon=0, lat_size=1, lon_size=1)
+            expected.classify(float(score))
+            assert (tile.risk_score, tile.risk_tier, tile.color) == (
+                expected.risk_score, expected.risk_tier, expected.color
+            )
+
+    def test_batch_slices_stay_columnar(self):
+        from api.services.tile_processor import TileBatch
+        batch = self.processor.generate_batch(0, 0, 4, 4, tile_deg=1.0)
+        part = batch[4:8]
+        assert isinstance(part, TileBatch)
+        assert part.ids == batch.ids[4:8]
+        assert batch[-1].id == batch.ids[-1]
+
     def test_auto_tile_deg_limits_tiles(self):
         # Large bounding box should auto-select a big tile_deg
         tiles = self.processor.generate_grid(-90, -180, 90, 180)
@@ -118,14 +165,13 @@ class TestModelLoader:
 
     def test_predict_raises_when_no_model(self, tmp_path, monkeypatch):
         """predict() must raise ModelNotAvailableError when no model is loaded."""
-        from api.services.model_loader import ModelLoader, ModelState, ModelNotAvailableError
+        from api.services.model_loader import Ensemble, ModelLoader, ModelState, ModelNotAvailableError
         monkeypatch.setattr(
             "api.services.model_loader.MODELS_DIR", tmp_path
         )
         loader = ModelLoader.__new__(ModelLoader)
         import threading
-        loader._models = []
-        loader._errors = {}
+        loader._ensemble = Ensemble()
         loader._config = {}
         loader._lock = threading.RLock()
         loader.state = ModelState.PENDING
@@ -135,6 +181,87 @@ class TestModelLoader:
         with pytest.raises(ModelNotAvailableError):
             loader.predict(np.zeros((1, 14), dtype=np.float32))
 
+    def test_predict_does_not_wait_for_reload(self, tmp_path, monkeypatch):
+        """Inference reads the published snapshot while a scan holds the lock."""
+        import pickle
+        import threading
+        from sklearn.ensemble import RandomForestClassifier
+        from api.services.model_loader import ModelLoader
+
+        X = np.random.rand(50, 14).astype(np.float32)
+        clf = RandomForestClassifier(n_estimators=2, random_state=0).fit(X, X[:, 0] > 0.5)
+        with open(tmp_path / "snap_model.pkl", "wb") as f:
+            pickle.dump(clf, f)
+        monkeypatch.setattr("api.services.model_loader.MODELS_DIR", tmp_path)
+        loader = ModelLoader()
+        before = loader._ensemble
+
+        result = {}
+        with loader._lock:
+            worker = threading.Thread(
+                target=lambda: result.setdefault("scores", loader.predict(X[:3]))
+            )
+            worker.start()
+            worker.join(timeout=5)
+        assert result["scores"].shape == (3,)
+
+        loader._scan()
+        assert loader._ensemble is not before
+        assert loader.is_loaded()
+
+    def test_parallel_ensemble_matches_sequential(self, monkeypatch):
+        from api.services import model_loader as module
+
+        loader = module.model_loader
+        if not loader.is_loaded():
+            pytest.skip("bundled models not loaded")
+        matrix = np.random.default_rng(3).random((200, 14), dtype=np.float32) * 40
+        parallel = loader.predict(matrix)
+        assert set(loader.last_timings) == set(loader.model_names)
+        monkeypatch.setattr(module, "PARALLEL_MIN_ROWS", 10_000)
+        sequential = loader.predict(matrix)
+        np.testing.assert_allclose(parallel, sequential)
+
+    def test_adapted_features_computed_once_per_schema(self, monkeypatch):
+        from api.services import model_loader as module
+
+        loader = module.model_loader
+        if not loader.is_loaded():
+            pytest.skip("bundled models not loaded")
+        calls = []
+        real = loader._adapt_features
+        monkeypatch.setattr(loader, "_adapt_features", lambda m, names: calls.append(names) or real(m, names))
+        loader.predict(np.ones((4, 14), dtype=np.float32))
+        schemas = {entry.feature_names for entry in loader._ensemble.models}
+        assert len(calls) == len(schemas)
+
+    def test_fused_wrapper_matches_each_profile(self):
+        from predict_server import FusedModelWrapper, ModelWrapper
+
+        wrappers = [
+            ModelWrapper("global_model", 0.1, 0.62, 0.8, 0.08, 0.2),
+            ModelWrapper("local_model", 0.21, 0.7, 3.1, 0.14, 0.28),
+            ModelWrapper("unknown_profile", 0.3, 0.5, -1.2, 0.5, 0.9),
+        ]
+        matrix = np.random.default_rng(5).random((300, 14), dtype=np.float32) * 60 - 10
+        fused = FusedModelWrapper(wrappers).score(matrix)
+        assert fused.shape == (300, 3)
+        for i, wrapper in enumerate(wrappers):
+            np.testing.assert_allclose(fused[:, i], wrapper._score(matrix), atol=1e-5)
+
+    def test_legacy_members_are_fused(self, monkeypatch):
+        from api.services import model_loader as module
+
+        loader = module.model_loader
+        fused = loader._ensemble.fused
+        if fused is None:
+            pytest.skip("bundled legacy models not loaded")
+        matrix = np.random.default_rng(4).random((128, 14), dtype=np.float32) * 40
+        scores = loader.predict(matrix)
+        assert set(loader.last_timings) == set(loader.model_names)
+        monkeypatch.setattr(loader, "_ensemble", module.replace(loader._ensemble, fused=None))
+        np.testing.assert_allclose(scores, loader.predict(matrix), atol=1e-5)
+
     def test_sklearn_model_loads_and_predicts(self, tmp_path, monkeypatch):
         """A minimal sklearn model should load and produce predictions."""
         import pickle
@@ -161,6 +288,279 @@ class TestModelLoader:
         assert np.all((scores >= 0) & (scores <= 1))
 
 
+class TestLazyRegistry:
+    @pytest.fixture
+    def models_dir(self, tmp_path, monkeypatch):
+        TestOnnxExport._bundle(tmp_path / "risk.pkl")
+        monkeypatch.setattr("api.services.model_loader.MODELS_DIR", tmp_path)
+        monkeypatch.setattr("api.services.model_loader.WATCH_MODELS", False)
+        return tmp_path
+
+    def test_manifest_defers_loading_until_first_predict(self, models_dir, monkeypatch):
+        from api.services import model_loader as module
+
+        eager = module.ModelLoader()
+        eager.write_manifest()
+        monkeypatch.setattr(module, "LAZY_MODELS", True)
+        lazy = module.ModelLoader()
+        assert lazy.is_loaded()
+        assert lazy.describe()[0]["resident"] is False
+        assert lazy._ensemble.models[0].feature_names == eager._ensemble.models[0].feature_names
+        assert lazy.fingerprint == eager.fingerprint
+
+        X = np.random.default_rng(2).random((8, 14)).astype(np.float32) * 40
+        np.testing.assert_allclose(lazy.predict(X), eager.predict(X))
+        assert lazy.describe()[0]["resident"] is True
+
+    def test_fingerprint_ignores_mtime(self, models_dir):
+        from api.services import model_loader as module
+
+        before = module.ModelLoader().fingerprint
+        os.utime(models_dir / "risk.pkl", (1_000_000_000, 1_000_000_000))
+        assert module.ModelLoader().fingerprint == before
+
+    def test_changed_file_ignores_manifest_entry(self, models_dir, monkeypatch):
+        from api.services import model_loader as module
+
+        module.ModelLoader().write_manifest()
+        with open(models_dir / "risk.pkl", "ab") as f:
+            f.write(b"\0")
+        monkeypatch.setattr(module, "LAZY_MODELS", True)
+        assert module.ModelLoader().describe()[0]["resident"] is True
+
+    def test_joblib_sibling_loads_memory_mapped(self, models_dir):
+        import joblib
+        import pickle
+        from api.services.model_loader import ModelLoader, _file_digest
+
+        with open(models_dir / "risk.pkl", "rb") as f:
+            joblib.dump(pickle.load(f), models_dir / "risk.joblib")
+        (models_dir / "risk.joblib.source").write_text(_file_digest(models_dir / "risk.pkl") + "\n")
+        loader = ModelLoader()
+        entry = loader._ensemble.models[0]
+        assert entry.path.suffix == ".joblib" and entry.backend == "sklearn-bundle"
+        assert loader.predict(np.ones((3, 14), dtype=np.float32)).shape == (3,)
+
+    def test_exports_are_matched_to_their_pickle_by_content(self, models_dir):
+        import joblib
+        from api.services.model_loader import ModelLoader, _file_digest
+
+        pkl, export = models_dir / "risk.pkl", models_dir / "risk.joblib"
+        joblib.dump({"model": None}, export)
+        assert ModelLoader._group_siblings([export, pkl]) == [[pkl]]   # no record: not preferred
+        (models_dir / "risk.joblib.source").write_text(_file_digest(pkl))
+        stat = pkl.stat()
+        os.utime(export, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))   # older mtime is fine
+        assert ModelLoader._group_siblings([export, pkl]) == [[export, pkl]]
+        with pkl.open("ab") as f:
+            f.write(b"\0")   # the pickle changed after the export
+        assert ModelLoader._group_siblings([export, pkl]) == [[pkl]]
+
+
+class TestModelWatcher:
+    @pytest.fixture
+    def models_dir(self, tmp_path, monkeypatch):
+        for name in ("a", "b"):
+            TestOnnxExport._bundle(tmp_path / f"{name}.pkl")
+        monkeypatch.setattr("api.services.model_loader.MODELS_DIR", tmp_path)
+        monkeypatch.setattr("api.services.model_loader.WATCH_MODELS", False)
+        return tmp_path
+
+    @staticmethod
+    def _bump(path):
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_polling_watcher_reports_changed_names(self, tmp_path):
+        from api.services.fs_watch import PollingWatcher
+
+        (tmp_path / "a.pkl").write_bytes(b"1")
+        watcher = PollingWatcher(tmp_path, {".pkl"})
+        (tmp_path / "b.pkl").write_bytes(b"2")
+        (tmp_path / "notes.txt").write_text("ignored")
+        self._bump(tmp_path / "a.pkl")
+        assert watcher.wait(0) == {"a.pkl", "b.pkl"}
+        assert watcher.wait(0) == set()
+
+    def test_inotify_reports_completed_writes(self, tmp_path):
+        from api.services.fs_watch import InotifyWatcher
+
+        try:
+            watcher = InotifyWatcher(tmp_path, {".pkl"})
+        except (OSError, AttributeError):
+            pytest.skip("inotify not available")
+        try:
+            (tmp_path / "new.pkl").write_bytes(b"x" * 1024)
+            (tmp_path / "notes.txt").write_text("ignored")
+            assert watcher.wait(1.0) == {"new.pkl"}
+            assert watcher.wait(0.05) == set()
+        finally:
+            watcher.close()
+
+    def test_inotify_follows_a_replaced_directory(self, tmp_path):
+        from api.services.fs_watch import OVERFLOW, InotifyWatcher
+
+        watched = tmp_path / "models"
+        watched.mkdir()
+        try:
+            watcher = InotifyWatcher(watched, {".pkl"}, poll_interval=0.05)
+        except (OSError, AttributeError):
+            pytest.skip("inotify not available")
+        try:
+            watched.rename(tmp_path / "old")
+            watched.mkdir()
+            assert OVERFLOW in watcher.wait(1.0)
+            (watched / "new.pkl").write_bytes(b"x")
+            assert watcher.wait(1.0) == {"new.pkl"}
+
+            # Gone for good: keep reporting through polling once it comes back.
+            watched.rename(tmp_path / "older")
+            assert OVERFLOW in watcher.wait(1.0)
+            watched.mkdir()
+            (watched / "later.pkl").write_bytes(b"y")
+            assert watcher.wait(0.05) == {"later.pkl"}
+        finally:
+            watcher.close()
+
+    def test_rescan_reloads_only_changed_members(self, models_dir):
+        from api.services.model_loader import ModelLoader
+
+        loader = ModelLoader()
+        before = {entry.name: entry for entry in loader._ensemble.models}
+        self._bump(models_dir / "a.pkl")
+        loader._scan(only_if_changed=True)
+        after = {entry.name: entry for entry in loader._ensemble.models}
+        assert after["b"] is before["b"]
+        assert after["a"] is not before["a"]
+
+        version = loader.version
+        loader._scan(only_if_changed=True)
+        assert loader.version == version
+
+    def test_broken_replacement_keeps_serving_old_member(self, models_dir):
+        from api.services.model_loader import ModelLoader
+
+        loader = ModelLoader()
+        old = loader._ensemble.models[0]
+        (models_dir / "a.pkl").write_bytes(b"half a pickle")
+        loader._scan(only_if_changed=True)
+        assert loader._ensemble.models[0] is old
+        assert "a.pkl" in loader.load_errors
+
+    def test_watcher_picks_up_new_model(self, models_dir, monkeypatch):
+        import shutil
+        import time
+        from api.services import model_loader as module
+
+        monkeypatch.setattr(module, "WATCH_MODELS", True)
+        monkeypatch.setattr(module, "MODEL_POLL_INTERVAL", 0.1)
+        monkeypatch.setattr(module, "RELOAD_DEBOUNCE", 0.05)
+        loader = module.ModelLoader()
+        try:
+            shutil.copy(models_dir / "a.pkl", models_dir / "c.pkl")
+            deadline = time.monotonic() + 5
+            while "c" not in loader.model_names and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert loader.model_names == ["a", "b", "c"]
+        finally:
+            loader._stop_event.set()
+
+
+class TestInferencePool:
+    def test_shard_bounds_cover_rows_contiguously(self):
+        from api.services.inference_pool import shard_bounds
+
+        assert shard_bounds(2048, 4, 256) == [(0, 512), (512, 1024), (1024, 1536), (1536, 2048)]
+        assert shard_bounds(300, 4, 256) == [(0, 150), (150, 300)]
+        assert shard_bounds(10, 4, 256) == [(0, 10)]
+
+    def test_pool_matches_in_process_scores(self):
+        from api.services.inference_pool import InferencePool
+        from api.services.model_loader import model_loader
+
+        if not model_loader.is_loaded():
+            pytest.skip("bundled models not loaded")
+        pool = InferencePool(processes=2, min_rows=1)
+        try:
+            matrix = np.random.default_rng(6).random((600, 14), dtype=np.float32) * 40
+            scores = pool.predict(matrix, model_loader.fingerprint)
+        finally:
+            pool.shutdown()
+        np.testing.assert_allclose(scores, model_loader.predict(matrix), atol=1e-6)
+
+    def test_pool_failure_falls_back_to_in_process(self, monkeypatch):
+        from api.routers import predict
+
+        if not predict.model_loader.is_loaded():
+            pytest.skip("bundled models not loaded")
+
+        def broken(*args):
+            raise RuntimeError("worker died")
+
+        monkeypatch.setattr(predict.inference_pool, "accepts", lambda rows: True)
+        monkeypatch.setattr(predict.inference_pool, "predict", broken)
+        matrix = np.ones((4, 14), dtype=np.float32)
+        np.testing.assert_allclose(predict._get_score(matrix), predict.model_loader.predict(matrix))
+
+
+class TestOnnxExport:
+    @staticmethod
+    def _bundle(path):
+        import pickle
+        from sklearn.ensemble import RandomForestClassifier
+
+        names = ["slope", "aspect", "ndvi", "lst"]
+        X = np.random.default_rng(0).random((80, 4)).astype(np.float32) * 40
+        clf = RandomForestClassifier(n_estimators=3, random_state=0).fit(X, X[:, 0] > 20)
+        with open(path, "wb") as f:
+            pickle.dump({"model": clf, "features": names}, f)
+        return clf, names
+
+    def test_bundle_paths_skip_non_bundles(self, tmp_path):
+        import pickle
+        from api.services.onnx_export import bundle_paths, load_bundle
+
+        self._bundle(tmp_path / "bundle.pkl")
+        with open(tmp_path / "bare.pkl", "wb") as f:
+            pickle.dump([1, 2, 3], f)
+        assert bundle_paths(tmp_path) == [tmp_path / "bundle.pkl"]
+        assert load_bundle(tmp_path / "bundle.pkl")[1] == ("slope", "aspect", "ndvi", "lst")
+
+    def test_stale_or_unloadable_export_falls_back_to_pickle(self, tmp_path, monkeypatch):
+        from api.services.model_loader import ModelLoader, _file_digest
+
+        self._bundle(tmp_path / "risk.pkl")
+        (tmp_path / "risk.onnx").write_bytes(b"not an onnx model")
+        assert ModelLoader._group_siblings(sorted(tmp_path.iterdir())) == [[tmp_path / "risk.pkl"]]
+
+        (tmp_path / "risk.joblib").write_bytes(b"not a joblib file")
+        (tmp_path / "risk.joblib.source").write_text(_file_digest(tmp_path / "risk.pkl"))
+        monkeypatch.setattr("api.services.model_loader.MODELS_DIR", tmp_path)
+        assert ModelLoader._group_siblings(
+            [tmp_path / "risk.joblib", tmp_path / "risk.pkl"])[0][0].suffix == ".joblib"
+        loader = ModelLoader()
+        assert loader.is_loaded() and loader.load_errors == {}
+        assert loader.describe()[0]["backend"] == "sklearn-bundle"
+        assert loader._ensemble.models[0].path.suffix == ".pkl"
+
+    def test_exported_bundle_is_preferred(self, tmp_path, monkeypatch):
+        pytest.importorskip("skl2onnx")
+        pytest.importorskip("onnxruntime")
+        from api.services.model_loader import ModelLoader, _export_source_digest, _file_digest
+        from api.services.onnx_export import export_bundle
+
+        clf, names = self._bundle(tmp_path / "risk.pkl")
+        export_bundle(tmp_path / "risk.pkl")
+        assert _export_source_digest(tmp_path / "risk.onnx") == _file_digest(tmp_path / "risk.pkl")
+        monkeypatch.setattr("api.services.model_loader.MODELS_DIR", tmp_path)
+        loader = ModelLoader()
+        entry = loader._ensemble.models[0]
+        assert (entry.backend, entry.feature_names) == ("onnx", tuple(names))
+        assert loader._weight(entry) == 1.25
+        X = np.random.default_rng(1).random((16, 4)).astype(np.float32) * 40
+        np.testing.assert_allclose(loader._infer(entry, X), clf.predict_proba(X)[:, 1], atol=1e-4)
+
+
 # ─────────────────────────────────────────────────────────────────────────── #
 #  Unit tests — DataFetcher                                                    #
 # ─────────────────────────────────────────────────────────────────────────── #
@@ -202,6 +602,288 @@ class TestDataFetcher:
         w2 = f._synth_weather(37.0, -122.0)
         assert w1["temp"] == w2["temp"]
 
+    def test_feature_matrix_matches_per_tile_synthetic(self):
+        from api.services.data_fetcher import DataFetcher
+        f = DataFetcher()
+        lats, lons = [10.5, -33.0, 61.25], [20.5, 151.0, -150.75]
+        matrix = f.fetch_feature_matrix_sync(lats, lons, 3, use_live_data=False)
+        assert matrix.shape == (3, 14)
+        assert matrix.dtype == np.float32
+        for row, lat, lon in zip(matrix, lats, lons):
+            expected = f.fetch_features_sync(lat, lon, 3, use_live_data=False).to_numpy()
+            np.testing.assert_allclose(row, expected)
+
+    def test_synth_feature_matrix_deterministic_and_in_range(self):
+        from api.services.data_fetcher import synth_feature_matrix
+        lats, lons = np.meshgrid(np.arange(-57.5, 75, 5.0), np.arange(-177.5, 180, 5.0), indexing="ij")
+        first = synth_feature_matrix(lats.ravel(), lons.ravel(), 2)
+        second = synth_feature_matrix(lats.ravel(), lons.ravel(), 2)
+        assert first.shape == (lats.size, 14)
+        np.testing.assert_array_equal(first, second)
+        assert np.all((first[:, 0] >= -0.2) & (first[:, 0] <= 0.9))
+        assert np.all((first[:, 3] >= 20) & (first[:, 3] <= 70))
+        assert np.all((first[:, 12] >= 0) & (first[:, 12] <= 100))
+        assert set(np.unique(first[:, 13])) <= set(range(13))
+        assert len(np.unique(first[:, 7])) > lats.size * 0.9
+
+    def test_feature_matrix_batches_open_meteo_requests(self, monkeypatch):
+        from api.services import data_fetcher as module
+        from api.services.http_pool import FetchEngine
+
+        calls = []
+
+        class FakeResponse:
+            def __init__(self, count):
+                self._count = count
+
+            def json(self):
+                daily = {"precipitation_sum": [1.0] * 10, "rain_sum": [0.0] * 9 + [2.0]}
+                return [{"daily": daily} for _ in range(self._count)]
+
+        def fake_get(url, params=None, timeout=None):
+            calls.append(url)
+            return FakeResponse(len(params["latitude"].split(",")))
+
+        engine = FetchEngine(default_rate=0)
+        monkeypatch.setattr(engine.session, "get", fake_get)
+        monkeypatch.setattr(module, "OPEN_METEO_CHUNK", 4)
+        monkeypatch.setattr(module, "OWM_API_KEY", "")
+        lats = np.linspace(-40, 40, 10)
+        lons = np.linspace(-100, 100, 10)
+        matrix = module.DataFetcher(http=engine).fetch_feature_matrix_sync(lats, lons, 9)
+        assert matrix.shape == (10, 14)
+        assert calls == [module.OPEN_METEO_URL] * 3
+        np.testing.assert_allclose(matrix[:, 6], 7.0)
+        np.testing.assert_allclose(matrix[:, 11], 0.0)
+
+    def test_forecast_matrix_matches_per_day_rows(self):
+        from api.services.data_fetcher import DataFetcher
+        f = DataFetcher()
+        matrix = f.fetch_forecast_matrix_sync(37.5, -122.0, 10, use_live_data=False)
+        assert matrix.shape == (10, 14)
+        for offset in range(10):
+            expected = f.fetch_features_sync(37.5, -122.0, offset, use_live_data=False).to_numpy()
+            np.testing.assert_allclose(matrix[offset], expected)
+
+
+class TestStaticLayers:
+    def test_build_and_lookup(self, tmp_path):
+        from api.services.data_fetcher import synth_static_columns
+        from api.services.static_layers import STATIC_LAYERS, StaticLayerStore, build, cell_centres
+
+        build(tmp_path, resolution=10.0)
+        store = StaticLayerStore(tmp_path)
+        assert set(store.layers) == set(STATIC_LAYERS)
+        assert isinstance(np.load(tmp_path / "slope.npy", mmap_mode="r"), np.memmap)
+        lats, lons = cell_centres(10.0)
+        # Any point inside a cell reads that cell's precomputed value.
+        got = store.lookup([lats[3] + 2.0, lats[-1]], [lons[5] - 3.0, lons[0]])
+        expected = synth_static_columns(np.array([lats[3], lats[-1]]), np.array([lons[5], lons[0]]))
+        for name in STATIC_LAYERS:
+            np.testing.assert_allclose(got[name], expected[name], rtol=1e-6)
+
+    def test_dropped_in_raster_overrides_synthetic(self, tmp_path, monkeypatch):
+        from api.services import data_fetcher as module
+        from api.services.static_layers import StaticLayerStore
+
+        np.save(tmp_path / "elevation.npy", np.full((18, 36), 1234.0, dtype=np.float32))
+        np.save(tmp_path / "slope.npy", np.zeros((5, 5), dtype=np.float32))   # not global: ignored
+        store = StaticLayerStore(tmp_path)
+        assert store.layers == ("elevation",)
+        monkeypatch.setattr(module, "static_layers", store)
+
+        matrix = module.data_fetcher.fetch_feature_matrix_sync([10.0, -40.0], [20.0, 100.0], use_live_data=False)
+        assert np.all(matrix[:, 9] == 1234.0)
+        features = module.data_fetcher.fetch_features_sync(10.0, 20.0, use_live_data=False)
+        assert features.elevation == 1234.0
+        np.testing.assert_allclose(features.to_numpy(), matrix[0], rtol=1e-6)
+
+    def test_signature_follows_raster_content(self, tmp_path):
+        from api.services.static_layers import StaticLayerStore
+
+        store = StaticLayerStore(tmp_path)
+        assert store.signature == ""
+        np.save(tmp_path / "elevation.npy", np.full((18, 36), 1234.0, dtype=np.float32))
+        store.reload()
+        first = store.signature
+        assert first
+        np.save(tmp_path / "elevation.npy", np.full((18, 36), 99.0, dtype=np.float32))
+        store.reload()
+        assert store.signature not in ("", first)
+
+
+class TestResponseCache:
+    def test_lru_eviction(self):
+        from api.services.data_fetcher import ResponseCache
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self):
+        from api.services.data_fetcher import ResponseCache
+        now = [0.0]
+        cache = ResponseCache(max_entries=8, clock=lambda: now[0])
+        cache.put("k", "v", ttl=10)
+        assert cache.get("k") == "v"
+        now[0] = 11.0
+        assert cache.get("k") is None
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["expirations"] == 1
+
+    def test_snapped_coordinates_share_one_fetch(self, monkeypatch):
+        from api.services import data_fetcher as module
+        from api.services.http_pool import FetchEngine
+
+        calls = []
+
+        class FakeResponse:
+            def json(self):
+                return {"daily": {"precipitation_sum": [0.5] * 10, "rain_sum": [0.0] * 10}}
+
+        def fake_get(url, params=None, timeout=None):
+            calls.append(params)
+            return FakeResponse()
+
+        engine = FetchEngine()
+        monkeypatch.setattr(engine.session, "get", fake_get)
+        fetcher = module.DataFetcher(cache=module.ResponseCache(), grid_deg=0.25, http=engine)
+        first = fetcher._forecast(37.51, -122.02, 2)
+        second = fetcher._forecast(37.49, -121.98, 5)
+        assert len(calls) == 1
+        assert calls[0]["latitude"] == 37.5 and calls[0]["longitude"] == -122.0
+        assert first["precip_7d"] == pytest.approx(1.5)
+        assert second["precip_7d"] == pytest.approx(3.0)
+        assert fetcher.cache.stats()["hits"] == 1
+
+
+class TestFetchEngine:
+    def test_map_preserves_order_and_caps_concurrency(self):
+        import threading
+        import time
+        from api.services.http_pool import FetchEngine
+
+        engine = FetchEngine(max_workers=3)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def work(item):
+            with lock:
+                active.append(item)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.remove(item)
+            return item * 2
+
+        assert engine.map(work, range(12)) == [i * 2 for i in range(12)]
+        assert max(peak) <= 3
+
+    def test_deadline_misses_come_back_as_none(self):
+        import time
+        from api.services.http_pool import FetchEngine
+
+        engine = FetchEngine(max_workers=2)
+
+        def work(item):
+            if item == "slow":
+                time.sleep(0.5)
+            return item
+
+        results = engine.map(work, ["fast", "slow"], deadline=0.1)
+        assert results == ["fast", None]
+        assert engine.deadline_misses == 1
+
+    def test_host_rate_limit_spaces_requests(self, monkeypatch):
+        import time
+        from api.services.http_pool import FetchEngine
+
+        engine = FetchEngine(rate_limits={"example.test": 20.0})
+        stamps = []
+        monkeypatch.setattr(engine.session, "get", lambda url, **kwargs: stamps.append(time.monotonic()))
+        for _ in range(3):
+            engine.get("https://example.test/x")
+        assert stamps[-1] - stamps[0] >= 0.09
+
+    def test_grid_falls_back_to_synthetic_after_deadline(self, monkeypatch):
+        import time
+        from api.services import data_fetcher as module
+        from api.services.http_pool import FetchEngine
+
+        engine = FetchEngine(default_rate=0)
+
+        def slow_get(url, params=None, timeout=None):
+            time.sleep(0.5)
+            raise AssertionError("should have been abandoned")
+
+        monkeypatch.setattr(engine.session, "get", slow_get)
+        monkeypatch.setattr(module, "OWM_API_KEY", "")
+        fetcher = module.DataFetcher(cache=module.ResponseCache(), http=engine)
+        lats, lons = [10.0, 20.0], [30.0, 40.0]
+        live = fetcher.fetch_feature_matrix_sync(lats, lons, 1, deadline=0.05)
+        synthetic = fetcher.fetch_feature_matrix_sync(lats, lons, 1, use_live_data=False)
+        np.testing.assert_allclose(live, synthetic)
+
+
+class TestMetrics:
+    def test_percentiles_over_rolling_window(self):
+        from api.services.metrics import MetricsRegistry
+        now = [0.0]
+        registry = MetricsRegistry(window_seconds=60, clock=lambda: now[0])
+        registry.observe("stage", 10.0, rows=5)
+        now[0] = 100.0
+        for ms in range(1, 101):
+            registry.observe("stage", ms / 1000.0, rows=1)
+        entry = registry.snapshot()["stage"][0]
+        assert entry["count"] == 101 and entry["rows"] == 105
+        assert entry["window"] == 100
+        assert entry["p50_ms"] == pytest.approx(50.0)
+        assert entry["p95_ms"] == pytest.approx(95.0)
+        assert entry["p99_ms"] == pytest.approx(99.0)
+
+    def test_prometheus_text_groups_families(self):
+        from api.services.metrics import MetricsRegistry
+        registry = MetricsRegistry()
+        registry.observe("model_infer", 0.002, rows=10, model="a")
+        registry.observe("model_infer", 0.004, rows=20, model="b")
+        text = registry.prometheus()
+        assert text.count("# TYPE pyroscan_model_infer_seconds summary") == 1
+        assert 'pyroscan_model_infer_seconds{model="a",quantile="0.5"} 0.002000' in text
+        assert 'pyroscan_model_infer_rows_total{model="b"} 20' in text
+
+
+class TestBenchmarkHarness:
+    @pytest.fixture
+    def bench(self):
+        import importlib.util
+        path = os.path.join(os.path.dirname(__file__), "..", "bench", "bench_tiles.py")
+        spec = importlib.util.spec_from_file_location("bench_tiles", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def test_compare_flags_slow_cases_only(self, bench):
+        baseline = {"results": {"a": {"median_ms": 10.0}, "b": {"median_ms": 10.0}, "c": {"median_ms": 0.1}}}
+        results = {"a": {"median_ms": 11.0}, "b": {"median_ms": 20.0}, "c": {"median_ms": 0.3}, "d": {"median_ms": 5.0}}
+        regressions = bench.compare(results, baseline, threshold=0.25, min_delta_ms=1.0)
+        assert [r["case"] for r in regressions] == ["b"]
+        assert results["a"]["ratio"] == 1.1
+        assert bench.missing_cases(results, baseline) == ["d"]
+
+    def test_run_writes_json_report(self, bench, tmp_path):
+        import json
+        out = tmp_path / "bench.json"
+        status = bench.main(["--quick", "--repeat", "1", "--filter", "grid/batch", "--out", str(out)])
+        report = json.loads(out.read_text())
+        assert status == 0
+        assert set(report["results"]) == {"grid/batch/16", "grid/batch/256", "grid/batch/2048"}
+        assert report["results"]["grid/batch/2048"]["rows"] == 2048
+
 
 # ─────────────────────────────────────────────────────────────────────────── #
 #  Integration tests — Flask endpoints                                         #
@@ -229,6 +911,23 @@ class TestHealthEndpoint:
         data = client.get("/api/health").get_json()
         assert data["version"] == "1.0.0"
 
+    def test_metrics_cover_tile_scoring(self, client):
+        client.get("/api/risk/tiles", query_string={
+            "min_lat": 0, "max_lat": 2, "min_lon": 0, "max_lon": 2, "tile_deg": 1.0,
+        })
+        data = client.get("/api/health").get_json()
+        assert data["metrics"]["score_tiles"][0]["rows"] >= 4
+        r = client.get("/api/metrics")
+        assert r.status_code == 200
+        assert r.mimetype == "text/plain"
+        assert "pyroscan_score_tiles_seconds_count" in r.get_data(as_text=True)
+
+    def test_health_reports_upstream_cache(self, client):
+        data = client.get("/api/health").get_json()
+        for key in ("hits", "misses", "evictions", "size"):
+            assert key in data["upstream_cache"]
+        assert "persistent_hits" in data["geocode_cache"]
+
 
 class TestRiskTilesEndpoint:
     def test_small_bbox_returns_tiles(self, client):
@@ -281,6 +980,374 @@ class TestRiskTilesEndpoint:
         assert data["day_offset"] == 5
 
 
+class TestScoredTileCache:
+    def test_repeat_request_skips_feature_fetch(self, monkeypatch):
+        from api.routers import predict
+        from api.services.tile_processor import tile_processor
+
+        predict.tile_score_cache.clear()
+        calls = []
+        real = predict.data_fetcher.fetch_feature_matrix_sync
+
+        def counting(lats, lons, *args, **kwargs):
+            calls.append(len(lats))
+            return real(lats, lons, *args, **kwargs)
+
+        monkeypatch.setattr(predict.data_fetcher, "fetch_feature_matrix_sync", counting)
+        first = predict.score_tiles_sync(tile_processor.generate_grid(0, 0, 3, 3, tile_deg=1.0), 2)
+        second = predict.score_tiles_sync(tile_processor.generate_grid(0, 0, 4, 4, tile_deg=1.0), 2)
+        assert calls == [9, 7]
+        by_id = {t.id: t.risk_score for t in second}
+        assert all(by_id[t.id] == t.risk_score for t in first)
+
+    def test_model_reload_invalidates_cache(self):
+        from api.routers import predict
+        from api.services.model_loader import model_loader
+        from api.services.tile_processor import tile_processor
+
+        predict.score_tiles_sync(tile_processor.generate_grid(0, 0, 2, 2, tile_deg=1.0), 1)
+        assert len(predict.tile_score_cache) > 0
+        version = model_loader.version
+        model_loader._scan()
+        assert model_loader.version == version + 1
+        assert len(predict.tile_score_cache) == 0
+
+
+class TestStreamBatching:
+    def test_batches_grow_to_maximum(self):
+        from api.routers.predict import BatchSizer
+
+        sizer = BatchSizer(initial=4, maximum=40, growth=2)
+        sizes = []
+        for _ in range(6):
+            sizes.append(sizer.size)
+            sizer.record(sizer.size, 1.0)
+        assert sizes == [4, 8, 16, 32, 40, 40]
+
+    def test_flush_hint_caps_batch(self):
+        from api.routers.predict import BatchSizer
+
+        sizer = BatchSizer(initial=10, maximum=1000, growth=4, flush_ms=50)
+        sizer.record(10, 25.0)   # 0.4 rows/ms → 20 rows per 50 ms
+        assert sizer.size == 20
+
+    def test_adaptive_stream_covers_all_tiles(self):
+        from api.routers import predict
+        from api.services.tile_processor import tile_processor
+
+        batch = tile_processor.generate_batch(0, 0, 10, 10, tile_deg=1.0)
+        sizes = [len(chunk) for chunk in predict.score_batches_stream(batch, 4)]
+        assert sum(sizes) == 100
+        assert sizes[0] == predict.STREAM_INITIAL_BATCH
+        assert max(sizes) > sizes[0]
+
+    def test_prefetch_matches_inline(self, monkeypatch):
+        from api.routers import predict
+        from api.services.tile_processor import tile_processor
+
+        batch = tile_processor.generate_batch(0, 0, 8, 8, tile_deg=1.0)
+        predict.tile_score_cache.clear()
+        piped = [t.to_dict() for chunk in predict.score_tiles_stream(batch, 5, batch_size=10) for t in chunk]
+        predict.tile_score_cache.clear()
+        monkeypatch.setattr(predict, "STREAM_PREFETCH", 0)
+        inline = [t.to_dict() for chunk in predict.score_tiles_stream(batch, 5, batch_size=10) for t in chunk]
+        assert piped == inline
+
+    def test_prefetch_overlaps_fetch_and_inference(self, monkeypatch):
+        import time
+        from api.routers import predict
+        from api.services.tile_processor import tile_processor
+
+        real_fetch = predict.data_fetcher.fetch_feature_matrix_sync
+
+        def slow_fetch(*args, **kwargs):
+            time.sleep(0.05)
+            return real_fetch(*args, **kwargs)
+
+        def slow_score(matrix):
+            time.sleep(0.05)
+            return predict._heuristic_scores(matrix)
+
+        monkeypatch.setattr(predict.data_fetcher, "fetch_feature_matrix_sync", slow_fetch)
+        monkeypatch.setattr(predict, "_get_score", slow_score)
+        batch = tile_processor.generate_batch(0, 0, 6, 6, tile_deg=1.0)
+
+        def run(prefetch):
+            monkeypatch.setattr(predict, "STREAM_PREFETCH", prefetch)
+            predict.tile_score_cache.clear()
+            started = time.perf_counter()
+            assert len(list(predict.score_batches_stream(batch, 6, batch_size=6))) == 6
+            return time.perf_counter() - started
+
+        assert run(2) < run(0) * 0.85
+
+    def test_loader_reports_optimal_batch_size(self):
+        from api.services.model_loader import CALIBRATION_SIZES, DEFAULT_BATCH_SIZE, model_loader
+
+        assert model_loader.optimal_batch_size in (*CALIBRATION_SIZES, DEFAULT_BATCH_SIZE)
+
+
+class TestMultiDayScoring:
+    BBOX = {"min_lat": 30, "max_lat": 34, "min_lon": -100, "max_lon": -96, "tile_deg": 1.0}
+
+    def test_cube_matches_per_day_matrices(self):
+        from api.services.data_fetcher import data_fetcher
+        lats, lons = np.array([31.5, -12.25]), np.array([-97.5, 140.0])
+        cube = data_fetcher.fetch_feature_cube_sync(lats, lons, [0, 3, 9], use_live_data=False)
+        assert cube.shape == (3, 2, 14)
+        for matrix, day in zip(cube, [0, 3, 9]):
+            np.testing.assert_array_equal(
+                matrix, data_fetcher.fetch_feature_matrix_sync(lats, lons, day, use_live_data=False)
+            )
+
+    def test_cube_scored_in_one_call(self, monkeypatch):
+        from api.routers import predict
+        from api.services.tile_processor import tile_processor
+
+        calls = []
+        real = predict._get_score
+        monkeypatch.setattr(predict, "_get_score", lambda m: calls.append(m.shape) or real(m))
+        predict.tile_score_cache.clear()
+        batch = tile_processor.generate_batch(0, 0, 3, 3, tile_deg=1.0)
+        scores = predict.score_tile_cube(batch, range(10))
+        assert scores.shape == (9, 10)
+        assert calls == [(90, 14)]
+        predict.score_tile_cube(batch, range(10))
+        assert len(calls) == 1
+
+    def test_days_endpoint_returns_cube(self, client):
+        r = client.get("/api/risk/tiles", query_string={**self.BBOX, "days": "0-9"})
+        assert r.status_code == 200
+        data = r.get_json()
+        assert data["day_offsets"] == list(range(10))
+        assert len(data["dates"]) == 10
+        assert len(data["risk_scores"]) == data["tile_count"] == 16
+        assert all(len(row) == 10 for row in data["risk_scores"])
+        assert all(0 <= s <= 100 for row in data["risk_scores"] for s in row)
+
+    def test_days_out_of_range_rejected(self, client):
+        r = client.get("/api/risk/tiles", query_string={**self.BBOX, "days": "0-12"})
+        assert r.status_code == 400
+
+
+class TestRiskPyramid:
+    @pytest.fixture
+    def pyramid(self, monkeypatch):
+        from api.services import risk_pyramid as module
+
+        monkeypatch.setattr(module, "TILE_CELLS", 4)
+        monkeypatch.setattr(module, "PYRAMID_BASE_ZOOM", 2)
+        scored = []
+
+        def score(batch, day_offset, use_live_data):
+            scored.append(len(batch))
+            return batch.classify((batch.lats + 90) / 180 * 0.5 + (batch.lons + 180) / 360 * 0.5)
+
+        return module, module.RiskPyramid(score), scored
+
+    def test_coarse_levels_aggregate_base_cells(self, pyramid):
+        module, pyr, scored = pyramid
+        root = pyr.tile(0, 1, 0)
+        assert scored == [4 * 4 * 16]            # all 16 base tiles in one call
+        base = np.block([[pyr.tile(2, 4 + bx, by).max for bx in range(4)] for by in range(4)])
+        blocks = base.reshape(4, 4, 4, 4)
+        np.testing.assert_allclose(root.max, blocks.max(axis=(1, 3)))
+        np.testing.assert_allclose(root.mean, blocks.mean(axis=(1, 3)), rtol=1e-6)
+        assert root.max[0, 0] >= root.max[-1, 0]   # row 0 is the northern edge
+
+    def test_zoom_levels_reuse_work(self, pyramid):
+        module, pyr, scored = pyramid
+        pyr.tile(1, 2, 0)
+        pyr.tile(0, 1, 0)
+        assert scored == [4 * 4 * 4, 4 * 4 * 12]   # only the still-missing base tiles
+        pyr.tile(3, 9, 1)                          # deeper than base: scored on demand
+        assert scored[-1] == 16
+
+    def test_large_fills_are_sampled_until_the_base_is_cached(self, pyramid):
+        module, pyr, scored = pyramid
+        pyr.max_cells = 4 * 4 * 4                  # four base tiles per request
+        root = pyr.tile(0, 1, 0)
+        assert root.sampled and scored == [16]     # only its own 4×4 cell centres
+        assert pyr.tile(0, 1, 0) is root           # the sample is cached
+        for x, y in ((2, 0), (3, 0), (2, 1), (3, 1)):
+            pyr.tile(1, x, y)
+        full = pyr.tile(0, 1, 0)
+        assert not full.sampled
+        assert scored[1:] == [64] * 4
+
+    def test_live_coarse_tiles_are_sampled_and_not_cached(self, pyramid):
+        module, pyr, scored = pyramid
+        assert pyr.tile(0, 1, 0, use_live_data=True).sampled
+        pyr.tile(0, 1, 0, use_live_data=True)
+        assert scored == [16, 16]
+        assert len(pyr.cache) == 0
+
+    def test_pyramid_leaves_the_tile_cache_alone(self, client):
+        from api.routers.predict import risk_pyramid, tile_score_cache
+        tile_score_cache.clear()
+        risk_pyramid.clear()
+        r = client.get("/api/risk/tiles/0/0/0")
+        assert r.get_json()["sampled"] is True
+        assert r.headers["Cache-Control"] == "no-cache" and "ETag" not in r.headers
+        assert len(tile_score_cache) == 0
+        assert client.get("/api/risk/tiles/4/3/2").get_json()["sampled"] is False
+        assert len(tile_score_cache) == 0
+
+    def test_day_offset_out_of_range_is_rejected(self, client):
+        for day_offset in (-1, 10):
+            r = client.get("/api/risk/tiles/5/40/9", query_string={"day_offset": day_offset})
+            assert r.status_code == 400
+
+    def test_endpoint_serves_with_cache_headers(self, client):
+        r = client.get("/api/risk/tiles/5/40/9", query_string={"agg": "mean"})
+        assert r.status_code == 200
+        data = r.get_json()
+        assert len(data["risk_scores"]) == 16 and data["aggregation"] == "mean"
+        assert "max-age" in r.headers["Cache-Control"]
+        again = client.get("/api/risk/tiles/5/40/9", query_string={"agg": "mean"},
+                           headers={"If-None-Match": r.headers["ETag"]})
+        assert again.status_code == 304
+        assert client.get("/api/risk/tiles/1/4/0").status_code == 404
+
+    def test_etag_follows_model_fingerprint(self, client, monkeypatch):
+        from api.services.model_loader import model_loader
+        r = client.get("/api/risk/tiles/5/40/9")
+        assert model_loader.fingerprint in r.headers["ETag"]
+        monkeypatch.setattr(type(model_loader), "fingerprint", property(lambda self: "other-models"))
+        again = client.get("/api/risk/tiles/5/40/9", headers={"If-None-Match": r.headers["ETag"]})
+        assert again.status_code == 200
+        assert again.headers["ETag"] != r.headers["ETag"]
+
+    def test_etag_follows_static_layers(self, client, monkeypatch):
+        from api.services.static_layers import StaticLayerStore
+        r = client.get("/api/risk/tiles/5/40/9")
+        monkeypatch.setattr(StaticLayerStore, "signature", property(lambda self: "other-rasters"))
+        again = client.get("/api/risk/tiles/5/40/9", headers={"If-None-Match": r.headers["ETag"]})
+        assert again.status_code == 200
+        assert again.headers["ETag"].strip('"').endswith("-other-rasters")
+
+    def test_live_tiles_are_not_cached(self, client, monkeypatch):
+        from api.routers import predict
+        monkeypatch.setattr(predict.data_fetcher, "fetch_feature_matrix_sync",
+                            lambda lats, lons, day_offset=0, use_live_data=True:
+                            predict.data_fetcher.__class__().fetch_feature_matrix_sync(
+                                lats, lons, day_offset, use_live_data=False))
+        r = client.get("/api/risk/tiles/5/40/9", query_string={"live": 1})
+        assert r.status_code == 200
+        assert r.headers["Cache-Control"] == "no-store"
+        assert "ETag" not in r.headers
+
+
+class TestPrecompute:
+    GRID = {"min_lat": 10, "min_lon": 20, "max_lat": 20, "max_lon": 40, "tile_deg": 5}
+
+    @pytest.fixture
+    def small_grid(self, monkeypatch):
+        from api.routers import predict
+        from api.services.precompute import GridSpec
+
+        grid = GridSpec(10.0, 20.0, 20.0, 40.0, 5.0)
+        monkeypatch.setattr(predict.precomputer, "grids", (grid,))
+        monkeypatch.setattr(predict.precomputer, "days", (0, 1))
+        predict.snapshot_store.clear()
+        yield grid
+        predict.snapshot_store.clear()
+
+    def test_matching_request_served_from_snapshot(self, client, small_grid, monkeypatch):
+        from api.routers import predict
+
+        fresh = client.get("/api/risk/tiles", query_string={**self.GRID, "day_offset": 1}).get_json()
+        assert predict.precomputer.run_once() == 2
+
+        def fail(*args, **kwargs):
+            raise AssertionError("snapshot hit should not rescore")
+
+        monkeypatch.setattr(predict.data_fetcher, "fetch_feature_matrix_sync", fail)
+        monkeypatch.setattr(predict, "_get_score", fail)
+        served = client.get("/api/risk/tiles", query_string={**self.GRID, "day_offset": 1}).get_json()
+        assert "precomputed_at" in served
+        assert served["tiles"] == fresh["tiles"]
+        columnar = client.get("/api/risk/tiles", query_string={**self.GRID, "format": "columnar"}).get_json()
+        assert columnar["columns"]["id"] == [t["id"] for t in fresh["tiles"]]
+
+    def test_snapshot_requires_current_ensemble(self, small_grid):
+        from api.routers import predict
+
+        predict.precomputer.run_once()
+        assert predict.snapshot_store.get(small_grid, 0, predict.offline_fingerprint()) is not None
+        assert predict.snapshot_store.get(small_grid, 0, "other-models") is None
+        assert predict.snapshot_store.get(small_grid, 5, predict.offline_fingerprint()) is None
+
+    def test_snapshots_persist_across_processes(self, small_grid, tmp_path):
+        from api.routers import predict
+        from api.services.precompute import SnapshotStore
+
+        predict.precomputer.run_once()
+        snapshot = predict.snapshot_store.get(small_grid, 0, predict.offline_fingerprint())
+        writer = SnapshotStore(tmp_path)
+        writer.put(snapshot, persist=True)
+        loaded = SnapshotStore(tmp_path).get(small_grid, 0, snapshot.fingerprint)
+        assert loaded.batch.ids == snapshot.batch.ids
+        np.testing.assert_allclose(loaded.batch.scores, snapshot.batch.scores)
+        np.testing.assert_array_equal(loaded.batch.tiers, snapshot.batch.tiers)
+
+    def test_model_reload_triggers_precompute(self):
+        from api.routers import predict
+
+        predict.precomputer._wake.clear()
+        predict.model_loader._scan()
+        assert predict.precomputer._wake.is_set()
+
+
+class TestTileFormats:
+    BBOX = {"min_lat": 36, "max_lat": 40, "min_lon": -122, "max_lon": -118, "tile_deg": 1.0}
+
+    def test_columnar_matches_json(self, client):
+        tiles = client.get("/api/risk/tiles", query_string=self.BBOX).get_json()["tiles"]
+        r = client.get("/api/risk/tiles", query_string={**self.BBOX, "format": "columnar"})
+        assert r.status_code == 200
+        assert r.mimetype == "application/vnd.pyroscan.columnar+json"
+        data = r.get_json()
+        cols = data["columns"]
+        assert data["tile_count"] == len(tiles) == len(cols["id"])
+        assert data["lat_size"] == 1.0
+        assert "Wind Speed" in data["factor_weights"]
+        for i, tile in enumerate(tiles):
+            assert cols["id"][i] == tile["id"]
+            assert cols["risk_score"][i] == tile["risk_score"]
+            assert data["tier_names"][cols["tier"][i]] == tile["risk_tier"]
+            assert data["tier_colors"][cols["tier"][i]] == tile["color"]
+
+    def test_binary_roundtrip(self, client):
+        from api.services.tile_serializer import unpack_binary
+
+        columnar = client.get(
+            "/api/risk/tiles", query_string=self.BBOX,
+            headers={"Accept": "application/vnd.pyroscan.columnar+json"},
+        ).get_json()
+        r = client.get(
+            "/api/risk/tiles", query_string=self.BBOX, headers={"Accept": "application/octet-stream"}
+        )
+        assert r.status_code == 200
+        header, cols = unpack_binary(r.data)
+        assert header["ids"] == columnar["columns"]["id"]
+        assert cols["tier"].tolist() == columnar["columns"]["tier"]
+        np.testing.assert_allclose(cols["risk_score"], columnar["columns"]["risk_score"], atol=1e-4)
+        np.testing.assert_allclose(cols["lat"], columnar["columns"]["lat"], atol=1e-5)
+
+    def test_columnar_stream(self, client):
+        import json
+
+        r = client.get("/api/risk/tiles", query_string={**self.BBOX, "format": "columnar", "stream": 1})
+        lines = [json.loads(line) for line in r.data.decode().splitlines()]
+        assert lines[0]["tile_count"] == 16
+        assert sum(len(line["columns"]["id"]) for line in lines[1:]) == 16
+
+    def test_unknown_format_rejected(self, client):
+        r = client.get("/api/risk/tiles", query_string={**self.BBOX, "format": "xml"})
+        assert r.status_code == 406
+
+
 class TestForecastEndpoint:
     def test_forecast_returns_10_days(self, client):
         r = client.get("/api/forecast/37.5/-122.0")
@@ -301,6 +1368,27 @@ class TestForecastEndpoint:
         for day in data["forecast_days"]:
             assert 0 <= day["risk_score"] <= 100
 
+    def test_forecast_scores_all_days_in_one_call(self, monkeypatch):
+        from api.routers import predict
+
+        calls = []
+        real_get_score = predict._get_score
+
+        def counting_get_score(matrix):
+            calls.append(matrix.shape)
+            return real_get_score(matrix)
+
+        monkeypatch.setattr(predict, "_get_score", counting_get_score)
+        offline = predict.data_fetcher.__class__()
+        monkeypatch.setattr(
+            predict.data_fetcher,
+            "fetch_forecast_matrix_sync",
+            lambda lat, lon, days: offline.fetch_forecast_matrix_sync(lat, lon, days, use_live_data=False),
+        )
+        data = predict.forecast_sync(37.5, -122.0)
+        assert calls == [(10, 14)]
+        assert [day["day"] for day in data["forecast_days"]] == list(range(10))
+
 
 class TestZoneDetailEndpoint:
     def test_zone_detail_returns_breakdown(self, client):
@@ -323,7 +1411,7 @@ class TestWeatherEndpoint:
 
 class TestSearchEndpoint:
     def test_search_returns_results(self, client):
-        r = client.get("/api/search", query_string={"q": "California"})
+        r = client.get("/api/search", query_string={"q": "Paradise Nevada"})
         # May succeed or 503 if geocoding is blocked in CI
         assert r.status_code in (200, 503)
 
@@ -331,6 +1419,137 @@ class TestSearchEndpoint:
         r = client.get("/api/search", query_string={"q": "A"})
         assert r.status_code == 422
 
+    def test_gazetteer_answers_common_places_locally(self, client):
+        r = client.get("/api/search", query_string={"q": "San Francisco"})
+        assert r.status_code == 200
+        assert r.get_json()["results"][0]["name"].startswith("San Francisco")
+
+
+class _FakeNominatim:
+    def __init__(self, items=None, error=None):
+        self.items = items or []
+        self.error = error
+        self.queries = []
+
+    def _respond(self, params):
+        self.queries.append(params["q"])
+        if self.error is not None:
+            raise self.error
+
+        class Response:
+            def json(inner):
+                return self.items
+
+        return Response()
+
+    def get(self, url, params=None, **kwargs):
+        return self._respond(params)
+
+
+class _AsyncFakeNominatim(_FakeNominatim):
+    async def get(self, url, params=None, **kwargs):
+        return self._respond(params)
+
+
+class TestGeocoder:
+    ITEMS = [{"display_name": "Paradise, Nevada", "lat": "36.09", "lon": "-115.15", "type": "town"}]
+
+    def _geocoder(self, tmp_path=None, rows=None):
+        from api.services.geocoder import GeocodeCache, Gazetteer, Geocoder
+        path = None
+        if rows is not None:
+            path = tmp_path / "places.tsv"
+            path.write_text("name\tadmin\tcountry\tlat\tlon\ttype\tpopulation\talternates\n" + "".join(
+                "\t".join(row) + "\n" for row in rows
+            ))
+        return Geocoder(cache=GeocodeCache(path=None), gazetteer=Gazetteer(path))
+
+    def test_normalize_query(self):
+        from api.services.geocoder import normalize_query
+        assert normalize_query("  São   Paulo, BR ") == "sao paulo br"
+        assert normalize_query("St. Petersburg") == "st petersburg"
+
+    def test_gazetteer_prefix_ranking(self, tmp_path):
+        rows = [
+            ("Santa Rosa", "California", "United States", "38.44", "-122.71", "city", "178000", ""),
+            ("San Diego", "California", "United States", "32.72", "-117.16", "city", "1387000", ""),
+            ("San", "Segou", "Mali", "13.30", "-4.90", "city", "66000", ""),
+            ("California", "California", "United States", "37.25", "-119.75", "state", "39030000", "CA"),
+        ]
+        gazetteer = self._geocoder(tmp_path, rows).gazetteer
+        names = [place["name"] for place in gazetteer.search("san")]
+        assert names[0] == "San, Segou, Mali"   # exact match first
+        assert names[1:] == ["San Diego, California, United States", "Santa Rosa, California, United States"]
+        assert gazetteer.search("san diego, ca")[0]["lat"] == 32.72
+        assert gazetteer.search("California")[0]["name"] == "California, United States"
+        assert gazetteer.search("sand") == []
+        assert [p["name"] for p in gazetteer.search_words("rosa")] == ["Santa Rosa, California, United States"]
+
+    def test_bundled_gazetteer_loads(self):
+        from api.services.geocoder import Gazetteer
+        gazetteer = Gazetteer()
+        assert len(gazetteer) > 100
+        assert gazetteer.search("Sacramento")[0]["lat"] == pytest.approx(38.58)
+
+    def test_upstream_results_are_cached_by_normalized_query(self):
+        geocoder = self._geocoder()
+        http = _FakeNominatim(self.ITEMS)
+        first = geocoder.search_sync("Paradise, NV", http=http)
+        assert first[0]["lat"] == 36.09
+        assert geocoder.search_sync("paradise   nv", http=http) == first
+        # Nominatim gets the text as typed; only the cache key is normalized.
+        assert http.queries == ["Paradise, NV"]
+
+    def test_gazetteer_hits_skip_upstream(self, tmp_path):
+        rows = [("Sacramento", "California", "United States", "38.58", "-121.49", "city", "525000", "")]
+        geocoder = self._geocoder(tmp_path, rows)
+        http = _FakeNominatim(error=AssertionError("should not be called"))
+        assert geocoder.search_sync("Sacramento, California", http=http)[0]["name"].startswith("Sacramento")
+        assert geocoder.search_sync("sac", http=http)[0]["name"].startswith("Sacramento")
+        assert http.queries == []
+
+    def test_partial_names_still_go_upstream(self, tmp_path):
+        rows = [("Malibu", "California", "United States", "34.03", "-118.78", "city", "11000", "")]
+        geocoder = self._geocoder(tmp_path, rows)
+        http = _FakeNominatim([{"display_name": "Mali", "lat": "17.57", "lon": "-3.99", "type": "country"}])
+        assert [r["name"] for r in geocoder.search_sync("Mali", http=http)] == ["Mali"]
+        assert http.queries == ["Mali"]
+        assert geocoder.search_sync("Malibu", http=http)[0]["name"].startswith("Malibu")
+        assert geocoder.search_sync("mal", http=http)[0]["name"].startswith("Malibu")   # too short to send
+        assert http.queries == ["Mali"]
+
+    def test_upstream_failure_falls_back_to_word_matches(self, tmp_path):
+        rows = [("South Lake Tahoe", "California", "United States", "38.93", "-119.98", "city", "21000", "")]
+        geocoder = self._geocoder(tmp_path, rows)
+        http = _FakeNominatim(error=ConnectionError("rate limited"))
+        assert geocoder.search_sync("tahoe", http=http)[0]["lat"] == 38.93
+        with pytest.raises(ConnectionError):
+            geocoder.search_sync("Paradise NV", http=http)
+        assert geocoder.cache.get("tahoe") is None   # fallbacks are not cached
+
+    def test_async_search_shares_the_cache(self):
+        geocoder = self._geocoder()
+        http = _AsyncFakeNominatim(self.ITEMS)
+        results = asyncio.run(geocoder.search("  Paradise NV ", http=http))
+        assert http.queries == ["Paradise NV"]
+        assert geocoder.search_sync("paradise nv", http=_FakeNominatim(error=AssertionError())) == results
+
+    def test_sqlite_cache_persists_and_expires(self, tmp_path):
+        from api.services.geocoder import GeocodeCache, GeocodeStore
+        db = tmp_path / "geocode.sqlite"
+        GeocodeCache(path=db).put("paradise nv", [{"name": "Paradise", "lat": 1.0, "lon": 2.0, "type": ""}])
+        reopened = GeocodeCache(path=db)
+        assert reopened.get("paradise nv")[0]["name"] == "Paradise"
+        assert reopened.stats()["persistent_hits"] == 1
+
+        now = [1000.0]
+        store = GeocodeStore(db, clock=lambda: now[0])
+        store.put("old", [], ttl=10)
+        assert store.get("old") == (10, [])
+        now[0] += 11
+        assert store.get("old") is None
+        assert store.purge() >= 1
+
 
 class TestUploadEndpoint:
     def test_geojson_upload(self, client):
@@ -372,6 +1591,202 @@ class TestUploadEndpoint:
         assert r.status_code == 404
 
 
+def _asgi_request(path, query="", method="GET", body=b"", headers=()):
+    """Drive ``api.asgi.app`` for one request; returns (status, headers, body chunks)."""
+    from api.asgi import app as asgi_app
+
+    async def run():
+        sent = []
+        incoming = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http", "method": method, "path": path, "root_path": "",
+            "query_string": query.encode(), "headers": list(headers),
+            "http_version": "1.1", "scheme": "http",
+            "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+        }
+        await asgi_app(scope, receive, send)
+        return sent
+
+    sent = asyncio.run(run())
+    start, chunks = sent[0], [m["body"] for m in sent[1:] if m["body"]]
+    assert start["type"] == "http.response.start"
+    assert sent[-1].get("more_body", False) is False
+    return start["status"], dict(start["headers"]), chunks
+
+
+def _asgi_json(path, query=""):
+    import json
+    status, _, chunks = _asgi_request(path, query)
+    return status, json.loads(b"".join(chunks))
+
+
+class TestAsgiApp:
+    @pytest.fixture(autouse=True)
+    def offline(self, monkeypatch):
+        from api.services.async_fetcher import async_data_fetcher
+        from api.services.async_http import AsyncFetchEngine
+
+        class OfflineEngine(AsyncFetchEngine):
+            async def get(self, url, params=None, timeout=6, **kwargs):
+                raise ConnectionError("offline")
+
+        monkeypatch.setattr(async_data_fetcher, "ahttp", OfflineEngine())
+
+    def test_bridged_route_matches_flask(self, client):
+        status, data = _asgi_json("/api/health")
+        assert status == 200
+        expected = client.get("/api/health").get_json()
+        assert data.keys() == expected.keys()
+        assert data["model_state"] == expected["model_state"]
+
+    def test_bridged_errors_keep_their_status(self):
+        status, data = _asgi_json("/api/maps/nonexistent-job/status")
+        assert status == 404
+        assert data == {"error": "Job not found"}
+
+    def test_native_weather_matches_flask(self, client):
+        status, data = _asgi_json("/api/weather/current", "lat=37.5&lon=-122.0")
+        assert status == 200
+        assert data == client.get("/api/weather/current?lat=37.5&lon=-122.0").get_json()
+
+    @pytest.mark.parametrize("origin", [None, "http://maps.example"])
+    def test_native_route_headers_match_flask(self, client, origin):
+        headers = [(b"origin", origin.encode())] if origin else []
+        status, asgi_headers, chunks = _asgi_request(
+            "/api/weather/current", "lat=37.5&lon=-122.0", headers=headers
+        )
+        expected = client.get("/api/weather/current?lat=37.5&lon=-122.0",
+                              headers={"Origin": origin} if origin else {})
+        assert status == expected.status_code
+        assert b"".join(chunks) == expected.data
+        assert asgi_headers == {
+            k.lower().encode(): v.encode() for k, v in expected.headers.items()
+        }
+        if origin:
+            assert asgi_headers[b"access-control-allow-origin"] == origin.encode()
+
+    def test_native_forecast_and_zone(self):
+        status, data = _asgi_json("/api/forecast/37.5/-122.0")
+        assert status == 200
+        assert [day["day"] for day in data["forecast_days"]] == list(range(10))
+        status, data = _asgi_json("/api/risk/zone/test_zone", "lat=37.5&lon=-122.0")
+        assert status == 200
+        assert data["id"] == "test_zone"
+        assert "factor_breakdown" in data
+        assert _asgi_json("/api/risk/zone/test_zone", "day_offset=x")[0] == 400
+
+    def test_tiles_match_flask(self, client):
+        query = "min_lat=30&max_lat=40&min_lon=-125&max_lon=-115"
+        status, data = _asgi_json("/api/risk/tiles", query)
+        assert status == 200
+        expected = client.get(f"/api/risk/tiles?{query}").get_json()
+        assert data["tiles"] == expected["tiles"]
+
+    def test_streamed_tiles_arrive_in_chunks(self):
+        import json
+        status, headers, chunks = _asgi_request(
+            "/api/risk/tiles", "min_lat=30&max_lat=40&min_lon=-125&max_lon=-115&stream=1"
+        )
+        assert status == 200
+        assert headers[b"content-type"].startswith(b"application/x-ndjson")
+        assert len(chunks) >= 2
+        lines = [json.loads(line) for line in b"".join(chunks).splitlines()]
+        assert lines[0]["tile_count"] == sum(len(line["tiles"]) for line in lines[1:])
+
+    def test_live_tiles_prefetch_the_grid(self, monkeypatch):
+        from api import asgi
+
+        calls = []
+
+        async def record(lats, lons, days, deadline=None):
+            calls.append((len(lats), days))
+
+        monkeypatch.setattr(asgi.async_data_fetcher, "prefetch_grid", record)
+        scope = {"path": "/api/risk/tiles",
+                 "query_string": b"min_lat=30&max_lat=40&min_lon=-125&max_lon=-115&live=1&days=0-2"}
+        asyncio.run(asgi._prefetch_live_tiles(asgi._Request(scope)))
+        assert len(calls) == 1 and calls[0][0] > 0 and calls[0][1] == 3
+        scope["query_string"] = b"min_lat=40&max_lat=30&live=1"
+        asyncio.run(asgi._prefetch_live_tiles(asgi._Request(scope)))
+        assert len(calls) == 1
+
+    def test_search(self, monkeypatch):
+        from api.services import geocoder
+
+        async def fake_geocode(query, http=None):
+            return [{"name": query, "lat": 1.0, "lon": 2.0, "type": "city"}]
+
+        monkeypatch.setattr(geocoder, "geocode", fake_geocode)
+        assert _asgi_json("/api/search", "q=A")[0] == 422
+        status, data = _asgi_json("/api/search", "q=Sacramento")
+        assert status == 200
+        assert data["results"][0]["name"] == "Sacramento"
+
+        async def failing_geocode(query, http=None):
+            raise ConnectionError("blocked")
+
+        monkeypatch.setattr(geocoder, "geocode", failing_geocode)
+        status, data = _asgi_json("/api/search", "q=Sacramento")
+        assert status == 503 and data["results"] == []
+
+    def test_slow_upstream_requests_overlap(self, monkeypatch):
+        import time
+        from api.asgi import app as asgi_app
+        from api.services import geocoder
+
+        async def slow_geocode(query, http=None):
+            await asyncio.sleep(0.2)
+            return []
+
+        monkeypatch.setattr(geocoder, "geocode", slow_geocode)
+
+        async def one(i):
+            sent = []
+
+            async def receive():
+                return {"type": "http.request", "body": b""}
+
+            async def send(message):
+                sent.append(message)
+
+            await asgi_app({"type": "http", "method": "GET", "path": "/api/search",
+                            "query_string": f"q=place{i}".encode(), "headers": []}, receive, send)
+            return sent[0]["status"]
+
+        async def many():
+            return await asyncio.gather(*(one(i) for i in range(100)))
+
+        started = time.perf_counter()
+        statuses = asyncio.run(many())
+        assert statuses == [200] * 100
+        assert time.perf_counter() - started < 2.0   # serially this would be 20 s
+
+    def test_lifespan(self):
+        from api.asgi import app as asgi_app
+
+        async def run():
+            incoming = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+            sent = []
+
+            async def receive():
+                return incoming.pop(0)
+
+            async def send(message):
+                sent.append(message["type"])
+
+            await asgi_app({"type": "lifespan"}, receive, send)
+            return sent
+
+        assert asyncio.run(run()) == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+
+
 # ─────────────────────────────────────────────────────────────────────────── #
 #  Heuristic scoring tests                                                     #
 # ─────────────────────────────────────────────────────────────────────────── #